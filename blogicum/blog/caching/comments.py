@@ -0,0 +1,122 @@
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.models import Count, Max
+
+from ..constants import (
+    LATEST_COMMENTS_COUNT, OBJECT_CACHE_ALIAS, OBJECT_CACHE_TIMEOUT
+)
+from ..models import Comment
+from ..prepared import (
+    NEWEST_FIRST, OLDEST_FIRST, comment_thread, comment_thread_after,
+    comment_thread_newest, comment_thread_newest_after
+)
+from .versions import get_versions
+
+
+def comment_stats(post_id):
+    """
+    Число комментариев поста и дата последнего. Хранятся в кеше под
+    версией ветки, поэтому агрегат по комментариям считается один раз
+    на каждое изменение ветки, а не на каждый запрос.
+    """
+    version = get_versions([('comments', post_id)])[('comments', post_id)]
+    key = f'comments:stats:{post_id}:{version}'
+    cache = caches[OBJECT_CACHE_ALIAS]
+    stats = cache.get(key)
+    if stats is None:
+        stats = Comment.objects.filter(post_id=post_id).aggregate(
+            count=Count('id'), updated=Max('pub_date')
+        )
+        cache.set(key, stats, OBJECT_CACHE_TIMEOUT)
+    return stats
+
+
+class ThreadComments:
+    """
+    Комментарии поста для пагинатора. Длина берётся из `comment_stats`,
+    срез не выполняет запрос сразу: ветка может найтись в кеше
+    фрагментов. Первая страница — подготовленный запрос (см. `prepared`).
+    """
+
+    def __init__(self, post_id, newest=False):
+        self.post_id = post_id
+        self.newest = newest
+
+    def count(self):
+        return comment_stats(self.post_id)['count']
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, key):
+        if not key.start:
+            first_page = comment_thread_newest if self.newest else (
+                comment_thread
+            )
+            return first_page.lazy(post_id=self.post_id)
+        return Comment.objects.filter(post_id=self.post_id).select_related(
+            'author'
+        ).order_by(*(NEWEST_FIRST if self.newest else OLDEST_FIRST))[key]
+
+
+def thread_batch(post_id, newest=False, after=None):
+    """
+    Страница ветки после курсора `after` — пары (дата, id) последнего
+    показанного комментария — или первая страница. Чтение начинается
+    с курсора по индексу, поэтому не зависит от глубины страницы.
+    """
+    if after is None:
+        first_page = comment_thread_newest if newest else comment_thread
+        return first_page(post_id=post_id)
+    query = comment_thread_newest_after if newest else comment_thread_after
+    pub_date, comment_id = after
+    return query(post_id=post_id, pub_date=pub_date, id=comment_id)
+
+
+def _latest_comments_sql(size, connection):
+    quote = connection.ops.quote_name
+    comment = Comment._meta
+    column = {
+        name: quote(comment.get_field(name).column)
+        for name in ('id', 'post', 'author', 'text', 'pub_date')
+    }
+    return (
+        'SELECT * FROM ('
+        f'SELECT c.{column["id"]}, c.{column["post"]}, '
+        f'c.{column["author"]}, c.{column["text"]}, '
+        f'c.{column["pub_date"]}, u.{quote("username")} AS username, '
+        f'ROW_NUMBER() OVER (PARTITION BY c.{column["post"]} '
+        f'ORDER BY c.{column["pub_date"]} DESC, c.{column["id"]} DESC) '
+        'AS recent_rank '
+        f'FROM {quote(comment.db_table)} c '
+        f'INNER JOIN {quote(User._meta.db_table)} u '
+        f'ON u.{quote(User._meta.pk.column)} = c.{column["author"]} '
+        f'WHERE c.{column["post"]} IN ({", ".join(["%s"] * size)})'
+        ') latest WHERE recent_rank <= %s '
+        f'ORDER BY {column["post"]}, recent_rank DESC'
+    )
+
+
+def latest_comments(post_ids, count=LATEST_COMMENTS_COUNT,
+                    using=DEFAULT_DB_ALIAS):
+    """
+    Последние `count` комментариев каждого из постов `post_ids` одним
+    запросом: ROW_NUMBER() в окне комментариев поста от новых к старым
+    читает индекс (post, pub_date, id) только этих постов. Возвращает
+    словарь id поста — комментарии от старых к новым с автором.
+    """
+    if not post_ids:
+        return {}
+    post_ids = list(post_ids)
+    comments = Comment.objects.using(using).raw(
+        _latest_comments_sql(len(post_ids), connections[using]),
+        [*post_ids, count],
+    )
+    latest = {}
+    for comment in comments:
+        comment.author = User.from_db(
+            using, ['id', 'username'], [comment.author_id, comment.username]
+        )
+        latest.setdefault(comment.post_id, []).append(comment)
+    return latest
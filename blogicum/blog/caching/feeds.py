@@ -0,0 +1,288 @@
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from functools import partial
+
+from django.conf import settings
+from django.db import DatabaseError, connection, transaction
+from django.utils.timezone import now
+
+from ..constants import (
+    FEED_INDEX_MAX_FEEDS, FEED_INDEX_STREAM_CHUNK, FEED_LOG_MAX_GAP
+)
+from ..models import Category, Post
+from ..prepared import post_card_rows, post_cards
+from ..rows import post_rows
+from ..utils import filter_published_posts
+from .objects import LocalLRU, categories
+from .versions import ALL, get_changes, get_versions, record_change
+
+
+class FeedIndex:
+    """
+    Id постов ленты от новых к старым и ключи сортировки (дата публикации
+    со знаком минус, чтобы массив шёл по возрастанию для `bisect`).
+    `version` — версия ленты в кеше версий, для которой индекс верен.
+    `epoch` — общая версия всех лент: её увеличение перестраивает все
+    индексы. `pending` — метки ещё не зафиксированных транзакций,
+    изменения которых уже внесены в индекс.
+    """
+
+    __slots__ = ('ids', 'stamps', 'version', 'epoch', 'pending')
+
+    def __init__(self, version, epoch):
+        self.ids = array('q')
+        self.stamps = array('d')
+        self.version = version
+        self.epoch = epoch
+        self.pending = set()
+
+    def remove(self, post_id):
+        try:
+            position = self.ids.index(post_id)
+        except ValueError:
+            return
+        del self.ids[position]
+        del self.stamps[position]
+
+    def position_after(self, pub_date, post_id):
+        """
+        Позиция в индексе сразу за постом с датой `pub_date` и id `post_id`
+        (курсор ленты). Если поста в ленте уже нет — за всеми постами
+        с той же датой.
+        """
+        stamp = -pub_date.timestamp()
+        start = bisect_left(self.stamps, stamp)
+        end = bisect_right(self.stamps, stamp, start)
+        try:
+            return self.ids.index(post_id, start, end) + 1
+        except ValueError:
+            return end
+
+    def insert(self, post_id, stamp):
+        position = bisect_right(self.stamps, stamp)
+        self.ids.insert(position, post_id)
+        self.stamps.insert(position, stamp)
+
+    def apply(self, change):
+        """
+        Применяет запись журнала `(post_id, stamp)`: пост убирается и,
+        если `stamp` не None, вставляется на своё место. Пустая запись —
+        изменение, которое ещё не зафиксировано.
+        """
+        if not change:
+            return
+        post_id, stamp = change
+        self.remove(post_id)
+        if stamp is not None:
+            self.insert(post_id, stamp)
+
+
+def post_feeds(post):
+    """Ленты, в которые может попасть пост: общая, категории и автора."""
+    return {'index', f'category:{post.category_id}', f'user:{post.author_id}'}
+
+
+def _feed_queryset(feed):
+    kind, _, pk = feed.partition(':')
+    if kind == 'index':
+        return filter_published_posts(Post.objects)
+    if kind == 'category':
+        return filter_published_posts(Post.objects.filter(category_id=pk))
+    # В профиле автора видны все его посты, как и раньше.
+    return Post.objects.filter(author_id=pk)
+
+
+def _is_visible(post):
+    if (
+        not post.is_published or post.pub_date > now()
+        or post.category_id is None
+    ):
+        return False
+    try:
+        return categories.get(post.category_id).is_published
+    except Category.DoesNotExist:
+        return False
+
+
+class FeedIndexes:
+    """
+    Индексы лент в памяти процесса. Страница ленты — срез массива id и
+    одна выборка `WHERE id IN (...)`. Каждое изменение ленты записывается
+    в журнал по её версии (`versions.record_change`), и отставший индекс
+    любого процесса догоняет ленту по журналу на месте. Потоковой
+    выборкой индекс перестраивается, только если журнал неполон.
+    """
+
+    def __init__(self, max_feeds=None):
+        self._feeds = LocalLRU(max_feeds or getattr(
+            settings, 'FEED_INDEX_MAX_FEEDS', FEED_INDEX_MAX_FEEDS
+        ))
+        self._lock = threading.Lock()
+
+    def get(self, feed):
+        versions = get_versions([('feed', feed), ('feed', ALL)])
+        version, epoch = versions[('feed', feed)], versions[('feed', ALL)]
+        index = self._feeds.get(feed)
+        if index is not None and (index.epoch != epoch or index.pending and (
+            not connection.in_atomic_block
+        )):
+            # Все ленты сброшены, или транзакция, изменившая индекс,
+            # завершилась без фиксации.
+            index = None
+        if index is None or not self._catch_up(feed, index, version):
+            index = self.rebuild(feed, version, epoch)
+        return index
+
+    def _catch_up(self, feed, index, version):
+        with self._lock:
+            start = index.version
+            if start == version:
+                return True
+            if not 0 < version - start <= FEED_LOG_MAX_GAP:
+                return False
+            changes = get_changes('feed', feed, start, version)
+            if changes is None:
+                return False
+            for change in changes:
+                index.apply(change)
+            index.version = version
+            return True
+
+    def rebuild(self, feed, version, epoch):
+        # Версия прочитана до выборки: изменение во время загрузки
+        # приведёт к повторной перестройке.
+        index = FeedIndex(version, epoch)
+        if connection.in_atomic_block:
+            # Выборка видит незафиксированные строки транзакции.
+            index.pending.add(None)
+        rows = _feed_queryset(feed).order_by('-pub_date').values_list(
+            'id', 'pub_date'
+        ).iterator(chunk_size=FEED_INDEX_STREAM_CHUNK)
+        for post_id, pub_date in rows:
+            index.ids.append(post_id)
+            index.stamps.append(-pub_date.timestamp())
+        self._feeds.set(feed, index)
+        return index
+
+    def change(self, post, feeds, deleted=False):
+        """
+        Отмечает изменение поста в лентах `feeds`. Сразу версии лент
+        растут с пустой записью журнала: другие процессы проходят её без
+        изменений, а индексы этого процесса получают изменение с меткой
+        транзакции, чтобы она видела свои записи. После фиксации версии
+        растут ещё раз с записью изменения для всех процессов.
+        """
+        changes = self._changes(post, post.pk, feeds, deleted)
+        token = object()
+        for feed in feeds:
+            version = record_change('feed', feed, ())
+            if not connection.in_atomic_block:
+                continue
+            index = self._feeds.get(feed)
+            if index is not None and self._catch_up(feed, index, version - 1):
+                with self._lock:
+                    index.apply(changes[feed])
+                    index.version = version
+                    index.pending.add(token)
+        # Id запоминается сейчас: у удалённого объекта Django его сбросит.
+        transaction.on_commit(partial(
+            self._commit, post, post.pk, feeds, deleted, token
+        ))
+
+    def _commit(self, post, post_id, feeds, deleted, token):
+        # Видимость считается в момент фиксации.
+        changes = self._changes(post, post_id, feeds, deleted)
+        for feed, change in changes.items():
+            record_change('feed', feed, change)
+        with self._lock:
+            for feed in feeds:
+                index = self._feeds.get(feed)
+                if index is not None:
+                    index.pending.discard(token)
+
+    def _changes(self, post, post_id, feeds, deleted):
+        members = set() if deleted else self._member_feeds(
+            post, _is_visible(post)
+        )
+        stamp = None if deleted else -post.pub_date.timestamp()
+        return {
+            feed: (post_id, stamp if feed in members else None)
+            for feed in feeds
+        }
+
+    @staticmethod
+    def _member_feeds(post, visible):
+        if not visible:
+            return {f'user:{post.author_id}'}
+        return post_feeds(post)
+
+    def warm(self):
+        """
+        Строит индексы общей ленты и лент опубликованных категорий при
+        старте процесса потоковой выборкой. Соединение с базой затем
+        закрывается: при предзагрузке приложения оно досталось бы всем
+        воркерам после fork.
+        """
+        try:
+            feeds = ['index'] + [
+                f'category:{pk}' for pk in Category.objects.filter(
+                    is_published=True
+                ).values_list('pk', flat=True)
+            ]
+            for feed in feeds:
+                self.get(feed)
+        except DatabaseError:
+            # База ещё не готова (например, до миграций) — индексы
+            # построятся при первых запросах.
+            pass
+        finally:
+            connection.close()
+
+    def clear(self):
+        self._feeds.clear()
+
+
+class FeedPosts:
+    """
+    Посты ленты для пагинатора: длина берётся из индекса, срез
+    загружает только посты страницы в порядке индекса подготовленным
+    запросом (см. `prepared`).
+    """
+
+    def __init__(self, index):
+        self.index = index
+        self.ids = index.ids
+
+    def count(self):
+        return len(self.ids)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice):
+            return self[key:key + 1 or None][0]
+        ids = self.ids[key].tolist()
+        posts = self.fetch(ids)
+        return [posts[post_id] for post_id in ids if post_id in posts]
+
+    def fetch(self, ids):
+        return {post.pk: post for post in post_cards(ids=ids)}
+
+
+class FeedRows(FeedPosts):
+    """Посты ленты как строки `PostRow` вместо экземпляров модели."""
+
+    def fetch(self, ids):
+        return post_rows(post_card_rows(ids=ids))
+
+
+feed_indexes = FeedIndexes()
+
+
+def feed_posts(feed):
+    feed_class = FeedRows if getattr(
+        settings, 'POST_CARD_ROWS', False
+    ) else FeedPosts
+    return feed_class(feed_indexes.get(feed))
@@ -0,0 +1,156 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.safestring import mark_safe
+
+from ..constants import FRAGMENT_CACHE_ALIAS, FRAGMENT_CACHE_TIMEOUT
+from ..utils import date_cursor
+from .comments import latest_comments
+from .pages import locale_suffix, record_dependencies
+from .versions import get_versions
+
+POST_CARD_TEMPLATE = 'includes/post_card.html'
+COMMENT_BODY_TEMPLATE = 'includes/comment_body.html'
+
+
+def _cache():
+    return caches[
+        getattr(settings, 'FRAGMENT_CACHE_ALIAS', FRAGMENT_CACHE_ALIAS)
+    ]
+
+
+def card_dependencies(post):
+    """Объекты, от которых зависит HTML карточки поста."""
+    return (
+        ('post', post.id),
+        ('category', post.category_id),
+        ('location', post.location_id),
+        ('user', post.author_id),
+        ('comments', post.id),
+    )
+
+
+def _card_key(post, versions, kind='card'):
+    stamps = '.'.join(
+        str(versions.get(pair, 0)) for pair in card_dependencies(post)
+    )
+    return f'fragment:{kind}:{post.id}:{locale_suffix()}:{stamps}'
+
+
+def _valid_previews(request, entries):
+    """
+    Карточки с комментариями, у авторов комментариев которых не
+    изменилась версия (имя выводится в карточке), как в ветке.
+    """
+    current = get_versions({
+        pair for entry in entries.values() for pair in entry['users']
+    })
+    valid = {}
+    for key, entry in entries.items():
+        users = entry['users']
+        if all(current[pair] == users[pair] for pair in users):
+            record_dependencies(request, users)
+            valid[key] = entry['html']
+    return valid
+
+
+def _render_previews(context, card, absent):
+    """Недостающие карточки с комментариями и версиями их авторов."""
+    latest = latest_comments([post.id for post, _ in absent])
+    users = get_versions({
+        ('user', comment.author_id)
+        for comments in latest.values() for comment in comments
+    })
+    record_dependencies(context.get('request'), users)
+    entries = {}
+    for post, key in absent:
+        comments = latest.get(post.id, [])
+        with context.push(post=post, latest_comments=comments):
+            entries[key] = {
+                'users': {
+                    ('user', comment.author_id):
+                        users[('user', comment.author_id)]
+                    for comment in comments
+                },
+                'html': card._render(context),
+            }
+    return entries
+
+
+def render_post_cards(context, posts, previews=False):
+    """
+    Возвращает HTML карточек постов, беря готовые из кеша одним
+    `get_many` и рендеря только недостающие. С `previews` под карточкой
+    выводятся последние комментарии: их для всех недостающих карточек
+    выбирает один запрос (см. `comments.latest_comments`), а карточка
+    хранится вместе с версиями авторов комментариев.
+    """
+    posts = list(posts)
+    versions = get_versions({
+        pair for post in posts for pair in card_dependencies(post)
+    })
+    record_dependencies(context.get('request'), versions)
+    kind = 'card:previews' if previews else 'card'
+    keys = [_card_key(post, versions, kind) for post in posts]
+    cache = _cache()
+    cached = cache.get_many(keys)
+    if previews:
+        cached = _valid_previews(context.get('request'), cached)
+    absent = [
+        (post, key) for post, key in zip(posts, keys) if key not in cached
+    ]
+    if not absent:
+        return [mark_safe(cached[key]) for key in keys]
+    card = context.template.engine.get_template(POST_CARD_TEMPLATE)
+    with context.render_context.push_state(card):
+        if previews:
+            entries = _render_previews(context, card, absent)
+            missing = {key: entry['html'] for key, entry in entries.items()}
+        else:
+            missing = {}
+            for post, key in absent:
+                with context.push(post=post):
+                    missing[key] = card._render(context)
+            entries = missing
+    cache.set_many(entries, FRAGMENT_CACHE_TIMEOUT)
+    cached.update(missing)
+    return [mark_safe(cached[key]) for key in keys]
+
+
+def render_comment_thread(context, post, comments, variant=''):
+    """
+    Возвращает ветку комментариев как список словарей с `id`, `author_id`,
+    курсором для подгрузки следующих и HTML тела комментария. Ветка
+    хранится в кеше целиком под версией набора комментариев поста
+    и проверяется по версиям авторов.
+    Кнопки управления и форма в кеш не попадают.
+    """
+    request = context.get('request')
+    comments_versions = get_versions([('comments', post.id)])
+    record_dependencies(request, comments_versions)
+    (comments_version,) = comments_versions.values()
+    key = (
+        f'fragment:thread:{post.id}:{variant}:{locale_suffix()}:'
+        f'{comments_version}'
+    )
+    cache = _cache()
+    entry = cache.get(key)
+    if entry is not None and get_versions(entry['users']) == entry['users']:
+        record_dependencies(request, entry['users'])
+        return entry['items']
+
+    comments = list(comments)
+    users = get_versions({('user', comment.author_id) for comment in comments})
+    body = context.template.engine.get_template(COMMENT_BODY_TEMPLATE)
+    items = []
+    with context.render_context.push_state(body):
+        for comment in comments:
+            with context.push(comment=comment):
+                items.append({
+                    'id': comment.id,
+                    'author_id': comment.author_id,
+                    'cursor': date_cursor(comment),
+                    'html': mark_safe(body._render(context)),
+                })
+    record_dependencies(request, users)
+    cache.set(key, {'users': users, 'items': items}, FRAGMENT_CACHE_TIMEOUT)
+    return items
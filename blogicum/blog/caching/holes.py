@@ -0,0 +1,68 @@
+import re
+from urllib.parse import parse_qsl, urlencode
+
+from django.template import RequestContext, engines
+from django.utils.safestring import mark_safe
+
+from ..forms import CommentForm
+
+HOLE_RE = re.compile(r'<!--hole:(\w+)\?([\w=&%.-]*)-->')
+
+# Дырки в кешируемых страницах: имя -> (шаблон, доп. контекст).
+HOLES = {
+    'header': ('includes/header.html', None),
+    'post_actions': ('includes/post_actions.html', None),
+    'profile_actions': ('includes/profile_actions.html', None),
+    'comment_actions': ('includes/comment_actions.html', None),
+    'comment_form': (
+        'includes/comment_form.html', lambda: {'form': CommentForm()}
+    ),
+}
+
+
+def _parse_value(value):
+    return int(value) if value.lstrip('-').isdigit() else value
+
+
+def placeholder(name, params):
+    """Метка дырки в общем для всех пользователей HTML страницы."""
+    return mark_safe(f'<!--hole:{name}?{urlencode(params)}-->')
+
+
+def is_shared_render(context):
+    """Рендерится ли сейчас общая часть страницы для кеша."""
+    request = context.get('request')
+    return getattr(request, '_page_dependencies', None) is not None
+
+
+def render_hole(context, name, params):
+    template_name, extra_context = HOLES[name]
+    template = context.template.engine.get_template(template_name)
+    values = dict(params, **(extra_context() if extra_context else {}))
+    with context.push(**values):
+        return template.render(context)
+
+
+def fill_holes(request, content):
+    """
+    Подставляет в HTML страницы персональные фрагменты текущего
+    пользователя. Все дырки рендерятся в одном RequestContext.
+    """
+    text = content.decode('utf-8')
+    if '<!--hole:' not in text:
+        return content
+    engine = engines['django'].engine
+    context = RequestContext(request)
+    first_template = engine.get_template(HOLES['header'][0])
+    with context.bind_template(first_template):
+        def replace(match):
+            name = match.group(1)
+            if name not in HOLES:
+                return ''
+            params = {
+                key: _parse_value(value)
+                for key, value in parse_qsl(match.group(2))
+            }
+            return render_hole(context, name, params)
+        text = HOLE_RE.sub(replace, text)
+    return text.encode('utf-8')
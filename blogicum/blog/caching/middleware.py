@@ -0,0 +1,89 @@
+from django.db import OperationalError
+
+from ..conditional import not_modified, set_validator_headers
+from ..scheduling import check_scheduled_publications
+from . import pages
+from .holes import fill_holes
+from .proxy import apply_cache_headers
+
+
+class PageCacheMiddleware:
+    """
+    Отдаёт готовые страницы лент и постов из кеша. В кеше хранится общая
+    для всех часть страницы, персональные фрагменты подставляются в каждый
+    ответ. Устаревшую страницу пересчитывает один процесс, остальные до
+    этого отдают прежнюю версию; она же отдаётся, если база заблокирована.
+    Страницу, которой в кеше ещё нет, остальные процессы ждут.
+    Должен стоять после AuthenticationMiddleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        check_scheduled_publications()
+        response = self.get_response(request)
+        if getattr(request, '_page_dependencies', None) is not None:
+            try:
+                if hasattr(response, 'render') and callable(response.render):
+                    response.render()
+                if pages.store_page(request, response):
+                    response['X-Page-Cache'] = 'MISS'
+            finally:
+                pages.finish_page(request)
+            response.content = fill_holes(request, response.content)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if not pages.is_eligible(request):
+            return None
+        entry = pages.get_entry(request)
+        if entry is not None and pages.is_fresh(entry):
+            pages.count(pages.HITS_KEY)
+            return self.serve(request, entry, 'HIT')
+        ready = pages.start_page(request, stale=entry)
+        if ready is not None and ready is entry:
+            pages.count(pages.STALE_KEY)
+            return self.serve(request, entry, 'STALE')
+        if ready is not None:
+            pages.count(pages.HITS_KEY)
+            return self.serve(request, ready, 'HIT')
+        pages.count(pages.MISSES_KEY)
+        return None
+
+    def process_exception(self, request, exception):
+        stale = getattr(request, '_page_stale', None)
+        if stale is None or not isinstance(exception, OperationalError):
+            return None
+        # База заблокирована — прежняя версия лучше ошибки.
+        pages.count(pages.STALE_KEY)
+        request._page_dependencies = None
+        pages.finish_page(request)
+        return self.serve(request, stale, 'STALE')
+
+    def serve(self, request, entry, state):
+        response = pages.build_response(entry)
+        if response.validator is not None:
+            not_modified_response = not_modified(request, response.validator)
+            if not_modified_response is not None:
+                return not_modified_response
+            set_validator_headers(request, response, response.validator)
+        response.content = fill_holes(request, response.content)
+        response['X-Page-Cache'] = state
+        return response
+
+
+class ProxyCacheMiddleware:
+    """
+    Заголовки для кеширующего обратного прокси: Cache-Control по политике
+    view и Surrogate-Key с объектами страницы. Стоит после
+    PageCacheMiddleware, чтобы ключи сохранялись вместе со страницей.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        apply_cache_headers(request, response)
+        return response
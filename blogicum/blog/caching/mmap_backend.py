@@ -0,0 +1,293 @@
+import fcntl
+import hashlib
+import mmap
+import os
+import pickle
+import struct
+import threading
+import time
+from pathlib import Path
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+from ..constants import (
+    MMAP_CACHE_PROBE, MMAP_CACHE_SLOT_SIZE, MMAP_CACHE_SLOTS
+)
+
+MAGIC = b'BLGMMAP1'
+# Заголовок файла: сигнатура, число слотов, размер слота.
+FILE_HEADER = struct.Struct('<8sII')
+# Заголовок слота: счётчик seqlock, хеш ключа, срок годности, длины ключа
+# и значения. Время последнего чтения лежит отдельно — его пишут читатели.
+SLOT_HEADER = struct.Struct('<QQdII')
+ACCESS = struct.Struct('<Q')
+SLOT_DATA_OFFSET = SLOT_HEADER.size + ACCESS.size
+READ_RETRIES = 16
+
+
+class MmapCache(BaseCache):
+    """
+    Кеш в отображённом в память файле, общий для всех процессов узла.
+    Файл разбит на слоты фиксированного размера; позиция слота — хеш ключа
+    с линейным пробированием в пределах `PROBE` слотов, при нехватке места
+    вытесняется давно не читанный слот окна. Запись идёт под flock,
+    чтение без блокировок: слот защищён seqlock, и читатель повторяет
+    чтение, если во время него слот менялся. Значения больше слота
+    не кешируются.
+
+    Пример настройки::
+
+        'pages': {
+            'BACKEND': 'blog.caching.mmap_backend.MmapCache',
+            'LOCATION': '/var/cache/blogicum/pages.mmap',
+            'OPTIONS': {'SLOTS': 512, 'SLOT_SIZE': 128 * 1024},
+        }
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self.path = Path(location)
+        self.slots = options.get('SLOTS', MMAP_CACHE_SLOTS)
+        self.slot_size = options.get('SLOT_SIZE', MMAP_CACHE_SLOT_SIZE)
+        self.probe = min(options.get('PROBE', MMAP_CACHE_PROBE), self.slots)
+        self._lock = threading.Lock()
+        self._pid = None
+        self._fd = None
+        self._map = None
+
+    # Файл и отображение.
+
+    def _mapping(self):
+        # После fork файл открывается заново: flock принадлежит открытому
+        # файлу, и общий с родителем дескриптор не защитил бы запись.
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._open()
+        return self._map
+
+    def _open(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        size = FILE_HEADER.size + self.slots * self.slot_size
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            if os.fstat(self._fd).st_size != size:
+                os.ftruncate(self._fd, 0)
+                os.ftruncate(self._fd, size)
+            self._map = mmap.mmap(self._fd, size)
+            magic, slots, slot_size = FILE_HEADER.unpack_from(self._map)
+            if (magic, slots, slot_size) != (
+                MAGIC, self.slots, self.slot_size
+            ):
+                self._map[:] = bytes(size)
+                FILE_HEADER.pack_into(
+                    self._map, 0, MAGIC, self.slots, self.slot_size
+                )
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        self._pid = os.getpid()
+
+    def _write_lock(self):
+        mapping = self._mapping()
+        return _WriteLock(self._lock, self._fd), mapping
+
+    # Слоты.
+
+    def _offset(self, index):
+        return FILE_HEADER.size + index * self.slot_size
+
+    def _window(self, key_hash):
+        home = key_hash % self.slots
+        return [(home + step) % self.slots for step in range(self.probe)]
+
+    @staticmethod
+    def _hash(key):
+        digest = hashlib.blake2b(key, digest_size=8).digest()
+        # Нулевой хеш означает пустой слот.
+        return int.from_bytes(digest, 'little') | 1
+
+    def _read_slot(self, mapping, index, key, key_hash):
+        """
+        Читает значение слота без блокировки. Возвращает `(найден,
+        значение)`; значение копируется из файла, только если ключ совпал.
+        """
+        offset = self._offset(index)
+        for _ in range(READ_RETRIES):
+            seq, slot_hash, expires, key_len, value_len = (
+                SLOT_HEADER.unpack_from(mapping, offset)
+            )
+            if seq & 1:
+                continue
+            if slot_hash != key_hash:
+                return False, None
+            start = offset + SLOT_DATA_OFFSET
+            found = mapping[start:start + key_len] == key
+            data = mapping[start + key_len:start + key_len + value_len]
+            if SLOT_HEADER.unpack_from(mapping, offset)[0] != seq:
+                continue
+            if not found or (expires and expires < time.time()):
+                return False, None
+            ACCESS.pack_into(
+                mapping, offset + SLOT_HEADER.size, time.time_ns()
+            )
+            return True, data
+        return False, None
+
+    def _find(self, key):
+        mapping = self._mapping()
+        key_hash = self._hash(key)
+        for index in self._window(key_hash):
+            found, data = self._read_slot(mapping, index, key, key_hash)
+            if found:
+                return True, data
+        return False, None
+
+    def _write_slot(self, mapping, index, key_hash, expires, key, data):
+        offset = self._offset(index)
+        seq = SLOT_HEADER.unpack_from(mapping, offset)[0]
+        SLOT_HEADER.pack_into(mapping, offset, seq + 1, 0, 0.0, 0, 0)
+        start = offset + SLOT_DATA_OFFSET
+        mapping[start:start + len(key) + len(data)] = key + data
+        ACCESS.pack_into(mapping, offset + SLOT_HEADER.size, time.time_ns())
+        SLOT_HEADER.pack_into(
+            mapping, offset, seq + 2, key_hash if key else 0,
+            expires or 0.0, len(key), len(data)
+        )
+
+    def _choose_slot(self, mapping, key, key_hash):
+        """
+        Слот для записи: слот с тем же ключом, иначе пустой или
+        просроченный, иначе давно не читанный. Возвращает `(индекс,
+        ключ уже есть)`.
+        """
+        now = time.time()
+        free = None
+        candidates = []
+        for index in self._window(key_hash):
+            offset = self._offset(index)
+            _, slot_hash, expires, key_len, _ = SLOT_HEADER.unpack_from(
+                mapping, offset
+            )
+            start = offset + SLOT_DATA_OFFSET
+            if slot_hash == key_hash and mapping[start:start + key_len] == key:
+                return index, True
+            if free is None and (not slot_hash or 0 < expires < now):
+                free = index
+            candidates.append((
+                ACCESS.unpack_from(mapping, offset + SLOT_HEADER.size)[0],
+                index,
+            ))
+        if free is not None:
+            return free, False
+        return min(candidates)[1], False
+
+    def _store(self, mapping, key, value, timeout, only_new=False):
+        data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        key_hash = self._hash(key)
+        index, exists = self._choose_slot(mapping, key, key_hash)
+        if SLOT_DATA_OFFSET + len(key) + len(data) > self.slot_size:
+            # Значение не помещается; прежнее значение ключа устарело.
+            if exists and not only_new:
+                self._write_slot(mapping, index, 0, 0.0, b'', b'')
+            return False
+        if exists and only_new and self._read_slot(
+            mapping, index, key, key_hash
+        )[0]:
+            return False
+        self._write_slot(
+            mapping, index, key_hash, self.get_backend_timeout(timeout),
+            key, data
+        )
+        return True
+
+    # API кеша Django.
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key.encode()
+
+    def get(self, key, default=None, version=None):
+        found, data = self._find(self._key(key, version))
+        return pickle.loads(data) if found else default
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        lock, mapping = self._write_lock()
+        with lock:
+            # В отличие от встроенных бэкендов сообщает, сохранено ли
+            # значение: оно может не поместиться в слот.
+            return self._store(
+                mapping, self._key(key, version), value, timeout
+            )
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        lock, mapping = self._write_lock()
+        with lock:
+            return self._store(
+                mapping, self._key(key, version), value, timeout,
+                only_new=True
+            )
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        lock, mapping = self._write_lock()
+        with lock:
+            key = self._key(key, version)
+            found, data = self._find(key)
+            if found:
+                self._store(mapping, key, pickle.loads(data), timeout)
+            return found
+
+    def incr(self, key, delta=1, version=None):
+        lock, mapping = self._write_lock()
+        with lock:
+            key = self._key(key, version)
+            key_hash = self._hash(key)
+            index, exists = self._choose_slot(mapping, key, key_hash)
+            found, data = self._read_slot(mapping, index, key, key_hash)
+            if not (exists and found):
+                raise ValueError(f"Key '{key.decode()}' not found")
+            value = pickle.loads(data) + delta
+            expires = SLOT_HEADER.unpack_from(mapping, self._offset(index))[2]
+            self._write_slot(
+                mapping, index, key_hash, expires, key,
+                pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+            )
+            return value
+
+    def delete(self, key, version=None):
+        lock, mapping = self._write_lock()
+        with lock:
+            key = self._key(key, version)
+            key_hash = self._hash(key)
+            index, exists = self._choose_slot(mapping, key, key_hash)
+            if exists:
+                self._write_slot(mapping, index, 0, 0.0, b'', b'')
+            return exists
+
+    def has_key(self, key, version=None):
+        return self._find(self._key(key, version))[0]
+
+    def clear(self):
+        lock, mapping = self._write_lock()
+        with lock:
+            for index in range(self.slots):
+                if SLOT_HEADER.unpack_from(mapping, self._offset(index))[1]:
+                    self._write_slot(mapping, index, 0, 0.0, b'', b'')
+
+
+class _WriteLock:
+    """Блокировка записи: между потоками процесса и между процессами."""
+
+    def __init__(self, thread_lock, fd):
+        self.thread_lock = thread_lock
+        self.fd = fd
+
+    def __enter__(self):
+        self.thread_lock.acquire()
+        fcntl.flock(self.fd, fcntl.LOCK_EX)
+
+    def __exit__(self, *exc_info):
+        fcntl.flock(self.fd, fcntl.LOCK_UN)
+        self.thread_lock.release()
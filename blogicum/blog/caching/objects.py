@@ -0,0 +1,119 @@
+import copy
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+
+from ..constants import (
+    OBJECT_CACHE_ALIAS, OBJECT_CACHE_LOCAL_SIZE, OBJECT_CACHE_TIMEOUT
+)
+from ..models import Category, User
+from .versions import get_versions
+
+
+def _shared():
+    return caches[
+        getattr(settings, 'OBJECT_CACHE_ALIAS', OBJECT_CACHE_ALIAS)
+    ]
+
+
+class LocalLRU:
+    """Ограниченный по размеру кеш процесса, вытесняет давно не читанное."""
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._items.get(key)
+            if value is not None:
+                self._items.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+
+class ObjectCache:
+    """
+    Двухуровневый кеш небольших, часто читаемых объектов: LRU процесса
+    перед общим кешем. Запись хранится вместе с версией объекта и
+    действительна, пока версия не изменилась (см. `versions`), поэтому
+    изменение в одном процессе видно во всех. Возвращаются копии, чтобы
+    запросы не делили один экземпляр модели.
+    """
+
+    def __init__(self, kind, queryset, field='pk', max_size=None):
+        self.kind = kind
+        self.queryset = queryset
+        self.field = field
+        self.local = LocalLRU(max_size or getattr(
+            settings, 'OBJECT_CACHE_LOCAL_SIZE', OBJECT_CACHE_LOCAL_SIZE
+        ))
+
+    def _key(self, value):
+        model = self.queryset.model._meta.label_lower
+        return f'object:{model}:{self.field}:{value}'
+
+    def _version(self, pk):
+        return get_versions([(self.kind, pk)])[(self.kind, pk)]
+
+    def _valid(self, entry):
+        return entry is not None and self._version(entry[0].pk) == entry[1]
+
+    def get(self, value):
+        """
+        Возвращает объект по значению поля; при отсутствии в базе бросает
+        `DoesNotExist`, как `QuerySet.get`.
+        """
+        key = self._key(value)
+        entry = self.local.get(key)
+        if not self._valid(entry):
+            entry = _shared().get(key)
+            if not self._valid(entry):
+                entry = self._load(key, value, entry)
+            self.local.set(key, entry)
+        return copy.copy(entry[0])
+
+    def _load(self, key, value, stale):
+        # Версию читаем до выборки, чтобы изменение во время загрузки
+        # сделало запись недействительной. При поиске не по pk он известен
+        # только из прежней записи, иначе версия читается после выборки.
+        if self.field == 'pk':
+            pk = value
+        else:
+            pk = stale[0].pk if stale is not None else None
+        version = self._version(pk) if pk is not None else None
+        obj = self.queryset.get(**{self.field: value})
+        if obj.pk != pk:
+            version = self._version(obj.pk)
+        entry = (obj, version)
+        _shared().set(key, entry, getattr(
+            settings, 'OBJECT_CACHE_TIMEOUT', OBJECT_CACHE_TIMEOUT
+        ))
+        return entry
+
+
+# Хеш пароля не нужен для вывода и не должен лежать в кеше.
+_users = User.objects.defer('password')
+
+categories_by_slug = ObjectCache('category', Category.objects, 'slug')
+categories = ObjectCache('category', Category.objects)
+users_by_username = ObjectCache('user', _users, 'username')
+
+
+def clear_local():
+    """Очищает кеши процесса; общий кеш очищается отдельно."""
+    for cache in (categories_by_slug, categories, users_by_username):
+        cache.local.clear()
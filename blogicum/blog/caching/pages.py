@@ -0,0 +1,242 @@
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+from django.utils.timezone import get_current_timezone_name
+from django.utils.translation import get_language
+
+from ..constants import (
+    PAGE_CACHE_ALIAS, PAGE_CACHE_TIMEOUT, PAGE_CACHE_VIEWS,
+    PAGE_METRICS_FLUSH_INTERVAL,
+)
+from . import stampede
+from .versions import ALL, get_versions
+
+HITS_KEY = 'pagecache:hits'
+MISSES_KEY = 'pagecache:misses'
+STALE_KEY = 'pagecache:stale'
+# Cache-Control зависит от посетителя и выставляется в каждом ответе.
+SKIPPED_HEADERS = {
+    'set-cookie', 'vary', 'etag', 'last-modified', 'cache-control',
+}
+
+
+def _cache():
+    return caches[getattr(settings, 'PAGE_CACHE_ALIAS', PAGE_CACHE_ALIAS)]
+
+
+def feed_dependencies(feed):
+    """
+    Зависимости от состава ленты (`index`, `category:<id>`, `user:<id>`):
+    её версия и общая версия всех лент.
+    """
+    return (('feed', feed), ('feed', ALL))
+
+
+def record_dependencies(request, versions):
+    """
+    Отмечает версии объектов, из которых собрана кешируемая страница.
+    Версии должны быть прочитаны до чтения самих данных: тогда изменение
+    во время рендеринга сделает страницу недействительной. Вне кешируемого
+    запроса ничего не делает.
+    """
+    dependencies = getattr(request, '_page_dependencies', None)
+    if dependencies is None:
+        return
+    for pair, version in versions.items():
+        if pair in dependencies:
+            version = min(version, dependencies[pair])
+        dependencies[pair] = version
+
+
+def record_objects(request, pairs):
+    """Читает текущие версии объектов и отмечает их как зависимости."""
+    if getattr(request, '_page_dependencies', None) is not None:
+        record_dependencies(request, get_versions(pairs))
+
+
+def is_eligible(request):
+    """
+    Кешируются GET-запросы к лентам и страницам постов. Авторизованные
+    пользователи получают ту же общую страницу с подставленными
+    персональными фрагментами (см. `holes`), если это разрешено настройкой.
+    """
+    resolver_match = request.resolver_match
+    return (
+        getattr(settings, 'PAGE_CACHE_ENABLED', True)
+        and request.method in ('GET', 'HEAD')
+        and resolver_match is not None
+        and resolver_match.view_name in getattr(
+            settings, 'PAGE_CACHE_VIEWS', PAGE_CACHE_VIEWS
+        )
+        and not any(name.startswith('__') for name in request.GET)
+        and (
+            getattr(settings, 'PAGE_CACHE_AUTHENTICATED', False)
+            or not request.user.is_authenticated
+        )
+    )
+
+
+def locale_suffix():
+    # Даты на страницах зависят от языка и часового пояса. Код языка
+    # приводится к нижнему регистру: без активированного перевода (например,
+    # в потоке прогрева) get_language() возвращает LANGUAGE_CODE как есть.
+    return f'{get_language().lower()}:{get_current_timezone_name()}'
+
+
+def page_key(request):
+    return f'page:{request.get_full_path()}:{locale_suffix()}'
+
+
+def get_entry(request):
+    return _cache().get(page_key(request))
+
+
+def is_fresh(entry):
+    """
+    Страница действительна, пока не изменилась версия ни одного объекта,
+    из которого она собрана, и не подошёл срок досрочного обновления.
+    """
+    return (
+        get_versions(entry['dependencies']) == entry['dependencies']
+        and not stampede.should_refresh(entry['expires'], entry['delta'])
+    )
+
+
+def build_response(entry):
+    response = HttpResponse(entry['content'], status=entry['status'])
+    for header, value in entry['headers']:
+        response[header] = value
+    response.validator = entry['validator']
+    return response
+
+
+def start_page(request, stale=None):
+    """
+    Начинает сбор зависимостей страницы, которая будет закеширована,
+    и возвращает None. Если страницу уже пересчитывает другой процесс,
+    возвращает вместо этого её прежнюю версию `stale`, а без неё — версию,
+    которую тот процесс сохранит за время ожидания. Не дождавшись,
+    процесс собирает страницу сам.
+    """
+    cache = _cache()
+    key = page_key(request)
+    locked = stampede.acquire(cache, key)
+    if not locked:
+        entry = stale or stampede.wait_for_value(cache, key)
+        if entry is not None:
+            return entry
+    request._page_dependencies = {}
+    request._page_started = time.monotonic()
+    request._page_locked = locked
+    request._page_stale = stale
+    return None
+
+
+def finish_page(request):
+    if getattr(request, '_page_locked', False):
+        stampede.release(_cache(), page_key(request))
+        request._page_locked = False
+
+
+def store_page(request, response):
+    """
+    Сохраняет страницу в кеш; `False`, если она не кешируется или
+    не поместилась. Тогда пересчёт освобождается сразу, чтобы ждущие
+    процессы собрали страницу сами.
+    """
+    dependencies = getattr(request, '_page_dependencies', None)
+    if (
+        dependencies is None
+        or response.status_code != 200
+        or response.streaming
+        or response.cookies
+        or request.META.get('CSRF_COOKIE_USED')
+        or getattr(request, '_page_uncacheable', False)
+    ):
+        return False
+    timeout = getattr(settings, 'PAGE_CACHE_TIMEOUT', PAGE_CACHE_TIMEOUT)
+    stored = stampede.store(_cache(), page_key(request), {
+        'content': response.content,
+        'status': response.status_code,
+        'headers': [
+            (header, value) for header, value in response.items()
+            if header.lower() not in SKIPPED_HEADERS
+        ],
+        'dependencies': dependencies,
+        'validator': getattr(response, 'validator', None),
+        'created_at': time.time(),
+        'expires': time.time() + timeout,
+        'delta': time.monotonic() - request._page_started,
+    }, timeout)
+    if not stored:
+        mark_uncacheable(request)
+        finish_page(request)
+    return stored
+
+
+def mark_uncacheable(request):
+    request._page_uncacheable = True
+
+
+class _Counters:
+    """
+    Счётчики попаданий процесса. `incr` в общем кеше на файле берёт
+    блокировку всего файла, поэтому на каждом запросе счётчик растёт
+    только в памяти, а в кеш накопленное сбрасывается не чаще раза
+    в `PAGE_METRICS_FLUSH_INTERVAL` секунд.
+    """
+
+    def __init__(self):
+        self._counts = Counter()
+        self._lock = threading.Lock()
+        self._flushed_at = time.monotonic()
+
+    def add(self, key):
+        with self._lock:
+            self._counts[key] += 1
+            due = time.monotonic() - self._flushed_at >= getattr(
+                settings, 'PAGE_METRICS_FLUSH_INTERVAL',
+                PAGE_METRICS_FLUSH_INTERVAL,
+            )
+        if due:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            counts, self._counts = self._counts, Counter()
+            self._flushed_at = time.monotonic()
+        cache = _cache()
+        for key, delta in counts.items():
+            try:
+                cache.incr(key, delta)
+            except ValueError:
+                cache.add(key, 0, None)
+                cache.incr(key, delta)
+
+
+_counters = _Counters()
+
+
+def count(key):
+    _counters.add(key)
+
+
+def metrics():
+    # Накопленное этим процессом видно сразу, остальными — с задержкой
+    # до интервала сброса.
+    _counters.flush()
+    counters = _cache().get_many([HITS_KEY, MISSES_KEY, STALE_KEY])
+    hits = counters.get(HITS_KEY, 0)
+    misses = counters.get(MISSES_KEY, 0)
+    stale = counters.get(STALE_KEY, 0)
+    total = hits + misses + stale
+    return {
+        'hits': hits,
+        'misses': misses,
+        'stale': stale,
+        'hit_ratio': (hits + stale) / total if total else None,
+    }
@@ -0,0 +1,149 @@
+import logging
+import queue
+import threading
+import urllib.request
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.cache import patch_cache_control
+
+from ..constants import (
+    PROXY_CACHE_POLICIES, PROXY_PURGE_METHOD, PROXY_PURGE_TIMEOUT
+)
+
+SURROGATE_KEY_HEADER = 'Surrogate-Key'
+INDEX_KEY = 'index'
+
+logger = logging.getLogger(__name__)
+
+
+def post_keys(post):
+    """Суррогатные ключи объектов, из которых собрана карточка поста."""
+    keys = {f'post-{post.pk}', f'user-{post.author_id}'}
+    if post.category_id is not None:
+        keys.add(f'category-{post.category.slug}')
+    if post.location_id is not None:
+        keys.add(f'location-{post.location_id}')
+    return keys
+
+
+def add_surrogate_keys(request, keys):
+    """Отмечает объекты, по изменению которых прокси должен сбросить ответ."""
+    if not hasattr(request, '_surrogate_keys'):
+        request._surrogate_keys = set()
+    request._surrogate_keys.update(keys)
+
+
+def add_post_keys(request, posts):
+    for post in posts:
+        add_surrogate_keys(request, post_keys(post))
+
+
+def cache_policy(request):
+    resolver_match = request.resolver_match
+    if resolver_match is None:
+        return None
+    return getattr(
+        settings, 'PROXY_CACHE_POLICIES', PROXY_CACHE_POLICIES
+    ).get(resolver_match.view_name)
+
+
+def apply_cache_headers(request, response):
+    """
+    Выставляет Cache-Control по политике view и заголовок с суррогатными
+    ключами. Персональные ответы (пользователь вошёл, выдана cookie)
+    прокси не кеширует.
+    """
+    keys = getattr(request, '_surrogate_keys', None)
+    if keys and not response.has_header(SURROGATE_KEY_HEADER):
+        response[SURROGATE_KEY_HEADER] = ' '.join(sorted(keys))
+    policy = cache_policy(request)
+    if (
+        policy is None
+        or request.method not in ('GET', 'HEAD')
+        or response.status_code not in (200, 304)
+        or response.has_header('Cache-Control')
+    ):
+        return
+    if (
+        request.user.is_authenticated
+        or response.cookies
+        or request.META.get('CSRF_COOKIE_USED')
+    ):
+        patch_cache_control(response, private=True, max_age=0)
+    else:
+        patch_cache_control(response, public=True, **policy)
+
+
+def purge_enabled():
+    return bool(getattr(settings, 'PROXY_PURGE_URL', None))
+
+
+class PurgeDispatcher:
+    """
+    Отправляет прокси запросы на очистку по суррогатным ключам. Запросы
+    уходят из фонового потока, ключи, накопившиеся за время отправки,
+    объединяются в один запрос. Без PROXY_PURGE_URL ничего не делает.
+    """
+
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._worker = None
+
+    def purge(self, keys):
+        if not purge_enabled() or not keys:
+            return
+        self._queue.put(set(keys))
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, daemon=True)
+                self._worker.start()
+
+    def _run(self):
+        while True:
+            keys = self._queue.get()
+            batches = 1
+            while True:
+                try:
+                    keys |= self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                batches += 1
+            try:
+                self.send(keys)
+            except OSError as error:
+                logger.warning('Не удалось сбросить кеш прокси: %s', error)
+            finally:
+                for _ in range(batches):
+                    self._queue.task_done()
+
+    def send(self, keys):
+        request = urllib.request.Request(
+            settings.PROXY_PURGE_URL,
+            method=getattr(settings, 'PROXY_PURGE_METHOD', PROXY_PURGE_METHOD),
+            headers={SURROGATE_KEY_HEADER: ' '.join(sorted(keys))},
+        )
+        timeout = getattr(settings, 'PROXY_PURGE_TIMEOUT', PROXY_PURGE_TIMEOUT)
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            response.read()
+
+    def flush(self):
+        """Дожидается отправки всех поставленных в очередь ключей."""
+        self._queue.join()
+
+
+dispatcher = PurgeDispatcher()
+
+
+def purge(keys):
+    """Сбрасывает ключи в прокси после фиксации транзакции."""
+    if purge_enabled():
+        keys = set(keys)
+        transaction.on_commit(lambda: dispatcher.purge(keys))
+
+
+def purge_post(post):
+    """Сбрасывает страницы поста, его карточки и общую ленту."""
+    if purge_enabled():
+        purge({INDEX_KEY, *post_keys(post)})
@@ -0,0 +1,57 @@
+import math
+import random
+import time
+
+from ..constants import (
+    STAMPEDE_BETA, STAMPEDE_LOCK_TIMEOUT, STAMPEDE_STALE_TIMEOUT,
+    STAMPEDE_WAIT
+)
+
+LOCK_SUFFIX = ':lock'
+POLL_INTERVAL = 0.05
+
+
+def should_refresh(expires, delta, beta=STAMPEDE_BETA):
+    """
+    Вероятностное досрочное обновление (XFetch): чем ближе срок годности
+    и чем дольше пересчёт (`delta`), тем вероятнее обновить значение
+    заранее. Так истечение не совпадает у всех процессов одновременно.
+    """
+    jitter = -delta * beta * math.log(1.0 - random.random())
+    return time.time() + jitter >= expires
+
+
+def acquire(cache, key, timeout=STAMPEDE_LOCK_TIMEOUT):
+    """Занимает пересчёт ключа; `False`, если им уже занят другой процесс."""
+    return cache.add(key + LOCK_SUFFIX, True, timeout)
+
+
+def release(cache, key):
+    cache.delete(key + LOCK_SUFFIX)
+
+
+def store(cache, key, entry, timeout, stale_timeout=STAMPEDE_STALE_TIMEOUT):
+    """
+    Сохраняет значение; `False`, если бэкенд сообщил, что не сохранил его
+    (встроенные бэкенды ничего не возвращают).
+    """
+    # Запись живёт дольше срока годности: устаревшее значение отдаётся,
+    # пока один процесс считает новое.
+    return cache.set(key, entry, timeout + stale_timeout) is not False
+
+
+def wait_for_value(cache, key, wait=STAMPEDE_WAIT):
+    """
+    Ждёт до `wait` секунд, пока значение ключа сохранит процесс, занявший
+    его пересчёт. None, если не дождались или процесс освободил пересчёт,
+    не сохранив значения.
+    """
+    deadline = time.monotonic() + wait
+    while time.monotonic() < deadline:
+        time.sleep(POLL_INTERVAL)
+        entry = cache.get(key)
+        if entry is not None:
+            return entry
+        if cache.get(key + LOCK_SUFFIX) is None:
+            return cache.get(key)
+    return None
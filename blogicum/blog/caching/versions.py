@@ -0,0 +1,103 @@
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+from ..constants import CHANGE_LOG_TIMEOUT, VERSIONS_CACHE_ALIAS
+
+
+# Ключ версии всех объектов вида: `bump(kind, ALL)` меняет её при любом
+# изменении, которое не привязано к одной странице.
+ALL = 'all'
+
+
+def version_key(kind, pk):
+    return f'version:{kind}:{pk}'
+
+
+def change_key(kind, pk, version):
+    return f'change:{kind}:{pk}:{version}'
+
+
+def _cache():
+    return caches[
+        getattr(settings, 'VERSIONS_CACHE_ALIAS', VERSIONS_CACHE_ALIAS)
+    ]
+
+
+def _initial_version():
+    # Начальная версия — текущее время: после вытеснения ключа версия
+    # не повторит старую, и устаревшие фрагменты не оживут.
+    return time.time_ns()
+
+
+def get_versions(pairs):
+    """
+    Возвращает версии объектов для пар `(kind, pk)` одним обращением
+    к кешу. Отсутствующие версии инициализируются.
+    """
+    keys = {pair: version_key(*pair) for pair in pairs if pair[1] is not None}
+    cache = _cache()
+    found = cache.get_many(keys.values())
+    versions = {}
+    for pair, key in keys.items():
+        if key not in found:
+            cache.add(key, _initial_version(), None)
+            found[key] = cache.get(key)
+        versions[pair] = found[key]
+    return versions
+
+
+def bump(kind, pk):
+    """
+    Увеличивает версию объекта, инвалидируя зависящие от него фрагменты.
+    Возвращает новую версию.
+    """
+    if pk is None:
+        return None
+    key = version_key(kind, pk)
+    cache = _cache()
+    try:
+        return cache.incr(key)
+    except ValueError:
+        cache.add(key, _initial_version(), None)
+        return cache.get(key)
+
+
+def invalidate(*pairs):
+    """
+    Увеличивает версии пар `(kind, pk)` сразу и ещё раз после фиксации
+    транзакции (как `proxy.purge`). Между ними другой процесс может
+    прочитать новую версию и закешировать под ней прежние строки —
+    вторая версия делает такие записи недостижимыми. Первая нужна
+    чтениям самой транзакции.
+    """
+    for pair in pairs:
+        bump(*pair)
+    transaction.on_commit(lambda: [bump(*pair) for pair in pairs])
+
+
+def record_change(kind, pk, change):
+    """
+    Увеличивает версию объекта и записывает в журнал изменение, которое
+    к ней привело. Возвращает новую версию.
+    """
+    version = bump(kind, pk)
+    _cache().set(change_key(kind, pk, version), change, CHANGE_LOG_TIMEOUT)
+    return version
+
+
+def get_changes(kind, pk, start, end):
+    """
+    Изменения, которые перевели объект с версии `start` на `end`, по
+    порядку одним обращением к кешу. None, если журнал неполон: версию
+    увеличили без записи или запись вытеснена.
+    """
+    keys = [change_key(kind, pk, version) for version in range(
+        start + 1, end + 1
+    )]
+    found = _cache().get_many(keys)
+    if len(found) < len(keys):
+        return None
+    return [found[key] for key in keys]
@@ -0,0 +1,150 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.handlers.wsgi import WSGIHandler
+from django.db import connection
+from django.db.models import Count
+from django.test import RequestFactory
+from django.urls import reverse
+
+from ..constants import (
+    CACHE_WARM_AUTHORS, CACHE_WARM_HOST, CACHE_WARM_PAGES,
+    CACHE_WARM_QUERY_BUDGET, CACHE_WARM_WORKERS, FRAGMENT_CACHE_ALIAS,
+    OBJECT_CACHE_ALIAS, PAGE_CACHE_ALIAS,
+)
+from ..models import Category, Post, User
+from ..scheduling import check_scheduled_publications
+from ..utils import filter_published_posts
+
+
+def _paged(url, pages):
+    return [url] + [f'{url}?page={number}' for number in range(2, pages + 1)]
+
+
+def hot_urls(pages=CACHE_WARM_PAGES, authors=CACHE_WARM_AUTHORS):
+    """
+    Адреса для прогрева: первые страницы общей ленты и каждой
+    опубликованной категории, профили самых пишущих авторов и адреса
+    из настройки CACHE_WARM_URLS.
+    """
+    urls = _paged(reverse('blog:index'), pages)
+    for slug in Category.objects.filter(is_published=True).values_list(
+        'slug', flat=True
+    ):
+        urls += _paged(reverse('blog:category_posts', args=[slug]), pages)
+    top_authors = (
+        User.objects
+        .filter(posts__in=filter_published_posts(Post.objects))
+        .annotate(posts_count=Count('posts'))
+        .order_by('-posts_count')
+        .values_list('username', flat=True)[:authors]
+    )
+    for username in top_authors:
+        urls += _paged(reverse('blog:profile', args=[username]), pages)
+    urls += getattr(settings, 'CACHE_WARM_URLS', [])
+    return list(dict.fromkeys(urls))
+
+
+def process_local_aliases():
+    """Кеши страниц, фрагментов и объектов в памяти одного процесса."""
+    aliases = {
+        getattr(settings, name, default) for name, default in (
+            ('PAGE_CACHE_ALIAS', PAGE_CACHE_ALIAS),
+            ('FRAGMENT_CACHE_ALIAS', FRAGMENT_CACHE_ALIAS),
+            ('OBJECT_CACHE_ALIAS', OBJECT_CACHE_ALIAS),
+        )
+    }
+    return sorted(
+        alias for alias in aliases
+        if isinstance(caches[alias], LocMemCache)
+    )
+
+
+class QueryBudget:
+    """Общий на все потоки счётчик запросов к базе с пределом."""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.used = 0
+        self._lock = threading.Lock()
+
+    @property
+    def exhausted(self):
+        return self.used >= self.limit
+
+    def __call__(self, execute, sql, params, many, context):
+        with self._lock:
+            self.used += 1
+        return execute(sql, params, many, context)
+
+
+class CacheWarmer:
+    """
+    Пропускает анонимные запросы через обработчик WSGI со всем стеком
+    middleware, поэтому в кеш страниц и фрагментов попадает ровно то, что
+    увидит посетитель. Отдельному процессу (команде warm_cache) это
+    полезно, только если кеши общие для воркеров (см.
+    `process_local_aliases`). Тестовый клиент для этого не годится:
+    он подменяет обработчик и сигналы рендеринга шаблонов и не рассчитан
+    на потоки.
+    Параллельность ограничена пулом потоков; когда бюджет запросов к базе
+    исчерпан, оставшиеся адреса пропускаются.
+    """
+
+    def __init__(self, workers=None, query_budget=None):
+        self.workers = workers or getattr(
+            settings, 'CACHE_WARM_WORKERS', CACHE_WARM_WORKERS
+        )
+        self.budget = QueryBudget(query_budget or getattr(
+            settings, 'CACHE_WARM_QUERY_BUDGET', CACHE_WARM_QUERY_BUDGET
+        ))
+        self.host = getattr(settings, 'CACHE_WARM_HOST', CACHE_WARM_HOST)
+        self.factory = RequestFactory(HTTP_HOST=self.host)
+        # Цепочка middleware собирается один раз и общая для потоков,
+        # как у сервера приложений.
+        self.handler = WSGIHandler()
+
+    def warm(self, urls):
+        """Возвращает по строке результата на адрес: url, статус, время."""
+        # После очистки кешей отметка отложенных публикаций потеряна:
+        # первый запрос сбросит все ленты. Пусть это случится до прогрева,
+        # а не посреди него, сделав недействительными уже собранные
+        # страницы.
+        check_scheduled_publications()
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            return list(executor.map(self.fetch, urls))
+
+    def fetch(self, url):
+        if self.budget.exhausted:
+            return {'url': url, 'status': None, 'duration': 0.0}
+        start = time.perf_counter()
+        try:
+            with connection.execute_wrapper(self.budget):
+                response = self.handler.get_response(self.factory.get(url))
+                # Как после ответа сервера: request_finished и закрытие
+                # потокового содержимого.
+                response.close()
+        finally:
+            # У каждого потока пула своё соединение с базой.
+            connection.close()
+        return {
+            'url': url,
+            'status': response.status_code,
+            'cache': response.get('X-Page-Cache'),
+            'duration': time.perf_counter() - start,
+        }
+
+
+def warm_in_background():
+    """Прогрев при старте процесса, если включён CACHE_WARM_ON_STARTUP."""
+    if not getattr(settings, 'CACHE_WARM_ON_STARTUP', False):
+        return None
+    thread = threading.Thread(
+        target=lambda: CacheWarmer().warm(hot_urls()), daemon=True
+    )
+    thread.start()
+    return thread
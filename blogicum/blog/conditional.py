@@ -0,0 +1,56 @@
+import hashlib
+
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
+
+from .caching.versions import ALL, get_versions
+
+# Общие версии видов, которые выводятся на страницах лент и постов:
+# названия категорий и местоположений, имена авторов, комментарии.
+SHARED_VERSIONS = (
+    ('category', ALL), ('location', ALL), ('user', ALL), ('comments', ALL),
+)
+
+
+def _validator(pairs):
+    """
+    База ETag из версий объектов (см. `caching.versions`): одно чтение
+    из кеша версий, без запросов к базе. Версии меняются и при удалении,
+    поэтому Last-Modified не выдаётся — по дате изменения удаление
+    не отличить от отсутствия правок.
+    """
+    versions = get_versions(pairs)
+    return hashlib.md5(
+        repr([versions[pair] for pair in pairs]).encode()
+    ).hexdigest()
+
+
+def feed_validator(feed):
+    """
+    Валидатор ленты `feed` (имя как в `caching.feeds`): версия ленты
+    меняется при изменении, удалении и наступлении публикации её постов,
+    общая версия лент — при сбросе всех лент сразу.
+    """
+    return _validator([('feed', feed), ('feed', ALL), *SHARED_VERSIONS])
+
+
+def post_validator(post_id):
+    """Валидатор страницы поста: сам пост и его ветка комментариев."""
+    return _validator([
+        ('post', post_id), ('comments', post_id), *SHARED_VERSIONS,
+    ])
+
+
+def _etag(request, base):
+    # Страница зависит от пользователя (шапка, кнопки), поэтому и ETag.
+    return quote_etag(f'{base}-{request.user.pk or 0}')
+
+
+def not_modified(request, validator):
+    """Ответ 304, если копия клиента актуальна, иначе None."""
+    return get_conditional_response(request, etag=_etag(request, validator))
+
+
+def set_validator_headers(request, response, validator):
+    response.validator = validator
+    response['ETag'] = _etag(request, validator)
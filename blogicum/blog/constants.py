@@ -1,2 +1,111 @@
 MAX_TEXT_LENGTH = 256
 LATEST_POSTS_COUNT = 10
+# Анонс поста в карточке: столько слов текста, не длиннее EXCERPT_LENGTH.
+EXCERPT_WORDS = 10
+EXCERPT_LENGTH = 512
+
+# Статистика SQL-запросов (аналог pg_stat_statements).
+QUERY_STATS_MAX_FINGERPRINTS = 500
+QUERY_STATS_FLUSH_INTERVAL = 60
+QUERY_STATS_TOP = 20
+
+# Профилирование запросов по требованию (`?__profile=1`).
+PROFILER_SAMPLE_INTERVAL = 0.005
+PROFILER_MAX_REPORTS = 50
+
+# Профилирование рендеринга шаблонов (`?__templates=1`).
+TEMPLATE_REPORT_TOP = 30
+TEMPLATE_REPORTS_MAX = 50
+
+# Учёт памяти запросов через tracemalloc.
+MEMORY_SNAPSHOT_EVERY = 20
+MEMORY_TOP_SITES = 50
+MEMORY_STATS_FLUSH_INTERVAL = 60
+
+# Кеширование фрагментов шаблонов с версиями объектов.
+VERSIONS_CACHE_ALIAS = 'default'
+FRAGMENT_CACHE_ALIAS = 'default'
+FRAGMENT_CACHE_TIMEOUT = 60 * 60
+
+# Кеш страниц для анонимных посетителей.
+PAGE_CACHE_ALIAS = 'default'
+PAGE_CACHE_TIMEOUT = 5 * 60
+PAGE_CACHE_VIEWS = (
+    'blog:index', 'blog:category_posts', 'blog:profile', 'blog:post_detail',
+    'blog:index_cards', 'blog:category_cards', 'blog:profile_cards',
+)
+# Как часто счётчики попаданий процесса сбрасываются в общий кеш.
+PAGE_METRICS_FLUSH_INTERVAL = 10
+
+# Отслеживание наступления дат отложенных публикаций.
+SCHEDULING_CACHE_ALIAS = 'default'
+SCHEDULING_RECHECK_INTERVAL = 60 * 60
+
+# Политика кеширования для обратного прокси по имени view. `max_age` —
+# для браузера, `s_maxage` — для прокси.
+PROXY_CACHE_POLICIES = {
+    'pages:about': {'max_age': 60 * 60, 's_maxage': 24 * 60 * 60},
+    'pages:rules': {'max_age': 60 * 60, 's_maxage': 24 * 60 * 60},
+    'blog:index': {
+        'max_age': 0, 's_maxage': 60, 'stale_while_revalidate': 5 * 60,
+    },
+    'blog:category_posts': {
+        'max_age': 0, 's_maxage': 60, 'stale_while_revalidate': 5 * 60,
+    },
+    'blog:profile': {
+        'max_age': 0, 's_maxage': 60, 'stale_while_revalidate': 5 * 60,
+    },
+    'blog:post_detail': {
+        'max_age': 0, 's_maxage': 60, 'stale_while_revalidate': 5 * 60,
+    },
+    'blog:index_cards': {
+        'max_age': 0, 's_maxage': 60, 'stale_while_revalidate': 5 * 60,
+    },
+    'blog:category_cards': {
+        'max_age': 0, 's_maxage': 60, 'stale_while_revalidate': 5 * 60,
+    },
+    'blog:profile_cards': {
+        'max_age': 0, 's_maxage': 60, 'stale_while_revalidate': 5 * 60,
+    },
+}
+PROXY_PURGE_METHOD = 'PURGE'
+PROXY_PURGE_TIMEOUT = 2
+
+# Защита от лавины пересчётов при истечении кеша.
+STAMPEDE_BETA = 1.0
+STAMPEDE_LOCK_TIMEOUT = 30
+STAMPEDE_STALE_TIMEOUT = 10 * 60
+STAMPEDE_WAIT = 2
+
+# Двухуровневый кеш категорий, местоположений и пользователей.
+OBJECT_CACHE_ALIAS = 'default'
+OBJECT_CACHE_LOCAL_SIZE = 256
+OBJECT_CACHE_TIMEOUT = 60 * 60
+
+# Прогрев кеша страниц после выкладки или сброса.
+CACHE_WARM_PAGES = 2
+CACHE_WARM_AUTHORS = 10
+CACHE_WARM_WORKERS = 4
+CACHE_WARM_QUERY_BUDGET = 1000
+CACHE_WARM_HOST = 'localhost'
+
+# Общий для процессов узла кеш страниц в отображённом в память файле.
+MMAP_CACHE_SLOTS = 512
+MMAP_CACHE_SLOT_SIZE = 128 * 1024
+MMAP_CACHE_PROBE = 8
+
+# Индексы лент: массивы id постов в памяти процесса.
+FEED_INDEX_MAX_FEEDS = 1000
+FEED_INDEX_STREAM_CHUNK = 2000
+# Журнал изменений по версиям: сколько хранится запись и на сколько
+# версий индекс ленты может отстать, чтобы догнать её по журналу.
+CHANGE_LOG_TIMEOUT = 60 * 60
+FEED_LOG_MAX_GAP = 100
+
+# Пакет для заполнения анонсов постов.
+EXCERPT_BACKFILL_BATCH = 500
+
+# Комментарии на странице поста.
+COMMENTS_PAGE_SIZE = 50
+# Последние комментарии под карточкой поста на главной.
+LATEST_COMMENTS_COUNT = 2
@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand
+
+from blog.caching.proxy import purge
+from blog.caching.versions import invalidate
+from blog.constants import EXCERPT_BACKFILL_BATCH
+from blog.models import Post
+from blog.utils import make_excerpt
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет анонсы постов, сохранённых до появления поля или '
+        'изменённых в обход save() (например, через QuerySet.update).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=EXCERPT_BACKFILL_BATCH
+        )
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Пересчитать анонсы всех постов, а не только пустые.'
+        )
+
+    def handle(self, *args, **options):
+        posts = Post.objects.all() if options['all'] else Post.objects.filter(
+            excerpt=''
+        ).exclude(text='')
+        batch_size = options['batch_size']
+        updated = 0
+        last_id = 0
+        while True:
+            # Постранично по id: только id и текст, без остальных столбцов.
+            batch = list(
+                posts.filter(id__gt=last_id).order_by('id')
+                .only('id', 'text')[:batch_size]
+            )
+            if not batch:
+                break
+            for post in batch:
+                post.excerpt = make_excerpt(post.text)
+            Post.objects.bulk_update(batch, ['excerpt'])
+            # bulk_update не шлёт сигналов: карточки сбрасываются здесь.
+            invalidate(*[('post', post.pk) for post in batch])
+            purge({f'post-{post.pk}' for post in batch})
+            updated += len(batch)
+            last_id = batch[-1].id
+        self.stdout.write(f'Обновлено анонсов: {updated}.')
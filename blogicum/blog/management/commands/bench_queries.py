@@ -0,0 +1,72 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from blog.constants import LATEST_POSTS_COUNT
+from blog.models import Post
+from blog.prepared import (
+    comment_thread, post_by_id, post_card_rows, post_cards
+)
+
+
+def timed(func, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) * 1_000_000 / repeat
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает горячие запросы через ORM и подготовленные запросы: '
+        'время подготовки SQL и полного выполнения на вызов.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=500)
+
+    def handle(self, *args, **options):
+        ids = list(Post.objects.order_by('-pub_date').values_list(
+            'id', flat=True
+        )[:LATEST_POSTS_COUNT]) or list(range(1, LATEST_POSTS_COUNT + 1))
+        shapes = {
+            'карточки ленты': (post_cards, {'ids': ids}),
+            'строки карточек': (post_card_rows, {'ids': ids}),
+            'пост по id': (post_by_id, {'id': ids[0]}),
+            'комментарии': (comment_thread, {'post_id': ids[0]}),
+        }
+        self.stdout.write(
+            'Запрос: подготовка SQL ORM / подготовленный, выполнение '
+            'ORM / подготовленный, мкс на вызов'
+        )
+        for name, (query, params) in shapes.items():
+            self.stdout.write(
+                f'  {name:<16}'
+                + ''.join(
+                    f' {value:9.1f}'
+                    for value in self.measure(
+                        query, params, options['repeat']
+                    )
+                )
+            )
+
+    @staticmethod
+    def measure(query, params, repeat):
+        connection = connections[DEFAULT_DB_ALIAS]
+
+        def orm_sql():
+            query.build(**params).query.get_compiler(
+                DEFAULT_DB_ALIAS
+            ).as_sql()
+
+        def prepared_sql():
+            query.compiled(params).bind(params, connection)
+
+        query(**params)
+        return (
+            timed(orm_sql, repeat),
+            timed(prepared_sql, repeat),
+            timed(lambda: list(query.build(**params)), repeat),
+            timed(lambda: query(**params), repeat),
+        )
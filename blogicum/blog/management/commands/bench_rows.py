@@ -0,0 +1,66 @@
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+from django.template import engines
+
+from blog.management.commands.bench_templates import INCLUDE_LOOP
+from blog.perf.bench import card_values, models_from_values
+from blog.rows import post_row
+from blog.templating import warm_templates
+
+PAGE_SIZES = (10, 50, 100)
+
+
+def build_rows(values):
+    return [post_row(row) for row in values]
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает страницу ленты из экземпляров моделей и из строк '
+        'PostRow: время построения и рендеринга, пиковую память.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=50)
+
+    def handle(self, *args, **options):
+        warm_templates()
+        template = engines['django'].from_string(INCLUDE_LOOP)
+        builders = {'модели': models_from_values, 'строки': build_rows}
+        self.stdout.write(
+            'Постов: вариант, построение мкс/пост, рендеринг мкс/пост, '
+            'память КиБ/страница'
+        )
+        for page_size in PAGE_SIZES:
+            values = card_values(page_size)
+            for name, build in builders.items():
+                build_time, render_time, peak = self.measure(
+                    build, values, template, options['repeat']
+                )
+                self.stdout.write(
+                    f'  {page_size:>4} {name:<7} {build_time:8.1f} '
+                    f'{render_time:8.1f} {peak / 1024:10.1f}'
+                )
+
+    @staticmethod
+    def measure(build, values, template, repeat):
+        per_post = 1_000_000 / repeat / len(values)
+        start = time.perf_counter()
+        for _ in range(repeat):
+            build(values)
+        build_time = (time.perf_counter() - start) * per_post
+        posts = build(values)
+        template.render({'page_obj': posts})
+        start = time.perf_counter()
+        for _ in range(repeat):
+            template.render({'page_obj': posts})
+        render_time = (time.perf_counter() - start) * per_post
+        tracemalloc.start()
+        try:
+            build(values)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        return build_time, render_time, peak
@@ -0,0 +1,57 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.template import engines
+
+from blog.perf.bench import build_posts, without_fragment_cache
+from blog.templating import warm_templates
+
+PAGE_SIZES = (10, 50, 100)
+
+INCLUDE_LOOP = '''
+{% for post in page_obj %}
+  <article class="mb-5">
+    {% include "includes/post_card.html" %}
+  </article>
+{% endfor %}
+'''
+POST_CARDS_TAG = '{% load blog_tags %}{% post_cards page_obj %}'
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает стоимость рендеринга карточки поста через '
+        '{% include %} в цикле и через тег {% post_cards %}.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=50)
+
+    def handle(self, *args, **options):
+        # Иначе `post_cards` отдавал бы готовые карточки из кеша
+        # фрагментов, а не рендерил их.
+        with without_fragment_cache():
+            self.bench(options['repeat'])
+
+    def bench(self, repeat):
+        warm_templates()
+        engine = engines['django']
+        variants = {
+            'include': engine.from_string(INCLUDE_LOOP),
+            'post_cards': engine.from_string(POST_CARDS_TAG),
+        }
+        self.stdout.write('Постов на странице: мкс на карточку')
+        for page_size in PAGE_SIZES:
+            posts = build_posts(page_size, text_length=500)
+            timings = []
+            for name, template in variants.items():
+                template.render({'page_obj': posts})
+                start = time.perf_counter()
+                for _ in range(repeat):
+                    template.render({'page_obj': posts})
+                per_card = (
+                    (time.perf_counter() - start)
+                    / repeat / page_size * 1_000_000
+                )
+                timings.append(f'{name} {per_card:8.1f}')
+            self.stdout.write(f'  {page_size:>4}: ' + '  '.join(timings))
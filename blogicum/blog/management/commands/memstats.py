@@ -0,0 +1,95 @@
+import gc
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+from django.template.loader import render_to_string
+
+from blog.perf.bench import build_posts, without_fragment_cache
+from blog.perf.memory import SNAPSHOT_KIND, memory_stats, merged_report
+from blog.perf.storage import clear_snapshots
+
+BENCH_PAGE_SIZES = (10, 50, 100)
+BENCH_TEXT_LENGTHS = (1_000, 10_000, 100_000)
+
+
+class Command(BaseCommand):
+    help = (
+        'Выводит статистику памяти по view и места наибольших выделений; '
+        'с --bench замеряет стоимость страницы ленты.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=20)
+        parser.add_argument('--reset', action='store_true')
+        parser.add_argument(
+            '--bench', action='store_true',
+            help='Замерить память на материализацию и рендеринг ленты.'
+        )
+
+    def handle(self, *args, **options):
+        if options['reset']:
+            memory_stats.reset()
+            clear_snapshots(SNAPSHOT_KIND)
+            self.stdout.write('Статистика памяти очищена.')
+        elif options['bench']:
+            self.bench()
+        else:
+            self.report(options['top'])
+
+    def report(self, top):
+        views, sites = merged_report()
+        if not views:
+            self.stdout.write(
+                'Снимков нет: включите MEMORY_PROFILER_ENABLED.'
+            )
+            return
+        self.stdout.write('View: запросов, пик в среднем/макс, блоков')
+        for entry in views[:top]:
+            blocks = entry['blocks_mean']
+            self.stdout.write(
+                f"  {entry['view']:<30} {entry['requests']:>7} "
+                f"{entry['peak_mean'] / 1024:10.1f} КиБ "
+                f"{entry['peak_max'] / 1024:10.1f} КиБ "
+                f"{'—' if blocks is None else f'{blocks:.0f}':>8}"
+            )
+        self.stdout.write('Места выделений:')
+        for site in sites[:top]:
+            self.stdout.write(
+                f"  {site['size'] / 1024:10.1f} КиБ {site['count']:>8} "
+                f"{site['site']}"
+            )
+
+    def bench(self):
+        self.stdout.write(
+            'Страница, длина текста: пик на материализацию / на рендеринг'
+        )
+        # Иначе замер рендеринга показывал бы попадания в кеш фрагментов.
+        with without_fragment_cache():
+            self.bench_pages()
+
+    def bench_pages(self):
+        # Компиляция шаблонов и первые запросы — до замеров.
+        render_to_string('blog/index.html', {'page_obj': build_posts(1, 1)})
+        tracemalloc.start()
+        try:
+            for page_size in BENCH_PAGE_SIZES:
+                for text_length in BENCH_TEXT_LENGTHS:
+                    # Мусор прошлого замера не должен освобождаться
+                    # внутри следующего.
+                    gc.collect()
+                    tracemalloc.reset_peak()
+                    baseline = tracemalloc.get_traced_memory()[0]
+                    posts = build_posts(page_size, text_length)
+                    built = tracemalloc.get_traced_memory()[1] - baseline
+                    tracemalloc.reset_peak()
+                    baseline = tracemalloc.get_traced_memory()[0]
+                    render_to_string('blog/index.html', {'page_obj': posts})
+                    rendered = tracemalloc.get_traced_memory()[1] - baseline
+                    self.stdout.write(
+                        f'  {page_size:>4} × {text_length:>7}: '
+                        f'{built / 1024:10.1f} КиБ / '
+                        f'{rendered / 1024:10.1f} КиБ'
+                    )
+                    del posts
+        finally:
+            tracemalloc.stop()
@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand
+
+from blog.constants import QUERY_STATS_TOP
+from blog.perf.querystats import (
+    SNAPSHOT_KIND, query_stats, read_fingerprints, top_fingerprints
+)
+from blog.perf.storage import clear_snapshots
+
+ORDERINGS = ('total_time', 'mean_time', 'max_time', 'calls', 'rows')
+
+
+class Command(BaseCommand):
+    help = 'Выводит самые затратные отпечатки SQL-запросов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=QUERY_STATS_TOP)
+        parser.add_argument(
+            '--order-by', choices=ORDERINGS, default='total_time'
+        )
+        parser.add_argument(
+            '--reset', action='store_true',
+            help='Удалить накопленные снимки статистики.'
+        )
+
+    def handle(self, *args, **options):
+        if options['reset']:
+            query_stats.reset()
+            clear_snapshots(SNAPSHOT_KIND)
+            self.stdout.write('Статистика запросов очищена.')
+            return
+        entries = read_fingerprints()
+        if not entries:
+            self.stdout.write('Снимков статистики пока нет.')
+            return
+        # Доля от времени всех запросов, а не только выведенных.
+        grand_total = sum(entry['total_time'] for entry in entries) or 1
+        for entry in top_fingerprints(
+            entries, options['top'], options['order_by']
+        ):
+            self.stdout.write(
+                f"{entry['calls']:>8} вызовов  "
+                f"всего {entry['total_time'] * 1000:10.1f} мс "
+                f"({entry['total_time'] / grand_total:6.1%})  "
+                f"среднее {entry['mean_time'] * 1000:8.2f} мс  "
+                f"макс {entry['max_time'] * 1000:8.2f} мс  "
+                f"строк {entry['rows']}"
+            )
+            if entry['views']:
+                self.stdout.write(f"    views: {', '.join(entry['views'])}")
+            self.stdout.write(f"    {entry['query']}")
@@ -0,0 +1,59 @@
+from django.core.management.base import BaseCommand
+
+from blog.caching.warming import (
+    CacheWarmer, hot_urls, process_local_aliases
+)
+from blog.constants import (
+    CACHE_WARM_AUTHORS, CACHE_WARM_PAGES, CACHE_WARM_QUERY_BUDGET,
+    CACHE_WARM_WORKERS
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Прогревает общие для воркеров кеши страниц, фрагментов и объектов: '
+        'общую ленту, категории, профили самых пишущих авторов и адреса '
+        'из CACHE_WARM_URLS. Индексы лент и LRU живут в памяти каждого '
+        'воркера, их прогревает CACHE_WARM_ON_STARTUP.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pages', type=int, default=CACHE_WARM_PAGES)
+        parser.add_argument(
+            '--authors', type=int, default=CACHE_WARM_AUTHORS
+        )
+        parser.add_argument(
+            '--workers', type=int, default=CACHE_WARM_WORKERS
+        )
+        parser.add_argument(
+            '--budget', type=int, default=CACHE_WARM_QUERY_BUDGET,
+            help='Предел числа запросов к базе за весь прогрев.'
+        )
+        parser.add_argument(
+            '--url', action='append', default=[],
+            help='Дополнительный адрес; можно указать несколько раз.'
+        )
+
+    def handle(self, *args, **options):
+        for alias in process_local_aliases():
+            self.stderr.write(
+                f'Кеш `{alias}` в памяти процесса: команда не прогреет его '
+                'для воркеров.'
+            )
+        urls = hot_urls(options['pages'], options['authors'])
+        urls += [url for url in options['url'] if url not in urls]
+        warmer = CacheWarmer(options['workers'], options['budget'])
+        results = warmer.warm(urls)
+        for result in results:
+            if result['status'] is None:
+                self.stdout.write(f"  пропущен      {result['url']}")
+                continue
+            self.stdout.write(
+                f"  {result['status']} {result.get('cache') or '—':<5} "
+                f"{result['duration'] * 1000:7.1f} мс {result['url']}"
+            )
+        skipped = sum(result['status'] is None for result in results)
+        self.stdout.write(
+            f'Прогрето адресов: {len(results) - skipped}, пропущено по '
+            f'бюджету: {skipped}, запросов к базе: {warmer.budget.used}.'
+        )
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.16 on 2026-10-19 10:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0005_remove_comment_created_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='excerpt',
+            field=models.CharField(blank=True, editable=False, help_text='Начало текста для карточки; обновляется при сохранении.', max_length=512, verbose_name='Анонс'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+from django.db import migrations
+
+from blog.constants import EXCERPT_BACKFILL_BATCH
+from blog.utils import make_excerpt
+
+
+def backfill_excerpts(apps, schema_editor):
+    """
+    Анонсы постов, сохранённых до появления поля: без них карточка
+    загружает полный текст. Расхождения после QuerySet.update исправляет
+    команда backfill_excerpts.
+    """
+    Post = apps.get_model('blog', 'Post')
+    posts = Post.objects.using(schema_editor.connection.alias).filter(
+        excerpt=''
+    ).exclude(text='')
+    last_id = 0
+    while True:
+        batch = list(
+            posts.filter(id__gt=last_id).order_by('id')
+            .only('id', 'text')[:EXCERPT_BACKFILL_BATCH]
+        )
+        if not batch:
+            break
+        for post in batch:
+            post.excerpt = make_excerpt(post.text)
+        Post.objects.using(schema_editor.connection.alias).bulk_update(
+            batch, ['excerpt']
+        )
+        last_id = batch[-1].id
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0009_stats'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_excerpts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,44 @@
+from django.db import migrations
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils.timezone import now
+
+
+def create_stats(apps, schema_editor):
+    """
+    Счётчики существующих категорий и авторов: недостающие строки
+    создаются и затем все пересчитываются тем же UPDATE, что и в `stats`.
+    Новым категориям и пользователям строки создают сигналы сохранения.
+    """
+    alias = schema_editor.connection.alias
+    Post = apps.get_model('blog', 'Post')
+    for model_name, owner_model, field in (
+        ('CategoryStats', apps.get_model('blog', 'Category'), 'category_id'),
+        ('UserStats', apps.get_model('auth', 'User'), 'author_id'),
+    ):
+        model = apps.get_model('blog', model_name)
+        model.objects.using(alias).bulk_create([
+            model(pk=pk) for pk in owner_model.objects.using(
+                alias
+            ).values_list('pk', flat=True)
+        ], ignore_conflicts=True)
+        visible = Post.objects.using(alias).filter(
+            is_published=True, pub_date__lte=now(),
+            category__is_published=True, **{field: OuterRef('pk')},
+        ).order_by()
+        model.objects.using(alias).update(post_count=Coalesce(Subquery(
+            visible.values(field).annotate(count=Count('id')).values('count'),
+            output_field=IntegerField(),
+        ), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('blog', '0010_backfill_excerpts'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_stats, migrations.RunPython.noop),
+    ]
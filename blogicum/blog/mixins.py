@@ -1,15 +1,48 @@
+from django.conf import settings
 from django.urls import reverse_lazy
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
-from django.core.exceptions import PermissionDenied
-from django.http import Http404
+from django.core.exceptions import BadRequest, PermissionDenied
+from django.http import Http404, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, redirect
 from django.views.generic import DeleteView
+from django.views.generic.detail import SingleObjectMixin
 
+from .caching.objects import categories_by_slug
+from .conditional import not_modified, set_validator_headers
 from .forms import CommentForm
 from .models import Comment, Post, Category
+from .templating import stream_template
+from .utils import parse_date_cursor
 
 
-class CommentMixin(LoginRequiredMixin):
+def identity_map(request):
+    """
+    Объекты, загруженные за время запроса, по модели и pk. Миксины берут
+    объект отсюда, поэтому проверка прав, форма и удаление работают
+    с одним экземпляром и строка читается из базы один раз.
+    """
+    if not hasattr(request, '_identity_map'):
+        request._identity_map = {}
+    return request._identity_map
+
+
+class IdentityMapMixin:
+    """`get_object` через карту объектов запроса; загрузка — `load_object`."""
+
+    def get_object(self, queryset=None):
+        objects = identity_map(self.request)
+        key = (self.model, self.kwargs[self.pk_url_kwarg])
+        if key not in objects:
+            objects[key] = self.load_object()
+        return objects[key]
+
+    def load_object(self):
+        raise NotImplementedError(
+            'Определите load_object() в классе-наследнике.'
+        )
+
+
+class CommentMixin(IdentityMapMixin, LoginRequiredMixin):
     """Общий миксин для работы с комментариями: редактирование и удаление."""
 
     model = Comment
@@ -19,13 +52,13 @@ class CommentMixin(LoginRequiredMixin):
 
     def dispatch(self, request, *args, **kwargs):
         self.object = self.get_object()
-        if self.object.author != request.user:
+        if self.object.author_id != request.user.id:
             raise PermissionDenied(
                 'Вы не авторизованы для выполнения этого действия.'
             )
         return super().dispatch(request, *args, **kwargs)
 
-    def get_object(self, queryset=None):
+    def load_object(self):
         return get_object_or_404(
             Comment,
             id=self.kwargs.get(self.pk_url_kwarg),
@@ -58,7 +91,7 @@ class CommentMixin(LoginRequiredMixin):
 class OnlyAuthorMixin(UserPassesTestMixin):
 
     def test_func(self):
-        return self.get_object().author == self.request.user
+        return self.get_object().author_id == self.request.user.id
 
 
 class CategoryAvailableMixin:
@@ -66,7 +99,10 @@ class CategoryAvailableMixin:
 
     def get_category(self):
         category_slug = self.kwargs['category_slug']
-        category = get_object_or_404(Category, slug=category_slug)
+        try:
+            category = categories_by_slug.get(category_slug)
+        except Category.DoesNotExist:
+            raise Http404('Категория не найдена.')
 
         if not category.is_published:
             raise Http404('Категория скрыта.')
@@ -74,17 +110,105 @@ class CategoryAvailableMixin:
         return category
 
 
-class PostMixin(LoginRequiredMixin):
+class PostMixin(IdentityMapMixin, LoginRequiredMixin):
     """Миксин для общего функционала редактирования и удаления публикации."""
 
     model = Post
     pk_url_kwarg = 'post_id'
     template_name = 'blog/create.html'
 
-    def get_object(self, queryset=None):
+    def load_object(self):
         return get_object_or_404(self.model, id=self.kwargs[self.pk_url_kwarg])
 
     def get_success_url(self):
         return reverse_lazy(
             'blog:post_detail', kwargs={'post_id': self.kwargs['post_id']}
         )
+
+
+class ConditionalGetMixin:
+    """
+    Поддержка условных GET-запросов: валидатор страницы строится из версий
+    объектов до основной выборки, и при совпадении ETag клиент получает
+    304 без рендеринга.
+    """
+
+    def get_validator(self):
+        raise NotImplementedError(
+            'Определите get_validator() в классе-наследнике.'
+        )
+
+    def get(self, request, *args, **kwargs):
+        validator = self.get_validator()
+        response = not_modified(request, validator)
+        if response is not None:
+            return response
+        response = super().get(request, *args, **kwargs)
+        set_validator_headers(request, response, validator)
+        return response
+
+
+class StreamingMixin:
+    """
+    Потоковая отдача страницы (настройка STREAMING_PAGES): части шаблона
+    до меток `{% flush %}` уходят клиенту по мере рендеринга, начиная
+    с `<head>`. Поток используется, только когда страница не собирается
+    для кеша страниц. Ставится после ConditionalGetMixin: валидатор
+    строится из версий без запросов к базе, поэтому 304 и ETag работают
+    и для потокового ответа.
+    """
+
+    def wants_stream(self):
+        request = self.request
+        return (
+            getattr(settings, 'STREAMING_PAGES', False)
+            and request.method == 'GET'
+            and getattr(request, '_page_dependencies', None) is None
+            and not any(name.startswith('__') for name in request.GET)
+        )
+
+    def get_stream_context(self):
+        """Контекст шаблона — то же, что собирает get() ListView/DetailView."""
+        if isinstance(self, SingleObjectMixin):
+            self.object = self.get_object()
+            return self.get_context_data(object=self.object)
+        self.object_list = self.get_queryset()
+        return self.get_context_data()
+
+    def get(self, request, *args, **kwargs):
+        if not self.wants_stream():
+            return super().get(request, *args, **kwargs)
+        # Выборки страницы выполняются до ответа: 404 должен успеть
+        # стать статусом. После них остаётся только рендеринг.
+        context = self.get_stream_context()
+        response = StreamingHttpResponse(stream_template(
+            self.get_template_names(), context, request
+        ))
+        # Иначе nginx соберёт поток в буфер и отдаст одним куском.
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+
+class CursorMixin:
+    """
+    Порции ленты или ветки для подгрузки при прокрутке: курсор `after`,
+    ответ HTML или JSON (`?format=json`), адрес следующей порции
+    в заголовке `Link`.
+    """
+
+    def get_after(self):
+        try:
+            return parse_date_cursor(self.request.GET['after'])
+        except KeyError:
+            return None
+        except ValueError:
+            raise BadRequest('Неверный курсор.')
+
+    def wants_json(self):
+        return self.request.GET.get('format') == 'json'
+
+    @staticmethod
+    def link_next(response, next_url):
+        if next_url:
+            response['Link'] = f'<{next_url}>; rel="next"'
+        return response
@@ -1,7 +1,10 @@
+from types import SimpleNamespace
+
 from django.db import models
 from django.contrib.auth import get_user_model
 
-from .constants import MAX_TEXT_LENGTH
+from .constants import EXCERPT_LENGTH, MAX_TEXT_LENGTH
+from .utils import make_excerpt
 
 
 User = get_user_model()
@@ -127,6 +130,13 @@ class Post(models.Model):
         auto_now_add=True,
         verbose_name='Добавлено',
     )
+    excerpt = models.CharField(
+        max_length=EXCERPT_LENGTH,
+        blank=True,
+        editable=False,
+        verbose_name='Анонс',
+        help_text='Начало текста для карточки; обновляется при сохранении.',
+    )
 
     class Meta:
         verbose_name = 'публикация'
@@ -135,6 +145,31 @@ class Post(models.Model):
     def __str__(self):
         return self.title
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        post = super().from_db(db, field_names, values)
+        # Категория, автор и видимость на момент загрузки: по ним сигнал
+        # сохранения находит прежние ленты и счётчики поста, не перечитывая
+        # строку.
+        post._loaded_refs = post._refs()
+        return post
+
+    REF_FIELDS = ('category_id', 'author_id', 'is_published', 'pub_date')
+
+    def _refs(self):
+        if set(self.REF_FIELDS) <= self.__dict__.keys():
+            return SimpleNamespace(**{
+                name: getattr(self, name) for name in self.REF_FIELDS
+            })
+        return None
+
+    def save(self, *args, update_fields=None, **kwargs):
+        if update_fields is None or 'text' in update_fields:
+            self.excerpt = make_excerpt(self.text)
+            if update_fields is not None:
+                update_fields = {*update_fields, 'excerpt'}
+        super().save(*args, update_fields=update_fields, **kwargs)
+
 
 class Comment(models.Model):
     """Модель комментария к публикации."""
@@ -167,6 +202,56 @@ class Comment(models.Model):
         verbose_name = 'Комментарий'
         verbose_name_plural = 'Комментарии'
         ordering = ['pub_date']
+        indexes = [
+            # Страница ветки читается по индексу в нужном порядке,
+            # без сортировки всех комментариев поста.
+            models.Index(
+                fields=['post', 'pub_date', 'id'], name='comment_thread_idx'
+            ),
+        ]
 
     def __str__(self):
         return f'Комментарий от {self.author.username} на {self.post.title}'
+
+
+class CategoryStats(models.Model):
+    """
+    Число видимых постов категории. Поддерживается сигналами изменения
+    постов и наступлением отложенных публикаций (см. `stats`).
+    """
+
+    category = models.OneToOneField(
+        Category,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+        verbose_name='Категория',
+    )
+    post_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Публикаций',
+    )
+
+    class Meta:
+        verbose_name = 'статистика категории'
+        verbose_name_plural = 'Статистика категорий'
+
+
+class UserStats(models.Model):
+    """Число видимых постов автора, как у `CategoryStats`."""
+
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='blog_stats',
+        verbose_name='Пользователь',
+    )
+    post_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Публикаций',
+    )
+
+    class Meta:
+        verbose_name = 'статистика автора'
+        verbose_name_plural = 'Статистика авторов'
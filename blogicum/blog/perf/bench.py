@@ -0,0 +1,99 @@
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.test import override_settings
+from django.utils import timezone
+
+from ..models import Category, Location, Post, User
+from ..utils import make_excerpt
+
+
+def build_posts(page_size, text_length):
+    """Создаёт посты так же, как ORM: через `from_db`, без записи в БД."""
+    author = User(id=1, username='author')
+    category = Category(id=1, title='Категория', slug='category',
+                        is_published=True)
+    location = Location(id=1, name='Место', is_published=True)
+    field_names = [field.attname for field in Post._meta.concrete_fields]
+    posts = []
+    words = 'слово ' * (text_length // 6 + 1)
+    for number in range(page_size):
+        # Своя строка у каждого поста, как после выборки из базы: общий
+        # объект скрыл бы стоимость текста в каждой строке.
+        text = f'{number} {words}'[:text_length]
+        excerpt = make_excerpt(text)
+        values = {
+            'id': number + 1, 'title': f'Пост {number}',
+            'text': text, 'excerpt': excerpt,
+            'pub_date': timezone.now(), 'author_id': author.id,
+            'location_id': location.id, 'category_id': category.id,
+            'image': '', 'is_published': True, 'created_at': timezone.now(),
+        }
+        post = Post.from_db(
+            'default', field_names,
+            [values.get(name) for name in field_names]
+        )
+        post.author, post.category, post.location = author, category, location
+        post.comment_count = 0
+        posts.append(post)
+    return posts
+
+
+def card_values(page_size):
+    """Строки выборки карточек в порядке `POST_ROW_FIELDS`."""
+    pub_date = timezone.now()
+    return [
+        (
+            number + 1, f'Пост {number}', make_excerpt('слово ' * 20),
+            pub_date, '', True, number % 7,
+            number % 5 + 1, f'author{number % 5}',
+            1, 'Категория', 'category', True,
+            1, 'Место', True,
+        )
+        for number in range(page_size)
+    ]
+
+
+def models_from_values(rows):
+    """Экземпляры моделей, как их строит ORM для `select_related`."""
+    post_fields = ['id', 'title', 'excerpt', 'pub_date', 'image',
+                   'is_published', 'author_id', 'category_id', 'location_id']
+    posts = []
+    for (
+        post_id, title, excerpt, pub_date, image, is_published, comments,
+        author_id, username, category_id, category_title, slug,
+        category_published, location_id, location_name, location_published,
+    ) in rows:
+        post = Post.from_db('default', post_fields, [
+            post_id, title, excerpt, pub_date, image, is_published,
+            author_id, category_id, location_id,
+        ])
+        post.comment_count = comments
+        post.author = User.from_db(
+            'default', ['id', 'username'], [author_id, username]
+        )
+        post.category = Category.from_db(
+            'default', ['id', 'title', 'slug', 'is_published'],
+            [category_id, category_title, slug, category_published]
+        )
+        post.location = Location.from_db(
+            'default', ['id', 'name', 'is_published'],
+            [location_id, location_name, location_published]
+        )
+        posts.append(post)
+    return posts
+
+
+@contextmanager
+def without_fragment_cache():
+    """
+    Рендеринг без кеша фрагментов: карточки рисуются заново при каждом
+    замере, и общий кеш фрагментов процессов не очищается.
+    """
+    caches_setting = dict(settings.CACHES, bench={
+        'BACKEND': 'django.core.cache.backends.dummy.DummyCache',
+    })
+    with override_settings(
+        CACHES=caches_setting, FRAGMENT_CACHE_ALIAS='bench'
+    ):
+        yield
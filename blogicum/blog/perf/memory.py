@@ -0,0 +1,156 @@
+import threading
+import time
+import tracemalloc
+
+from django.conf import settings
+
+from ..constants import (
+    MEMORY_SNAPSHOT_EVERY, MEMORY_STATS_FLUSH_INTERVAL, MEMORY_TOP_SITES
+)
+from .storage import read_snapshots, write_snapshot
+
+SNAPSHOT_KIND = 'memory'
+
+
+class MemoryStats:
+    """
+    Статистика памяти по view: пик за запрос и, для каждого N-го запроса,
+    число и объём выделений с разбивкой по местам в коде.
+    tracemalloc работает на весь процесс, поэтому при параллельных запросах
+    в одном процессе цифры отдельных запросов смешиваются.
+    """
+
+    def __init__(self, snapshot_every=MEMORY_SNAPSHOT_EVERY,
+                 top_sites=MEMORY_TOP_SITES,
+                 flush_interval=MEMORY_STATS_FLUSH_INTERVAL):
+        self.snapshot_every = snapshot_every
+        self.top_sites = top_sites
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._requests = 0
+        self._views = {}
+        self._sites = {}
+        self._last_flush = time.monotonic()
+
+    def start(self):
+        """Начинает замер; возвращает состояние для `finish`."""
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(
+                getattr(settings, 'MEMORY_TRACE_FRAMES', 1)
+            )
+        with self._lock:
+            self._requests += 1
+            sampled = self._requests % self.snapshot_every == 0
+        tracemalloc.reset_peak()
+        baseline = tracemalloc.get_traced_memory()[0]
+        return baseline, tracemalloc.take_snapshot() if sampled else None
+
+    def finish(self, view_name, state):
+        baseline, before = state
+        current, peak = tracemalloc.get_traced_memory()
+        allocations = None
+        if before is not None:
+            allocations = tracemalloc.take_snapshot().compare_to(
+                before, 'lineno'
+            )
+        with self._lock:
+            entry = self._views.setdefault(view_name, {
+                'view': view_name, 'requests': 0, 'peak_total': 0,
+                'peak_max': 0, 'retained_total': 0, 'sampled': 0,
+                'blocks_total': 0, 'allocated_total': 0,
+            })
+            entry['requests'] += 1
+            entry['peak_total'] += peak - baseline
+            entry['peak_max'] = max(entry['peak_max'], peak - baseline)
+            entry['retained_total'] += current - baseline
+            if allocations is not None:
+                self._record_allocations(entry, allocations)
+        self.maybe_flush()
+
+    def _record_allocations(self, entry, allocations):
+        entry['sampled'] += 1
+        for stat in allocations:
+            if stat.size_diff <= 0:
+                continue
+            entry['blocks_total'] += max(stat.count_diff, 0)
+            entry['allocated_total'] += stat.size_diff
+            frame = stat.traceback[0]
+            site = f'{frame.filename}:{frame.lineno}'
+            total = self._sites.setdefault(
+                site, {'site': site, 'size': 0, 'count': 0}
+            )
+            total['size'] += stat.size_diff
+            total['count'] += max(stat.count_diff, 0)
+        if len(self._sites) > self.top_sites * 2:
+            # Держим таблицу мест ограниченной: оставляем самые крупные.
+            kept = sorted(
+                self._sites.values(), key=lambda site: site['size'],
+                reverse=True
+            )[:self.top_sites]
+            self._sites = {site['site']: site for site in kept}
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'created_at': time.time(),
+                'views': [dict(entry) for entry in self._views.values()],
+                'sites': [dict(site) for site in self._sites.values()],
+            }
+
+    def maybe_flush(self):
+        if time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        self._last_flush = time.monotonic()
+        if self._views:
+            write_snapshot(SNAPSHOT_KIND, self.snapshot())
+
+    def reset(self):
+        with self._lock:
+            self._views.clear()
+            self._sites.clear()
+
+
+def merged_report():
+    """Сводит снимки всех процессов: статистика по view и места выделений."""
+    views, sites = {}, {}
+    for snapshot in read_snapshots(SNAPSHOT_KIND):
+        for entry in snapshot.get('views', []):
+            total = views.setdefault(entry['view'], dict.fromkeys(
+                entry, 0
+            ))
+            total['view'] = entry['view']
+            for key, value in entry.items():
+                if key == 'peak_max':
+                    total[key] = max(total[key], value)
+                elif key != 'view':
+                    total[key] += value
+        for site in snapshot.get('sites', []):
+            total = sites.setdefault(
+                site['site'], {'site': site['site'], 'size': 0, 'count': 0}
+            )
+            total['size'] += site['size']
+            total['count'] += site['count']
+    for entry in views.values():
+        entry['peak_mean'] = entry['peak_total'] / entry['requests']
+        entry['blocks_mean'] = (
+            entry['blocks_total'] / entry['sampled']
+            if entry['sampled'] else None
+        )
+    return (
+        sorted(views.values(), key=lambda entry: entry['peak_mean'],
+               reverse=True),
+        sorted(sites.values(), key=lambda site: site['size'], reverse=True),
+    )
+
+
+memory_stats = MemoryStats(
+    snapshot_every=getattr(
+        settings, 'MEMORY_SNAPSHOT_EVERY', MEMORY_SNAPSHOT_EVERY
+    ),
+    top_sites=getattr(settings, 'MEMORY_TOP_SITES', MEMORY_TOP_SITES),
+    flush_interval=getattr(
+        settings, 'MEMORY_STATS_FLUSH_INTERVAL', MEMORY_STATS_FLUSH_INTERVAL
+    ),
+)
@@ -0,0 +1,105 @@
+import atexit
+import time
+
+from django.conf import settings
+from django.db import connection
+
+from . import templates
+from .memory import memory_stats
+from .profiler import profile_request
+from .querystats import query_stats
+
+
+class QueryStatsMiddleware:
+    """Собирает статистику по всем SQL-запросам, выполненным за запрос."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = getattr(settings, 'QUERY_STATS_ENABLED', True)
+        if self.enabled:
+            atexit.register(query_stats.flush)
+
+    def __call__(self, request):
+        if not self.enabled:
+            return self.get_response(request)
+
+        def record_query(execute, sql, params, many, context):
+            start = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                resolver_match = getattr(request, 'resolver_match', None)
+                query_stats.record(
+                    sql,
+                    time.perf_counter() - start,
+                    # SQLite не сообщает число строк для SELECT (-1),
+                    # PostgreSQL — сообщает.
+                    rows=getattr(context['cursor'], 'rowcount', None),
+                    view_name=resolver_match and resolver_match.view_name,
+                )
+
+        with connection.execute_wrapper(record_query):
+            return self.get_response(request)
+
+
+class ProfilerMiddleware:
+    """
+    Профилирует запрос сотрудника, добавившего к адресу `?__profile=1`
+    (cProfile и сэмплирование) или `?__profile=sample` (только сэмплирование).
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        mode = request.GET.get('__profile')
+        if mode and request.user.is_staff:
+            return profile_request(self.get_response, request, mode)
+        return self.get_response(request)
+
+
+class TemplateProfilerMiddleware:
+    """
+    Для сотрудника с `?__templates=1` замеряет время рендеринга по шаблонам
+    и тегам, сохраняет отчёт и отдаёт сводку в заголовке Server-Timing.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = getattr(settings, 'TEMPLATE_PROFILER_ENABLED', True)
+
+    def __call__(self, request):
+        if not (
+            self.enabled and request.GET.get('__templates')
+            and request.user.is_staff
+        ):
+            return self.get_response(request)
+        report, token = templates.start_report()
+        try:
+            response = self.get_response(request)
+        finally:
+            templates.finish_report(token)
+        response['X-Template-Report'] = templates.save_report(request, report)
+        response['Server-Timing'] = templates.server_timing(report)
+        return response
+
+
+class MemoryProfilerMiddleware:
+    """Включаемый настройкой учёт пиковой памяти и выделений по view."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = getattr(settings, 'MEMORY_PROFILER_ENABLED', False)
+        if self.enabled:
+            atexit.register(memory_stats.flush)
+
+    def __call__(self, request):
+        if not self.enabled:
+            return self.get_response(request)
+        state = memory_stats.start()
+        response = self.get_response(request)
+        resolver_match = request.resolver_match
+        memory_stats.finish(
+            resolver_match.view_name if resolver_match else 'unknown', state
+        )
+        return response
@@ -0,0 +1,148 @@
+import cProfile
+import json
+import sys
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+
+from ..constants import PROFILER_MAX_REPORTS, PROFILER_SAMPLE_INTERVAL
+from .storage import perf_dir, unique_report_id
+
+REPORTS_KIND = 'profiles'
+REPORT_EXTENSIONS = ('pstats', 'folded')
+
+
+class StackSampler(threading.Thread):
+    """
+    Сэмплирующий профилировщик: периодически снимает стек целевого потока
+    и копит счётчики в свёрнутом формате (collapsed stacks) для flamegraph.
+    """
+
+    def __init__(self, thread_id, interval=PROFILER_SAMPLE_INTERVAL):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.stacks[self._collapse(frame)] += 1
+
+    @staticmethod
+    def _collapse(frame):
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            names.append(
+                f'{code.co_name} ({code.co_filename}:{code.co_firstlineno})'
+            )
+            frame = frame.f_back
+        return ';'.join(reversed(names))
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+
+    def folded(self):
+        return ''.join(
+            f'{stack} {count}\n' for stack, count in self.stacks.items()
+        )
+
+
+def profile_request(get_response, request, mode):
+    """
+    Выполняет запрос под профилировщиком и сохраняет отчёт.
+    Режим `sample` включает только сэмплирование, иначе вместе с ним
+    работает cProfile.
+    """
+    sampler = StackSampler(
+        threading.get_ident(),
+        getattr(settings, 'PROFILER_SAMPLE_INTERVAL', PROFILER_SAMPLE_INTERVAL)
+    )
+    profiler = None if mode == 'sample' else cProfile.Profile()
+    start = time.perf_counter()
+    sampler.start()
+    if profiler is not None:
+        profiler.enable()
+    try:
+        response = get_response(request)
+        if hasattr(response, 'render') and callable(response.render):
+            # Шаблон рендерится лениво — включаем его в профиль.
+            response.render()
+    finally:
+        if profiler is not None:
+            profiler.disable()
+        sampler.stop()
+    duration = time.perf_counter() - start
+
+    report_id = save_report(request, response, duration, profiler, sampler)
+    response['X-Profile-Report'] = report_id
+    return response
+
+
+def save_report(request, response, duration, profiler, sampler):
+    directory = perf_dir(REPORTS_KIND)
+    report_id = unique_report_id(directory, request)
+    resolver_match = request.resolver_match
+    view_name = resolver_match.view_name if resolver_match else 'unknown'
+
+    if profiler is not None:
+        profiler.dump_stats(directory / f'{report_id}.pstats')
+    (directory / f'{report_id}.folded').write_text(
+        sampler.folded(), encoding='utf-8'
+    )
+    (directory / f'{report_id}.json').write_text(json.dumps({
+        'id': report_id,
+        'path': request.get_full_path(),
+        'view_name': view_name,
+        'user': request.user.get_username(),
+        'status': response.status_code,
+        'duration': duration,
+        'samples': sum(sampler.stacks.values()),
+        'created_at': time.time(),
+    }, ensure_ascii=False), encoding='utf-8')
+    prune_reports(
+        getattr(settings, 'PROFILER_MAX_REPORTS', PROFILER_MAX_REPORTS)
+    )
+    return report_id
+
+
+def list_reports():
+    reports = []
+    directory = perf_dir(REPORTS_KIND)
+    for path in directory.glob('*.json'):
+        try:
+            report = json.loads(path.read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            continue
+        report['files'] = [
+            extension for extension in REPORT_EXTENSIONS
+            if (directory / f'{path.stem}.{extension}').exists()
+        ]
+        reports.append(report)
+    return sorted(reports, key=lambda report: report['created_at'],
+                  reverse=True)
+
+
+def report_path(report_id, extension):
+    if extension not in REPORT_EXTENSIONS + ('json',):
+        return None
+    directory = perf_dir(REPORTS_KIND)
+    path = directory / f'{report_id}.{extension}'
+    # Защита от выхода за пределы каталога отчётов.
+    if path.parent != directory or not path.is_file():
+        return None
+    return path
+
+
+def prune_reports(max_reports):
+    for report in list_reports()[max_reports:]:
+        for extension in REPORT_EXTENSIONS + ('json',):
+            path = report_path(report['id'], extension)
+            if path is not None:
+                path.unlink(missing_ok=True)
@@ -0,0 +1,141 @@
+import re
+import threading
+import time
+
+from django.conf import settings
+
+from ..constants import (
+    QUERY_STATS_FLUSH_INTERVAL, QUERY_STATS_MAX_FINGERPRINTS
+)
+from .storage import read_snapshots, write_snapshot
+
+SNAPSHOT_KIND = 'querystats'
+MAX_VIEWS_PER_FINGERPRINT = 5
+
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+_IN_LIST_RE = re.compile(r'\bIN\s*\((?:\s*(?:%s|\?)\s*,?)+\)', re.IGNORECASE)
+_SPACES_RE = re.compile(r'\s+')
+
+
+def fingerprint(sql):
+    """
+    Нормализует SQL-запрос: литералы и списки IN заменяются заглушками,
+    чтобы запросы одной формы попадали в одну строку статистики.
+    """
+    sql = _STRING_RE.sub('?', sql)
+    sql = _NUMBER_RE.sub('?', sql)
+    sql = sql.replace('%s', '?')
+    sql = _IN_LIST_RE.sub('IN (...)', sql)
+    return _SPACES_RE.sub(' ', sql).strip()
+
+
+class QueryStats:
+    """
+    Агрегатор статистики запросов по отпечаткам.
+    Количество отпечатков ограничено: при переполнении вытесняются
+    самые редко вызываемые, как в pg_stat_statements.
+    """
+
+    def __init__(self, max_size=QUERY_STATS_MAX_FINGERPRINTS,
+                 flush_interval=QUERY_STATS_FLUSH_INTERVAL):
+        self.max_size = max_size
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._last_flush = time.monotonic()
+
+    def record(self, sql, duration, rows=None, view_name=None):
+        key = fingerprint(sql)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                if len(self._entries) >= self.max_size:
+                    self._evict()
+                entry = self._entries[key] = {
+                    'query': key, 'calls': 0, 'total_time': 0.0,
+                    'max_time': 0.0, 'rows': 0, 'views': [],
+                }
+            entry['calls'] += 1
+            entry['total_time'] += duration
+            entry['max_time'] = max(entry['max_time'], duration)
+            if rows is not None and rows >= 0:
+                entry['rows'] += rows
+            if (
+                view_name and view_name not in entry['views']
+                and len(entry['views']) < MAX_VIEWS_PER_FINGERPRINT
+            ):
+                entry['views'].append(view_name)
+        self.maybe_flush()
+
+    def _evict(self):
+        # Освобождаем 5% места за раз, чтобы не сортировать на каждом запросе.
+        victims = sorted(
+            self._entries.values(), key=lambda entry: entry['calls']
+        )[:max(1, self.max_size // 20)]
+        for entry in victims:
+            del self._entries[entry['query']]
+
+    def snapshot(self):
+        with self._lock:
+            return [dict(entry, views=list(entry['views']))
+                    for entry in self._entries.values()]
+
+    def maybe_flush(self):
+        if time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        self._last_flush = time.monotonic()
+        if not self._entries:
+            return
+        write_snapshot(SNAPSHOT_KIND, {
+            'created_at': time.time(), 'entries': self.snapshot(),
+        })
+
+    def reset(self):
+        with self._lock:
+            self._entries.clear()
+
+
+def merge_snapshots(snapshots):
+    """Сводит снимки нескольких процессов в одну таблицу."""
+    merged = {}
+    for snapshot in snapshots:
+        for entry in snapshot.get('entries', []):
+            total = merged.setdefault(entry['query'], {
+                'query': entry['query'], 'calls': 0, 'total_time': 0.0,
+                'max_time': 0.0, 'rows': 0, 'views': [],
+            })
+            total['calls'] += entry['calls']
+            total['total_time'] += entry['total_time']
+            total['max_time'] = max(total['max_time'], entry['max_time'])
+            total['rows'] += entry['rows']
+            total['views'] += [
+                view for view in entry['views'] if view not in total['views']
+            ]
+    for entry in merged.values():
+        entry['mean_time'] = entry['total_time'] / entry['calls']
+    return list(merged.values())
+
+
+def read_fingerprints():
+    """Все отпечатки из снимков процессов."""
+    return merge_snapshots(read_snapshots(SNAPSHOT_KIND))
+
+
+def top_fingerprints(entries, limit, order_by='total_time'):
+    return sorted(
+        entries, key=lambda entry: entry[order_by], reverse=True
+    )[:limit]
+
+
+query_stats = QueryStats(
+    max_size=getattr(
+        settings, 'QUERY_STATS_MAX_FINGERPRINTS',
+        QUERY_STATS_MAX_FINGERPRINTS
+    ),
+    flush_interval=getattr(
+        settings, 'QUERY_STATS_FLUSH_INTERVAL', QUERY_STATS_FLUSH_INTERVAL
+    ),
+)
@@ -0,0 +1,56 @@
+import json
+import os
+import time
+from pathlib import Path
+
+from django.conf import settings
+
+
+def perf_dir(kind):
+    """Возвращает (и создаёт) каталог для отчётов заданного вида."""
+    path = Path(settings.PERF_DIR) / kind
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def write_snapshot(kind, data):
+    """
+    Атомарно сохраняет снимок данных текущего процесса.
+    Каждый процесс пишет в собственный файл `<pid>.json`.
+    """
+    path = perf_dir(kind) / f'{os.getpid()}.json'
+    tmp_path = path.with_suffix('.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as snapshot:
+        json.dump(data, snapshot, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def read_snapshots(kind):
+    """Читает снимки всех процессов, пропуская повреждённые файлы."""
+    snapshots = []
+    for path in sorted(perf_dir(kind).glob('*.json')):
+        try:
+            with open(path, encoding='utf-8') as snapshot:
+                snapshots.append(json.load(snapshot))
+        except (OSError, ValueError):
+            continue
+    return snapshots
+
+
+def clear_snapshots(kind):
+    for path in perf_dir(kind).glob('*.json'):
+        path.unlink(missing_ok=True)
+
+
+def unique_report_id(directory, request):
+    """Имя отчёта по времени и имени view, уникальное в пределах каталога."""
+    resolver_match = getattr(request, 'resolver_match', None)
+    view_name = resolver_match.view_name if resolver_match else 'unknown'
+    base_id = report_id = '{}-{}'.format(
+        time.strftime('%Y%m%d-%H%M%S'), view_name.replace(':', '-')
+    )
+    suffix = 1
+    while (directory / f'{report_id}.json').exists():
+        suffix += 1
+        report_id = f'{base_id}~{suffix}'
+    return report_id
@@ -0,0 +1,190 @@
+import json
+import threading
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.template import base as template_base
+from django.template.defaulttags import URLNode
+from django.template.loader_tags import IncludeNode
+
+from ..constants import TEMPLATE_REPORTS_MAX, TEMPLATE_REPORT_TOP
+from .storage import perf_dir, unique_report_id
+
+REPORTS_KIND = 'templates'
+
+_current_report = ContextVar('template_report', default=None)
+# Число отчётов, которые сейчас собираются во всех потоках: обёртки
+# движка шаблонов стоят, только пока оно больше нуля.
+_active_reports = 0
+_install_lock = threading.Lock()
+
+
+class TemplateReport:
+    """
+    Отчёт о рендеринге шаблонов за один запрос: время и число вызовов
+    по файлам шаблонов и по тегам/фильтрам. Время «self» не включает
+    вложенные узлы, «total» — включает.
+    """
+
+    def __init__(self):
+        self.templates = {}
+        self.nodes = {}
+        self._children = [0.0]
+
+    def enter(self):
+        self._children.append(0.0)
+
+    def leave(self, table, key, duration):
+        children = self._children.pop()
+        self._children[-1] += duration
+        entry = table.setdefault(
+            key, {'name': key, 'calls': 0, 'total': 0.0, 'self': 0.0}
+        )
+        entry['calls'] += 1
+        entry['total'] += duration
+        entry['self'] += duration - children
+
+    def as_dict(self, top=TEMPLATE_REPORT_TOP):
+        def ordered(table):
+            return sorted(
+                table.values(), key=lambda entry: entry['self'], reverse=True
+            )[:top]
+        return {
+            'templates': ordered(self.templates),
+            'nodes': ordered(self.nodes),
+        }
+
+
+def node_label(node):
+    """Имя узла для отчёта: тег, фильтр или переменная."""
+    if isinstance(node, IncludeNode):
+        return 'include'
+    if isinstance(node, URLNode):
+        return 'url'
+    if isinstance(node, template_base.VariableNode):
+        filters = [func.__name__ for func, _ in node.filter_expression.filters]
+        if filters:
+            return '|'.join(f'filter:{name}' for name in filters)
+        return 'variable'
+    if isinstance(node, template_base.TextNode):
+        return 'text'
+    token = getattr(node, 'token', None)
+    if token is not None and token.token_type == template_base.TokenType.BLOCK:
+        return token.split_contents()[0]
+    return type(node).__name__
+
+
+def install():
+    """
+    Подключает замеры к движку шаблонов Django на время отчётов (см.
+    `start_report`). Повторный вызов переустанавливает обёртки, если их
+    заменил кто-то ещё (например, тестовое окружение Django подменяет
+    `Template._render`).
+    """
+    if not getattr(template_base.Node.render_annotated, 'profiled', False):
+        template_base.Node.render_annotated = _profiled(
+            template_base.Node.render_annotated,
+            lambda report: report.nodes, node_label
+        )
+    if not getattr(template_base.Template._render, 'profiled', False):
+        template_base.Template._render = _profiled(
+            template_base.Template._render,
+            lambda report: report.templates,
+            lambda template: (
+                template.origin.template_name or template.origin.name
+            )
+        )
+
+
+def uninstall():
+    """Возвращает исходные методы движка шаблонов, если обёртки наши."""
+    for cls, name in (
+        (template_base.Node, 'render_annotated'),
+        (template_base.Template, '_render'),
+    ):
+        method = getattr(cls, name)
+        if getattr(method, 'profiled', False):
+            setattr(cls, name, method.original)
+
+
+def _profiled(render, get_table, get_label):
+    def wrapper(self, context):
+        report = _current_report.get()
+        if report is None:
+            return render(self, context)
+        report.enter()
+        start = time.perf_counter()
+        try:
+            return render(self, context)
+        finally:
+            report.leave(
+                get_table(report), get_label(self),
+                time.perf_counter() - start
+            )
+    wrapper.profiled = True
+    wrapper.original = render
+    return wrapper
+
+
+def start_report():
+    global _active_reports
+    with _install_lock:
+        _active_reports += 1
+        install()
+    report = TemplateReport()
+    return report, _current_report.set(report)
+
+
+def finish_report(token):
+    """
+    Завершает отчёт; после последнего активного отчёта обёртки снимаются,
+    и рендеринг без профилирования идёт без накладных расходов.
+    """
+    global _active_reports
+    _current_report.reset(token)
+    with _install_lock:
+        _active_reports -= 1
+        if not _active_reports:
+            uninstall()
+
+
+def save_report(request, report):
+    directory = perf_dir(REPORTS_KIND)
+    report_id = unique_report_id(directory, request)
+    data = dict(report.as_dict(), id=report_id, path=request.get_full_path())
+    (directory / f'{report_id}.json').write_text(
+        json.dumps(data, ensure_ascii=False), encoding='utf-8'
+    )
+    max_reports = getattr(
+        settings, 'TEMPLATE_REPORTS_MAX', TEMPLATE_REPORTS_MAX
+    )
+    for stale_id in list_reports()[max_reports:]:
+        (directory / f'{stale_id}.json').unlink(missing_ok=True)
+    return report_id
+
+
+def load_report(report_id):
+    directory = perf_dir(REPORTS_KIND)
+    path = directory / f'{report_id}.json'
+    if path.parent != directory or not path.is_file():
+        return None
+    return json.loads(path.read_text(encoding='utf-8'))
+
+
+def list_reports():
+    paths = sorted(
+        perf_dir(REPORTS_KIND).glob('*.json'),
+        key=lambda path: path.stat().st_mtime, reverse=True
+    )
+    return [path.stem for path in paths]
+
+
+def server_timing(report, limit=5):
+    """Краткая сводка для заголовка Server-Timing."""
+    return ', '.join(
+        '{};desc="{}";dur={:.2f}'.format(
+            f'tpl{number}', entry['name'], entry['self'] * 1000
+        )
+        for number, entry in enumerate(report.as_dict(limit)['nodes'])
+    )
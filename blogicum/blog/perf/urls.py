@@ -0,0 +1,25 @@
+from django.urls import path
+
+from . import views
+
+app_name = 'perf'
+
+urlpatterns = [
+    path('profiles/', views.profile_list, name='profiles'),
+    path(
+        'profiles/<str:report_id>.<str:extension>',
+        views.profile_download,
+        name='profile_download'
+    ),
+    path('cache/', views.cache_metrics, name='cache'),
+    path(
+        'templates/',
+        views.template_report_list,
+        name='template_reports'
+    ),
+    path(
+        'templates/<str:report_id>/',
+        views.template_report_detail,
+        name='template_report'
+    ),
+]
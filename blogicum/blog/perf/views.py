@@ -0,0 +1,52 @@
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import FileResponse, Http404
+from django.shortcuts import render
+
+from ..caching import pages
+from . import templates
+from .profiler import list_reports, report_path
+
+
+@staff_member_required
+def profile_list(request):
+    """Список сохранённых отчётов профилировщика в стиле админки."""
+    return render(request, 'admin/perf/profiles.html', {
+        'title': 'Отчёты профилировщика',
+        'reports': list_reports(),
+    })
+
+
+@staff_member_required
+def profile_download(request, report_id, extension):
+    path = report_path(report_id, extension)
+    if path is None:
+        raise Http404('Отчёт не найден.')
+    return FileResponse(open(path, 'rb'), as_attachment=True,
+                        filename=path.name)
+
+
+@staff_member_required
+def template_report_list(request):
+    return render(request, 'admin/perf/template_reports.html', {
+        'title': 'Отчёты о рендеринге шаблонов',
+        'reports': templates.list_reports(),
+    })
+
+
+@staff_member_required
+def template_report_detail(request, report_id):
+    report = templates.load_report(report_id)
+    if report is None:
+        raise Http404('Отчёт не найден.')
+    return render(request, 'admin/perf/template_report.html', {
+        'title': f'Рендеринг шаблонов: {report["path"]}',
+        'report': report,
+    })
+
+
+@staff_member_required
+def cache_metrics(request):
+    return render(request, 'admin/perf/cache.html', {
+        'title': 'Кеш страниц',
+        'metrics': pages.metrics(),
+    })
@@ -0,0 +1,262 @@
+import threading
+from operator import itemgetter
+
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.models import Expression, Q
+from django.db.models.query import ModelIterable, get_related_populators
+
+from .constants import COMMENTS_PAGE_SIZE
+from .models import Comment, Post
+from .rows import POST_ROW_FIELDS
+from .utils import post_cards_queryset
+
+
+class Marker:
+    """Параметр скомпилированного SQL, значение подставляется при вызове."""
+
+    __slots__ = ('name', 'index', 'field')
+
+    def __init__(self, name, index, field):
+        self.name = name
+        self.index = index
+        self.field = field
+
+    def bind(self, params, connection):
+        value = params[self.name]
+        if self.index is not None:
+            value = value[self.index]
+        return self.field.get_db_prep_value(value, connection, prepared=False)
+
+
+class Param(Expression):
+    """
+    Место параметра в запросе: `filter(id=Param('id', field))`. Для `__in`
+    задаётся `size` — число значений списка.
+    """
+
+    def __init__(self, name, field, size=None):
+        super().__init__(output_field=field)
+        self.name = name
+        self.size = size
+
+    def as_sql(self, compiler, connection):
+        if self.size is None:
+            return '%s', [Marker(self.name, None, self.output_field)]
+        return '(%s)' % ', '.join(['%s'] * self.size), [
+            Marker(self.name, index, self.output_field)
+            for index in range(self.size)
+        ]
+
+
+class Compiled:
+    """SQL запроса и всё, что нужно, чтобы собрать из строк результат."""
+
+    def __init__(self, queryset, using):
+        compiler = queryset.query.get_compiler(using=using)
+        self.sql, params = compiler.as_sql()
+        self.params = list(params)
+        self.compiler = compiler
+        self.models = queryset._iterable_class is ModelIterable
+        if self.models:
+            klass_info = compiler.klass_info
+            start = klass_info['select_fields'][0]
+            end = klass_info['select_fields'][-1] + 1
+            self.model = klass_info['model']
+            self.model_slice = slice(start, end)
+            self.init_list = [
+                column[0].target.attname
+                for column in compiler.select[start:end]
+            ]
+            self.populators = get_related_populators(
+                klass_info, compiler.select, using
+            )
+            self.annotations = list(compiler.annotation_col_map.items())
+        else:
+            self.reorder = self._reorder(queryset)
+
+    @staticmethod
+    def _reorder(queryset):
+        # Как в `ValuesListIterable`: аннотации выбираются после полей,
+        # а кортеж должен идти в порядке, заданном в `values_list`.
+        query = queryset.query
+        names = [
+            *query.extra_select, *query.values_select,
+            *query.annotation_select,
+        ]
+        fields = list(queryset._fields) or names
+        if fields == names:
+            return None
+        return itemgetter(*[names.index(field) for field in fields])
+
+    def bind(self, params, connection):
+        return [
+            value.bind(params, connection) if isinstance(value, Marker)
+            else value
+            for value in self.params
+        ]
+
+    def build(self, rows, using):
+        rows = self.compiler.results_iter([rows], tuple_expected=True)
+        if not self.models:
+            return [self.reorder(row) for row in rows] if self.reorder else (
+                list(rows)
+            )
+        results = []
+        for row in rows:
+            obj = self.model.from_db(using, self.init_list,
+                                     row[self.model_slice])
+            for populator in self.populators:
+                populator.populate(row, obj)
+            for attr, position in self.annotations:
+                setattr(obj, attr, row[position])
+            results.append(obj)
+        return results
+
+
+class PreparedQuery:
+    """
+    Запрос, который компилируется в SQL один раз на процесс, а при каждом
+    вызове только получает значения параметров. `build` строит QuerySet
+    из выражений `Param` вместо значений; поля в `fields` задают,
+    как значения приводятся к виду базы. Для списков (`__in`) SQL
+    компилируется отдельно под каждую длину списка.
+
+    Всё, что вычисляется в `build` (например, `now()`), попадает в SQL
+    навсегда — такие значения надо передавать параметрами.
+    """
+
+    def __init__(self, build, **fields):
+        self.build = build
+        self.fields = fields
+        self._compiled = {}
+        self._lock = threading.Lock()
+
+    def _shape(self, params):
+        return tuple(
+            (name, len(value) if isinstance(value, (list, tuple)) else None)
+            for name, value in sorted(params.items())
+        )
+
+    def compiled(self, params, using=DEFAULT_DB_ALIAS):
+        key = (using, self._shape(params))
+        compiled = self._compiled.get(key)
+        if compiled is None:
+            with self._lock:
+                compiled = self._compiled.get(key)
+                if compiled is None:
+                    compiled = Compiled(self.build(**{
+                        name: Param(name, self.fields[name], size)
+                        for name, size in key[1]
+                    }), using)
+                    self._compiled[key] = compiled
+        return compiled
+
+    def __call__(self, using=DEFAULT_DB_ALIAS, **params):
+        """Список моделей или кортежей, как у исходного QuerySet."""
+        if any(
+            isinstance(value, (list, tuple)) and not value
+            for value in params.values()
+        ):
+            return []
+        compiled = self.compiled(params, using)
+        connection = connections[using]
+        with connection.cursor() as cursor:
+            cursor.execute(compiled.sql, compiled.bind(params, connection))
+            rows = cursor.fetchall()
+        return compiled.build(rows, using)
+
+    def first(self, using=DEFAULT_DB_ALIAS, **params):
+        results = self(using, **params)
+        return results[0] if results else None
+
+    def lazy(self, **params):
+        """Результат, который выбирается при первом переборе."""
+        return LazyResult(self, params)
+
+
+class LazyResult:
+    def __init__(self, query, params):
+        self.query = query
+        self.params = params
+        self._results = None
+
+    def _fetch(self):
+        if self._results is None:
+            self._results = self.query(**self.params)
+        return self._results
+
+    def __iter__(self):
+        return iter(self._fetch())
+
+    def __len__(self):
+        return len(self._fetch())
+
+    def __getitem__(self, key):
+        return self._fetch()[key]
+
+
+_post_id = Post._meta.pk
+
+# Карточки постов страницы ленты: общей, категории и профиля.
+post_cards = PreparedQuery(
+    lambda ids: post_cards_queryset(Post.objects).filter(id__in=ids),
+    ids=_post_id,
+)
+post_card_rows = PreparedQuery(
+    lambda ids: post_cards_queryset(Post.objects).filter(
+        id__in=ids
+    ).values_list(*POST_ROW_FIELDS),
+    ids=_post_id,
+)
+# Пост со связями, которые выводит его страница, — одним запросом.
+post_by_id = PreparedQuery(
+    lambda id: Post.objects.select_related(
+        'author', 'category', 'location'
+    ).filter(id=id),
+    id=_post_id,
+)
+
+# Порядок ветки: по дате и id, как `Comment.Meta.ordering`, но однозначный.
+OLDEST_FIRST = ('pub_date', 'id')
+NEWEST_FIRST = ('-pub_date', '-id')
+
+
+def _thread_page(ordering):
+    return PreparedQuery(
+        lambda post_id: Comment.objects.filter(
+            post_id=post_id
+        ).select_related('author').order_by(*ordering)[:COMMENTS_PAGE_SIZE],
+        post_id=Comment._meta.get_field('post'),
+    )
+
+
+def _thread_after(ordering, newest):
+    # Условие на дату без id — диапазон по индексу (post, pub_date, id),
+    # с которого чтение начинается сразу с нужного места ветки.
+    def build(post_id, pub_date, id):
+        if newest:
+            after = Q(pub_date__lte=pub_date) & (
+                Q(pub_date__lt=pub_date) | Q(id__lt=id)
+            )
+        else:
+            after = Q(pub_date__gte=pub_date) & (
+                Q(pub_date__gt=pub_date) | Q(id__gt=id)
+            )
+        return Comment.objects.filter(after, post_id=post_id).select_related(
+            'author'
+        ).order_by(*ordering)[:COMMENTS_PAGE_SIZE]
+
+    return PreparedQuery(
+        build,
+        post_id=Comment._meta.get_field('post'),
+        pub_date=Comment._meta.get_field('pub_date'),
+        id=Comment._meta.pk,
+    )
+
+
+# Первая страница ветки комментариев: старые или новые сначала.
+comment_thread = _thread_page(OLDEST_FIRST)
+comment_thread_newest = _thread_page(NEWEST_FIRST)
+# Следующая страница после курсора `(pub_date, id)`.
+comment_thread_after = _thread_after(OLDEST_FIRST, newest=False)
+comment_thread_newest_after = _thread_after(NEWEST_FIRST, newest=True)
@@ -0,0 +1,113 @@
+from django.core.files.storage import default_storage
+
+
+class AuthorRow:
+    __slots__ = ('id', 'username')
+
+    def __init__(self, id, username):
+        self.id = id
+        self.username = username
+
+
+class CategoryRow:
+    __slots__ = ('id', 'title', 'slug', 'is_published')
+
+    def __init__(self, id, title, slug, is_published):
+        self.id = id
+        self.title = title
+        self.slug = slug
+        self.is_published = is_published
+
+
+class LocationRow:
+    __slots__ = ('id', 'name', 'is_published')
+
+    def __init__(self, id, name, is_published):
+        self.id = id
+        self.name = name
+        self.is_published = is_published
+
+
+class ImageRow:
+    """Файл изображения: как `FieldFile`, ложен без имени и даёт `url`."""
+
+    __slots__ = ('name',)
+
+    def __init__(self, name):
+        self.name = name
+
+    def __bool__(self):
+        return bool(self.name)
+
+    @property
+    def url(self):
+        return default_storage.url(self.name)
+
+
+class PostRow:
+    """
+    Строка поста только для чтения вместо экземпляра модели в лентах.
+    Атрибуты повторяют то, что выводит `includes/post_card.html`, поэтому
+    шаблон работает без изменений, а на каждую строку не создаются модели
+    с их состоянием и кешами связей.
+    """
+
+    __slots__ = (
+        'id', 'title', 'excerpt', 'pub_date', 'image', 'is_published',
+        'comment_count', 'author_id', 'category_id', 'location_id',
+        'author', 'category', 'location',
+    )
+
+    @property
+    def pk(self):
+        return self.id
+
+    @property
+    def text(self):
+        # Полного текста в строке нет; карточке хватает анонса.
+        return self.excerpt
+
+
+# Столбцы выборки в порядке разбора в `post_row`.
+POST_ROW_FIELDS = (
+    'id', 'title', 'excerpt', 'pub_date', 'image', 'is_published',
+    'comment_count',
+    'author_id', 'author__username',
+    'category_id', 'category__title', 'category__slug',
+    'category__is_published',
+    'location_id', 'location__name', 'location__is_published',
+)
+
+
+def post_row(values):
+    (
+        post_id, title, excerpt, pub_date, image, is_published,
+        comment_count,
+        author_id, username,
+        category_id, category_title, category_slug, category_published,
+        location_id, location_name, location_published,
+    ) = values
+    row = PostRow()
+    row.id = post_id
+    row.title = title
+    row.excerpt = excerpt
+    row.pub_date = pub_date
+    row.image = ImageRow(image) if image else None
+    row.is_published = is_published
+    row.comment_count = comment_count
+    row.author_id = author_id
+    row.author = AuthorRow(author_id, username)
+    row.category_id = category_id
+    row.category = category_id and CategoryRow(
+        category_id, category_title, category_slug, category_published
+    )
+    row.location_id = location_id
+    row.location = location_id and LocationRow(
+        location_id, location_name, location_published
+    )
+    return row
+
+
+def post_rows(rows):
+    """Строки постов по id из кортежей выборки `POST_ROW_FIELDS`."""
+    return {values[0]: post_row(values) for values in rows}
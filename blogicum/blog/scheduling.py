@@ -0,0 +1,72 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Min
+from django.dispatch import Signal
+from django.utils.timezone import now
+
+from .constants import SCHEDULING_CACHE_ALIAS, SCHEDULING_RECHECK_INTERVAL
+from .models import Post
+
+# Отправляется, когда наступила дата отложенной публикации постов;
+# аргумент `posts` — список опубликовавшихся постов.
+scheduled_posts_published = Signal()
+# Отправляется, когда отметка последней проверки потеряна (кеш очищен
+# или запись вытеснена): какие посты опубликовались с тех пор, неизвестно.
+scheduling_checkpoint_lost = Signal()
+
+NEXT_KEY = 'scheduling:next'
+CHECKED_KEY = 'scheduling:checked'
+LOCK_KEY = 'scheduling:lock'
+
+
+def _cache():
+    return caches[
+        getattr(settings, 'SCHEDULING_CACHE_ALIAS', SCHEDULING_CACHE_ALIAS)
+    ]
+
+
+def check_scheduled_publications():
+    """
+    Дешёвая проверка на каждый запрос: одно чтение из кеша, пока не
+    наступила ближайшая дата отложенной публикации. Когда она наступает,
+    один процесс находит опубликовавшиеся посты и отправляет сигнал.
+    """
+    cache = _cache()
+    current = now()
+    next_publication = cache.get(NEXT_KEY)
+    if next_publication is not None and next_publication > current:
+        return
+    if not cache.add(LOCK_KEY, 1, 30):
+        return
+    try:
+        checked = cache.get(CHECKED_KEY)
+        if checked is not None:
+            published = list(Post.objects.filter(
+                is_published=True, pub_date__gt=checked,
+                pub_date__lte=current,
+            ))
+            if published:
+                scheduled_posts_published.send(
+                    sender=Post, posts=published
+                )
+        else:
+            scheduling_checkpoint_lost.send(sender=Post)
+        cache.set(CHECKED_KEY, current, None)
+        cache.set(NEXT_KEY, next_scheduled_publication(current), None)
+    finally:
+        cache.delete(LOCK_KEY)
+
+
+def next_scheduled_publication(current):
+    upcoming = Post.objects.filter(
+        is_published=True, pub_date__gt=current
+    ).aggregate(next=Min('pub_date'))['next']
+    # Без отложенных постов всё равно перепроверяем время от времени.
+    return upcoming or current + timedelta(seconds=SCHEDULING_RECHECK_INTERVAL)
+
+
+def reschedule():
+    """Сбрасывает ближайшую дату: пересчитается на следующем запросе."""
+    _cache().delete(NEXT_KEY)
@@ -0,0 +1,136 @@
+from django.db import transaction
+from django.db.models.signals import (
+    post_delete, post_save, pre_delete, pre_save
+)
+from django.dispatch import receiver
+from django.utils.timezone import now
+
+from .caching.feeds import feed_indexes, post_feeds
+from .caching.proxy import INDEX_KEY, purge, purge_post
+from .caching.versions import ALL, invalidate
+from .models import Category, Comment, Location, Post, User
+from .scheduling import (
+    reschedule, scheduled_posts_published, scheduling_checkpoint_lost
+)
+from .stats import (
+    create_category_stats, create_user_stats, refresh_category_stats,
+    refresh_post_stats, refresh_user_stats
+)
+
+
+@receiver(pre_save, sender=Post)
+def remember_post_feeds(sender, instance, **kwargs):
+    # Пост мог сменить категорию или автора: прежние ленты и счётчики
+    # тоже меняются. У загруженного из базы поста они известны с загрузки.
+    previous = getattr(instance, '_loaded_refs', None)
+    if previous is None and instance.pk is not None:
+        loaded = Post.objects.only(*Post.REF_FIELDS).filter(
+            pk=instance.pk
+        ).first()
+        previous = loaded and loaded._loaded_refs
+    instance._previous_refs = previous
+    instance._previous_feeds = post_feeds(previous) if previous else set()
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def post_changed(sender, instance, signal, **kwargs):
+    feeds = post_feeds(instance) | getattr(instance, '_previous_feeds', set())
+    current = instance._refs()
+    if signal is post_delete:
+        refresh_post_stats(current, None)
+    else:
+        refresh_post_stats(getattr(instance, '_previous_refs', None), current)
+    instance._loaded_refs = current
+    invalidate(('post', instance.pk))
+    feed_indexes.change(instance, feeds, deleted=signal is post_delete)
+    purge_post(instance)
+    if instance.pub_date and instance.pub_date > now():
+        # И после фиксации: иначе другой процесс может найти ближайшую
+        # дату по прежним строкам.
+        reschedule()
+        transaction.on_commit(reschedule)
+
+
+@receiver(scheduled_posts_published)
+def scheduled_posts_became_visible(sender, posts, **kwargs):
+    refresh_category_stats({post.category_id for post in posts})
+    refresh_user_stats({post.author_id for post in posts})
+    for post in posts:
+        invalidate(('post', post.pk))
+        feed_indexes.change(post, post_feeds(post))
+        purge_post(post)
+
+
+@receiver(scheduling_checkpoint_lost)
+def scheduled_posts_unknown(sender, **kwargs):
+    # Опубликовавшиеся посты не найти: перестраиваются все ленты
+    # и пересчитываются все счётчики.
+    invalidate(('feed', ALL))
+    refresh_category_stats(Category.objects.values('pk'))
+    refresh_user_stats(Post.objects.values('author_id'))
+
+
+@receiver(pre_delete, sender=Category)
+def remember_category_authors(sender, instance, **kwargs):
+    # После удаления посты уже не связаны с категорией.
+    instance._author_ids = list(Post.objects.filter(
+        category_id=instance.pk
+    ).values_list('author_id', flat=True).distinct())
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def category_changed(sender, instance, created=False, **kwargs):
+    if created:
+        create_category_stats([instance.pk])
+    # Скрытие или публикация категории меняет и состав общей ленты.
+    invalidate(
+        ('category', instance.pk), ('category', ALL),
+        ('feed', 'index'), ('feed', f'category:{instance.pk}'),
+    )
+    # Публикация или скрытие категории меняет и счётчики её авторов,
+    # которые выводятся в их профилях.
+    authors = getattr(instance, '_author_ids', None)
+    if authors is None:
+        authors = list(Post.objects.filter(
+            category_id=instance.pk
+        ).values_list('author_id', flat=True).distinct())
+    refresh_category_stats([instance.pk])
+    refresh_user_stats(authors)
+    invalidate(*[('user', author_id) for author_id in authors])
+    purge({INDEX_KEY, f'category-{instance.slug}'} | {
+        f'user-{author_id}' for author_id in authors
+    })
+
+
+@receiver(post_save, sender=Location)
+@receiver(post_delete, sender=Location)
+def location_changed(sender, instance, **kwargs):
+    invalidate(('location', instance.pk), ('location', ALL))
+    purge({f'location-{instance.pk}'})
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_changed(
+        sender, instance, created=False, update_fields=None, **kwargs
+):
+    if created:
+        # Посты могли появиться раньше пользователя (например, loaddata).
+        create_user_stats([instance.pk])
+        refresh_user_stats([instance.pk])
+    # Вход пользователя обновляет только last_login — на вывод не влияет.
+    if update_fields and set(update_fields) <= {'last_login'}:
+        return
+    invalidate(('user', instance.pk), ('user', ALL))
+    purge({f'user-{instance.pk}'})
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def comment_changed(sender, instance, **kwargs):
+    # Карточки главной выводят последние комментарии: правка любого
+    # меняет и валидатор лент.
+    invalidate(('comments', instance.post_id), ('comments', ALL))
+    purge({f'post-{instance.post_id}'})
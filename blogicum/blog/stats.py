@@ -0,0 +1,128 @@
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils.timezone import now
+
+from .models import CategoryStats, Post, UserStats
+from .utils import filter_published_posts
+
+
+def _visible_posts(**filters):
+    return filter_published_posts(Post.objects.filter(**filters)).order_by()
+
+
+def _count_subquery(field):
+    """Число видимых постов, у которых `field` равно pk строки счётчика."""
+    return Coalesce(Subquery(
+        _visible_posts(**{field: OuterRef('pk')}).values(field).annotate(
+            count=Count('id')
+        ).values('count'),
+        output_field=IntegerField(),
+    ), 0)
+
+
+def create_category_stats(category_ids):
+    """
+    Создаёт нулевые строки счётчиков, не трогая существующие. Число
+    постов затем считает `refresh_category_stats`.
+    """
+    CategoryStats.objects.bulk_create(
+        [CategoryStats(pk=pk) for pk in category_ids], ignore_conflicts=True
+    )
+
+
+def create_user_stats(user_ids):
+    UserStats.objects.bulk_create(
+        [UserStats(pk=pk) for pk in user_ids], ignore_conflicts=True
+    )
+
+
+def refresh_category_stats(category_ids):
+    """
+    Пересчитывает счётчики категорий одним UPDATE с подзапросом по индексу
+    постов. Строки создаются вместе с категорией (сигнал и миграция).
+    """
+    CategoryStats.objects.filter(pk__in=category_ids).update(
+        post_count=_count_subquery('category_id')
+    )
+
+
+def refresh_user_stats(user_ids):
+    """Пересчитывает счётчики авторов, как `refresh_category_stats`."""
+    UserStats.objects.filter(pk__in=user_ids).update(
+        post_count=_count_subquery('author_id')
+    )
+
+
+def _load(model, create, refresh, ids):
+    counts = dict(model.objects.filter(pk__in=ids).values_list(
+        'pk', 'post_count'
+    ))
+    missing = [pk for pk in ids if pk not in counts]
+    if missing:
+        # Строки нет у объекта, созданного в обход save() (bulk_create):
+        # создаём её и пересчитываем тем же UPDATE, что и сигналы, —
+        # подсчёт в самом UPDATE не затирает их результат устаревшим.
+        create(missing)
+        refresh(missing)
+        counts.update(model.objects.filter(pk__in=missing).values_list(
+            'pk', 'post_count'
+        ))
+    return counts
+
+
+def category_post_counts(category_ids):
+    """Число видимых постов по id категорий: чтение строк счётчиков."""
+    return _load(
+        CategoryStats, create_category_stats, refresh_category_stats,
+        list(category_ids),
+    )
+
+
+def user_post_count(user_id):
+    return _load(
+        UserStats, create_user_stats, refresh_user_stats, [user_id]
+    )[user_id]
+
+
+def is_counted(refs):
+    """Входит ли пост с такими полями в счётчики (без учёта категории)."""
+    return bool(
+        refs and refs.is_published and refs.category_id is not None
+        and refs.pub_date <= now()
+    )
+
+
+def refresh_post_stats(previous, current):
+    """
+    Пересчитывает счётчики после изменения поста. `previous` и `current` —
+    поля поста (`Post._refs`) до и после; у удалённого `current` — None.
+    Правка текста счётчики не меняет, поэтому пересчёт нужен, только
+    если изменились публикация, дата, категория или автор поста, который
+    был или стал видимым.
+    """
+    if previous is not None and current is not None and (
+        vars(previous) == vars(current)
+    ):
+        return
+    if not (is_counted(previous) or is_counted(current)):
+        return
+    changed = [refs for refs in (previous, current) if refs is not None]
+    refresh_category_stats({refs.category_id for refs in changed})
+    refresh_user_stats({refs.author_id for refs in changed})
+
+
+def with_post_counts(categories):
+    """
+    Категории с атрибутом `post_count`: счётчик приходит тем же запросом
+    через LEFT JOIN, отдельно создаются только недостающие строки.
+    """
+    categories = list(categories.annotate(post_count=F('stats__post_count')))
+    missing = [
+        category.id for category in categories if category.post_count is None
+    ]
+    if missing:
+        counts = category_post_counts(missing)
+        for category in categories:
+            if category.post_count is None:
+                category.post_count = counts[category.id]
+    return categories
@@ -0,0 +1,46 @@
+from django import template
+from django.utils.html import format_html_join
+
+from ..caching.fragments import render_comment_thread, render_post_cards
+from ..caching.holes import is_shared_render, placeholder, render_hole
+from ..templating import FlushNode
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def post_cards(context, posts, previews=False):
+    """
+    Рендерит карточки постов одним скомпилированным шаблоном:
+    в отличие от `{% include %}` в цикле, шаблон ищется один раз,
+    а готовые карточки берутся из кеша фрагментов. `previews=True`
+    добавляет последние комментарии под карточкой.
+    """
+    return format_html_join(
+        '\n', '<article class="mb-5">\n{}\n</article>',
+        ((card,) for card in render_post_cards(context, posts, previews))
+    )
+
+
+@register.simple_tag(takes_context=True)
+def comment_thread(context, post, comments, variant=''):
+    """Ветка комментариев из кеша фрагментов: `{% comment_thread ... as %}`."""
+    return render_comment_thread(context, post, comments, variant)
+
+
+@register.simple_tag(takes_context=True)
+def hole(context, name, **params):
+    """
+    Персональный фрагмент страницы. При рендеринге страницы для кеша
+    выводит метку, которую middleware заменит для каждого пользователя,
+    иначе рендерится сразу.
+    """
+    if is_shared_render(context):
+        return placeholder(name, params)
+    return render_hole(context, name, params)
+
+
+@register.tag
+def flush(parser, token):
+    """Граница части потокового ответа (см. `templating.stream_template`)."""
+    return FlushNode()
@@ -0,0 +1,114 @@
+from django.conf import settings
+from django.template import engines
+from django.template.base import Node, TextNode
+from django.template.context import make_context
+from django.template.loader import select_template
+from django.template.loader_tags import (
+    BLOCK_CONTEXT_KEY, BlockContext, BlockNode, ExtendsNode
+)
+
+
+def warm_templates():
+    """
+    Компилирует все шаблоны из каталога `templates/` в кеширующем
+    загрузчике, чтобы первые запросы воркера не тратили время на разбор.
+    Возвращает число прогретых шаблонов.
+    """
+    warmed = 0
+    for engine in engines.all():
+        for template_name in _template_names(settings.TEMPLATES_DIR):
+            engine.get_template(template_name)
+            warmed += 1
+    return warmed
+
+
+def _template_names(directory):
+    for path in sorted(directory.rglob('*.html')):
+        yield path.relative_to(directory).as_posix()
+
+
+class FlushNode(Node):
+    """Метка `{% flush %}`: при обычном рендеринге ничего не выводит."""
+
+    def render(self, context):
+        return ''
+
+
+_FLUSH = object()
+
+
+def stream_template(template_names, context, request):
+    """
+    Рендерит шаблон частями: всё до очередной метки `{% flush %}`
+    отдаётся одной строкой, как только готово. Наследование шаблонов
+    и блоки обходятся так же, как при обычном рендеринге, поэтому
+    склеенные части совпадают с выводом `render_to_string`.
+    """
+    backend_template = select_template(template_names, using='django')
+    context = make_context(
+        context, request,
+        autoescape=backend_template.backend.engine.autoescape,
+    )
+    template = backend_template.template
+    with context.render_context.push_state(template):
+        with context.bind_template(template):
+            context.template_name = template.name
+            chunk = []
+            for part in _iter_nodes(template.nodelist, context):
+                if part is _FLUSH:
+                    if chunk:
+                        yield ''.join(chunk)
+                    chunk = []
+                else:
+                    chunk.append(part)
+            yield ''.join(chunk)
+
+
+def _iter_nodes(nodelist, context):
+    for node in nodelist:
+        if isinstance(node, FlushNode):
+            yield _FLUSH
+        elif isinstance(node, ExtendsNode):
+            yield from _iter_extends(node, context)
+        elif isinstance(node, BlockNode):
+            yield from _iter_block(node, context)
+        else:
+            yield node.render_annotated(context)
+
+
+def _iter_extends(node, context):
+    # Повторяет ExtendsNode.render, но обходит узлы родителя по одному.
+    parent = node.get_parent(context)
+    block_context = context.render_context.setdefault(
+        BLOCK_CONTEXT_KEY, BlockContext()
+    )
+    block_context.add_blocks(node.blocks)
+    for parent_node in parent.nodelist:
+        if not isinstance(parent_node, TextNode):
+            if not isinstance(parent_node, ExtendsNode):
+                block_context.add_blocks({
+                    block.name: block for block in
+                    parent.nodelist.get_nodes_by_type(BlockNode)
+                })
+            break
+    with context.render_context.push_state(parent, isolated_context=False):
+        yield from _iter_nodes(parent.nodelist, context)
+
+
+def _iter_block(node, context):
+    # Повторяет BlockNode.render: блок берётся из самого нижнего шаблона.
+    block_context = context.render_context.get(BLOCK_CONTEXT_KEY)
+    with context.push():
+        if block_context is None:
+            context['block'] = node
+            yield from _iter_nodes(node.nodelist, context)
+            return
+        push = block = block_context.pop(node.name)
+        if block is None:
+            block = node
+        block = type(node)(block.name, block.nodelist)
+        block.context = context
+        context['block'] = block
+        yield from _iter_nodes(block.nodelist, context)
+        if push is not None:
+            block_context.push(node.name, push)
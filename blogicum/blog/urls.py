@@ -8,6 +8,7 @@ app_name = 'blog'
 urlpatterns = [
     # Общие страницы
     path('', views.PostListView.as_view(), name='index'),
+    path('feed/', views.IndexCardsView.as_view(), name='index_cards'),
 
     # Управление пользователями
     path('register/',
@@ -18,6 +19,10 @@ urlpatterns = [
          views.UserProfileView.as_view(),
          name='profile'
          ),
+    path('profile/<str:username>/feed/',
+         views.ProfileCardsView.as_view(),
+         name='profile_cards'
+         ),
     path('accounts/profile/',
          views.UserProfileEditView.as_view(),
          name='edit_profile'
@@ -37,6 +42,11 @@ urlpatterns = [
         views.PostDetailView.as_view(),
         name='post_detail'
     ),
+    path(
+        'posts/<int:post_id>/comments/',
+        views.PostCommentsView.as_view(),
+        name='post_comments'
+    ),
     path(
         'posts/<int:post_id>/edit/',
         views.PostEditView.as_view(),
@@ -66,9 +76,19 @@ urlpatterns = [
     ),
 
     # Категории
+    path(
+        'categories/',
+        views.CategoryListView.as_view(),
+        name='categories'
+    ),
     path(
         'category/<slug:category_slug>/',
         views.CategoryPostListView.as_view(),
         name='category_posts'
     ),
+    path(
+        'category/<slug:category_slug>/feed/',
+        views.CategoryCardsView.as_view(),
+        name='category_cards'
+    ),
 ]
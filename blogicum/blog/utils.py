@@ -1,6 +1,29 @@
+from datetime import datetime, timedelta, timezone
+from urllib.parse import urlencode
+
 from django.db.models import Count
+from django.utils.text import Truncator
 from django.utils.timezone import now
 
+from .constants import EXCERPT_LENGTH, EXCERPT_WORDS
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+# Поля, которые выводит карточка поста в лентах.
+POST_CARD_FIELDS = (
+    'id', 'title', 'excerpt', 'pub_date', 'image', 'is_published',
+    'author_id', 'author__username',
+    'category_id', 'category__title', 'category__slug',
+    'category__is_published',
+    'location_id', 'location__name', 'location__is_published',
+)
+
+
+def make_excerpt(text):
+    """Анонс поста: то же, что выводит `truncatewords` в карточке."""
+    excerpt = Truncator(text).words(EXCERPT_WORDS, truncate=' …')
+    return Truncator(excerpt).chars(EXCERPT_LENGTH)
+
 
 def filter_published_posts(queryset):
     """
@@ -15,6 +38,14 @@ def filter_published_posts(queryset):
     )
 
 
+def is_post_public(post):
+    """Виден ли пост всем: опубликован и его категория опубликована."""
+    return (
+        post.is_published and post.category is not None
+        and post.category.is_published
+    )
+
+
 def annotate_posts_with_comments(queryset):
     """
     Добавляет аннотацию количества комментариев к постам
@@ -26,3 +57,41 @@ def annotate_posts_with_comments(queryset):
         .annotate(comment_count=Count('comments'))
         .order_by('-pub_date')
     )
+
+
+def post_cards_queryset(queryset):
+    """
+    Посты для карточек лент: только выводимые столбцы, без полного
+    текста — вместо него хранимый анонс.
+    """
+    return annotate_posts_with_comments(queryset).only(*POST_CARD_FIELDS)
+
+
+def date_cursor(obj):
+    """
+    Курсор ленты или ветки после поста или комментария: дата публикации
+    в микросекундах и id.
+    """
+    micros = (obj.pub_date - EPOCH) // timedelta(microseconds=1)
+    return f'{micros}_{obj.id}'
+
+
+# Наибольший id, который принимает целочисленный первичный ключ базы.
+MAX_CURSOR_ID = 2 ** 63 - 1
+
+
+def parse_date_cursor(cursor):
+    """Дата и id из курсора; `ValueError`, если курсор неверен."""
+    micros, _, object_id = cursor.partition('_')
+    object_id = int(object_id)
+    if not 0 < object_id <= MAX_CURSOR_ID:
+        raise ValueError('Id курсора вне диапазона.')
+    try:
+        return EPOCH + timedelta(microseconds=int(micros)), object_id
+    except OverflowError:
+        raise ValueError('Дата курсора вне диапазона.')
+
+
+def cursor_url(url, obj, **params):
+    """Адрес следующей порции ленты или ветки после `obj`."""
+    return f'{url}?{urlencode({"after": date_cursor(obj), **params})}'
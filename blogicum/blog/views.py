@@ -1,22 +1,37 @@
 from django.contrib.auth.forms import UserCreationForm
+from django.core.paginator import Paginator
+from django.template.loader import get_template, render_to_string
 from django.views.generic import (
-    ListView, DetailView, CreateView, UpdateView, DeleteView
+    ListView, DetailView, CreateView, UpdateView, DeleteView, View
 )
-from django.http import Http404
-from django.shortcuts import get_object_or_404, redirect
+from django.http import Http404, HttpResponse, JsonResponse
+from django.shortcuts import get_object_or_404, redirect, render
 from django.urls import reverse_lazy, reverse
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib.auth.views import PasswordChangeView
 from django.contrib.auth.models import User
 
+from .conditional import feed_validator, post_validator
 from .mixins import (
-    OnlyAuthorMixin, CommentMixin,
-    CategoryAvailableMixin, PostMixin
+    OnlyAuthorMixin, CommentMixin, ConditionalGetMixin,
+    CategoryAvailableMixin, CursorMixin, PostMixin, StreamingMixin
 )
-from .models import Post, Comment
-from .constants import LATEST_POSTS_COUNT
+from .models import Category, Post, Comment
+from .constants import COMMENTS_PAGE_SIZE, LATEST_POSTS_COUNT
 from .forms import PostCreateForm, CommentForm, UserProfileForm
-from .utils import annotate_posts_with_comments, filter_published_posts
+from .prepared import post_by_id
+from .stats import user_post_count, with_post_counts
+from .utils import cursor_url, date_cursor, is_post_public
+from .caching.feeds import feed_posts
+from .caching.comments import ThreadComments, thread_batch
+from .caching.fragments import COMMENT_BODY_TEMPLATE
+from .caching.objects import users_by_username
+from .caching.pages import (
+    feed_dependencies, mark_uncacheable, record_objects
+)
+from .caching.proxy import (
+    INDEX_KEY, add_post_keys, add_surrogate_keys, post_keys
+)
 
 
 class UserRegistrationView(CreateView):
@@ -27,7 +42,7 @@ class UserRegistrationView(CreateView):
     success_url = reverse_lazy('login')
 
 
-class UserProfileView(ListView):
+class UserProfileView(ConditionalGetMixin, StreamingMixin, ListView):
     """Отображает профиль пользователя."""
 
     model = Post
@@ -39,18 +54,36 @@ class UserProfileView(ListView):
 
     def load_profile(self):
         if self._profile is None:
-            self._profile = get_object_or_404(
-                User, username=self.kwargs.get('username')
-            )
+            try:
+                self._profile = users_by_username.get(
+                    self.kwargs.get('username')
+                )
+            except User.DoesNotExist:
+                raise Http404('Пользователь не найден.')
+
+    def get_validator(self):
+        self.load_profile()
+        return feed_validator(f'user:{self._profile.id}')
 
     def get_queryset(self):
         self.load_profile()
-        return annotate_posts_with_comments(self._profile.posts)
+        record_objects(self.request, [
+            *feed_dependencies(f'user:{self._profile.id}'),
+            ('user', self._profile.id),
+        ])
+        return feed_posts(f'user:{self._profile.id}')
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         self.load_profile()
         context['profile'] = self._profile
+        context['post_count'] = user_post_count(self._profile.id)
+        context['feed_more'] = next_cards_url(
+            reverse('blog:profile_cards', args=[self._profile.username]),
+            context['page_obj'],
+        )
+        add_surrogate_keys(self.request, [f'user-{self._profile.id}'])
+        add_post_keys(self.request, context['page_obj'])
         return context
 
 
@@ -148,7 +181,7 @@ class CommentDeleteView(CommentMixin, DeleteView):
     pass
 
 
-class PostListView(ListView):
+class PostListView(ConditionalGetMixin, StreamingMixin, ListView):
     """Отображает главную страницу с последними опубликованными постами."""
 
     model = Post
@@ -156,13 +189,24 @@ class PostListView(ListView):
     context_object_name = 'post_list'
     paginate_by = LATEST_POSTS_COUNT
 
+    def get_validator(self):
+        return feed_validator('index')
+
     def get_queryset(self):
-        return annotate_posts_with_comments(
-            filter_published_posts(Post.objects)
+        record_objects(self.request, feed_dependencies('index'))
+        return feed_posts('index')
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['feed_more'] = next_cards_url(
+            reverse('blog:index_cards'), context['page_obj']
         )
+        add_surrogate_keys(self.request, [INDEX_KEY])
+        add_post_keys(self.request, context['page_obj'])
+        return context
 
 
-class PostDetailView(DetailView):
+class PostDetailView(ConditionalGetMixin, StreamingMixin, DetailView):
     """Отображает подробную информацию о посте по его ID."""
 
     model = Post
@@ -170,24 +214,185 @@ class PostDetailView(DetailView):
     context_object_name = 'post'
     pk_url_kwarg = 'post_id'
 
+    def get_validator(self):
+        return post_validator(self.kwargs.get('post_id'))
+
     def get_object(self, queryset=None):
         post_id = self.kwargs.get('post_id')
-        post = get_object_or_404(Post, id=post_id)
-        if (
-            post.author == self.request.user
-            or (post.is_published and post.category.is_published)
-        ):
+        record_objects(self.request, [('post', post_id)])
+        post = post_by_id.first(id=post_id)
+        if post is None:
+            raise Http404('Страница не найдена')
+        record_objects(self.request, [
+            ('category', post.category_id),
+            ('location', post.location_id),
+            ('user', post.author_id),
+        ])
+        add_surrogate_keys(self.request, post_keys(post))
+        if is_post_public(post):
+            return post
+        if post.author_id == self.request.user.id:
+            # Скрытый пост виден только автору — в общий кеш не кладём.
+            mark_uncacheable(self.request)
             return post
         raise Http404('Страница не найдена')
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['form'] = CommentForm()
-        context['comments'] = self.object.comments.select_related('author')
+        # Комментарии выводятся страницами, новые или старые сначала.
+        newest = self.request.GET.get('comments') == 'new'
+        comments = Paginator(
+            ThreadComments(self.object.id, newest), COMMENTS_PAGE_SIZE
+        ).get_page(self.request.GET.get('comments_page'))
+        order = 'new' if newest else 'old'
+        context.update(
+            comments=comments,
+            comments_newest=newest,
+            comments_variant=f'{order}:{comments.number}',
+        )
         return context
 
 
-class CategoryPostListView(CategoryAvailableMixin, ListView):
+def comment_json(comment, body):
+    return {
+        'id': comment.id,
+        'author': comment.author.username,
+        'text': comment.text,
+        'pub_date': comment.pub_date.isoformat(),
+        'html': body.render({'comment': comment}),
+    }
+
+
+class PostCommentsView(CursorMixin, View):
+    """
+    Страница ветки комментариев после курсора `after` для подгрузки
+    при прокрутке: HTML-фрагмент или JSON со списком комментариев.
+    """
+
+    template_name = 'includes/comment_batch.html'
+
+    def get(self, request, post_id):
+        post = post_by_id.first(id=post_id)
+        if post is None or not (
+            is_post_public(post) or post.author_id == request.user.id
+        ):
+            raise Http404('Страница не найдена')
+        newest = request.GET.get('comments') == 'new'
+        comments = thread_batch(post.id, newest, self.get_after())
+        next_url = None
+        if len(comments) == COMMENTS_PAGE_SIZE:
+            next_url = cursor_url(
+                request.path, comments[-1],
+                **({'comments': 'new'} if newest else {})
+            )
+        if self.wants_json():
+            body = get_template(COMMENT_BODY_TEMPLATE)
+            response = JsonResponse({
+                'comments': [
+                    comment_json(comment, body) for comment in comments
+                ],
+                'next': next_url,
+            })
+        else:
+            response = render(request, self.template_name, {
+                'post': post, 'comments': comments,
+            })
+        return self.link_next(response, next_url)
+
+
+def next_cards_url(url, page_obj):
+    """Адрес карточек, следующих за страницей ленты, для подгрузки."""
+    if page_obj.has_next():
+        return cursor_url(url, page_obj.object_list[-1])
+    return None
+
+
+class FeedCardsView(CursorMixin, View):
+    """
+    Карточки ленты после курсора `after` для подгрузки при прокрутке:
+    только карточки из кеша фрагментов, без макета страницы. Позиция
+    курсора находится в индексе ленты в памяти, так что шаг прокрутки
+    стоит одной выборки постов порции.
+    """
+
+    template_name = 'includes/feed_cards.html'
+    previews = False
+
+    def get_feed(self):
+        """Имя ленты и её ключи для обратного прокси."""
+        raise NotImplementedError(
+            'Определите get_feed() в классе-наследнике.'
+        )
+
+    def get(self, request, *args, **kwargs):
+        feed, surrogate_keys = self.get_feed()
+        record_objects(request, feed_dependencies(feed))
+        add_surrogate_keys(request, surrogate_keys)
+        posts = feed_posts(feed)
+        after = self.get_after()
+        start = posts.index.position_after(*after) if after else 0
+        cards = posts[start:start + LATEST_POSTS_COUNT]
+        add_post_keys(request, cards)
+        next_url = None
+        if cards and start + LATEST_POSTS_COUNT < len(posts):
+            next_url = cursor_url(request.path, cards[-1])
+        html = render_to_string(self.template_name, {
+            'posts': cards, 'previews': self.previews,
+        }, request)
+        if self.wants_json():
+            response = JsonResponse({
+                'html': html,
+                'cursor': date_cursor(cards[-1]) if next_url else None,
+                'next': next_url,
+            })
+        else:
+            response = HttpResponse(html)
+        return self.link_next(response, next_url)
+
+
+class IndexCardsView(FeedCardsView):
+
+    previews = True
+
+    def get_feed(self):
+        return 'index', [INDEX_KEY]
+
+
+class CategoryCardsView(CategoryAvailableMixin, FeedCardsView):
+
+    def get_feed(self):
+        category = self.get_category()
+        record_objects(self.request, [('category', category.id)])
+        return f'category:{category.id}', [f'category-{category.slug}']
+
+
+class ProfileCardsView(FeedCardsView):
+
+    def get_feed(self):
+        try:
+            profile = users_by_username.get(self.kwargs['username'])
+        except User.DoesNotExist:
+            raise Http404('Пользователь не найден.')
+        record_objects(self.request, [('user', profile.id)])
+        return f'user:{profile.id}', [f'user-{profile.id}']
+
+
+class CategoryListView(ListView):
+    """Опубликованные категории с числом постов из счётчиков."""
+
+    template_name = 'blog/categories.html'
+    context_object_name = 'categories'
+
+    def get_queryset(self):
+        return with_post_counts(
+            Category.objects.filter(is_published=True).order_by('title')
+        )
+
+
+class CategoryPostListView(
+    CategoryAvailableMixin, ConditionalGetMixin, StreamingMixin, ListView
+):
     """Отображает все посты, относящиеся к заданной категории."""
 
     model = Post
@@ -202,13 +407,26 @@ class CategoryPostListView(CategoryAvailableMixin, ListView):
             self._category = super().get_category()
         return self._category
 
+    def get_validator(self):
+        return feed_validator(f'category:{self.get_category().id}')
+
     def get_queryset(self):
-        return (
-            filter_published_posts(self.get_category().posts)
-            .order_by('-pub_date')
-        )
+        category = self.get_category()
+        record_objects(self.request, [
+            *feed_dependencies(f'category:{category.id}'),
+            ('category', category.id),
+        ])
+        return feed_posts(f'category:{category.id}')
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['category'] = self.get_category()
+        context['feed_more'] = next_cards_url(
+            reverse('blog:category_cards', args=[context['category'].slug]),
+            context['page_obj'],
+        )
+        add_surrogate_keys(
+            self.request, [f'category-{context["category"].slug}']
+        )
+        add_post_keys(self.request, context['page_obj'])
         return context
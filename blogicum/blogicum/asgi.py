@@ -14,3 +14,11 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'blogicum.settings')
 
 application = get_asgi_application()
+
+from blog.caching.feeds import feed_indexes  # noqa: E402
+from blog.caching.warming import warm_in_background  # noqa: E402
+from blog.templating import warm_templates  # noqa: E402
+
+warm_templates()
+feed_indexes.warm()
+warm_in_background()
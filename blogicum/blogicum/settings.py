@@ -29,11 +29,17 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'blog.perf.middleware.MemoryProfilerMiddleware',
+    'blog.perf.middleware.QueryStatsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'blog.perf.middleware.ProfilerMiddleware',
+    'blog.perf.middleware.TemplateProfilerMiddleware',
+    'blog.caching.middleware.PageCacheMiddleware',
+    'blog.caching.middleware.ProxyCacheMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'debug_toolbar.middleware.DebugToolbarMiddleware',
@@ -47,8 +53,15 @@ TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [TEMPLATES_DIR],
-        'APP_DIRS': True,
         'OPTIONS': {
+            # Кеширующий загрузчик включён явно, независимо от DEBUG:
+            # после правки шаблонов сервер нужно перезапустить.
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
             'context_processors': [
                 'django.template.context_processors.debug',
                 'django.template.context_processors.request',
@@ -60,6 +73,9 @@ TEMPLATES = [
     },
 ]
 
+# debug_toolbar не видит app_directories внутри кеширующего загрузчика.
+SILENCED_SYSTEM_CHECKS = ['debug_toolbar.W006']
+
 WSGI_APPLICATION = 'blogicum.wsgi.application'
 
 DATABASES = {
@@ -69,6 +85,74 @@ DATABASES = {
     },
 }
 
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'blogicum',
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+    # Готовые страницы и версии объектов общие для всех процессов узла:
+    # страница, собранная одним воркером, отдаётся остальными, а изменение
+    # в одном воркере сбрасывает её во всех.
+    'pages': {
+        'BACKEND': 'blog.caching.mmap_backend.MmapCache',
+        'LOCATION': BASE_DIR / 'cache' / 'pages.mmap',
+        'OPTIONS': {'SLOTS': 512, 'SLOT_SIZE': 128 * 1024},
+    },
+    'shared': {
+        'BACKEND': 'blog.caching.mmap_backend.MmapCache',
+        'LOCATION': BASE_DIR / 'cache' / 'shared.mmap',
+        'OPTIONS': {'SLOTS': 8192, 'SLOT_SIZE': 512},
+    },
+    # Фрагменты шаблонов и объекты кеша объектов: второй уровень после
+    # LRU процесса, общий для воркеров узла.
+    'fragments': {
+        'BACKEND': 'blog.caching.mmap_backend.MmapCache',
+        'LOCATION': BASE_DIR / 'cache' / 'fragments.mmap',
+        'OPTIONS': {'SLOTS': 4096, 'SLOT_SIZE': 8 * 1024},
+    },
+    # Отметки проверки отложенных публикаций — отдельно от вытесняемых
+    # записей: потеря отметки перестраивает все ленты.
+    'scheduling': {
+        'BACKEND': 'blog.caching.mmap_backend.MmapCache',
+        'LOCATION': BASE_DIR / 'cache' / 'scheduling.mmap',
+        'OPTIONS': {'SLOTS': 16, 'SLOT_SIZE': 256},
+    },
+}
+PAGE_CACHE_ALIAS = 'pages'
+VERSIONS_CACHE_ALIAS = 'shared'
+FRAGMENT_CACHE_ALIAS = 'fragments'
+OBJECT_CACHE_ALIAS = 'fragments'
+SCHEDULING_CACHE_ALIAS = 'scheduling'
+
+# Кеш страниц лент и постов для анонимных посетителей.
+PAGE_CACHE_ENABLED = True
+PAGE_CACHE_TIMEOUT = 5 * 60
+# Общие страницы с персональными фрагментами и для авторизованных
+# пользователей. Включается на боевом сервере: при попадании в кеш view
+# не вызывается, и в тестовом клиенте недоступен response.context.
+PAGE_CACHE_AUTHENTICATED = False
+
+# Потоковая отдача лент и страниц постов (см. blog.mixins.StreamingMixin):
+# <head> уходит клиенту до рендеринга остальной страницы, и браузер
+# раньше загружает стили. Ответ идёт без Content-Length, а страница,
+# которая собирается для кеша страниц, потоком не отдаётся.
+STREAMING_PAGES = False
+
+# Адрес, на который отправляются запросы очистки кеша обратного прокси
+# (например, http://127.0.0.1:6081/). Без него очистка отключена.
+PROXY_PURGE_URL = None
+
+# Прогрев кеша страниц в фоне при старте процесса; дополнительные адреса
+# для прогрева перечисляются в CACHE_WARM_URLS.
+CACHE_WARM_ON_STARTUP = False
+CACHE_WARM_URLS = ['/pages/about/', '/pages/rules/']
+
+# Карточки лент из лёгких строк `blog.rows.PostRow` вместо моделей.
+# В контекст шаблона тогда попадают не экземпляры Post, поэтому по
+# умолчанию выключено (на них рассчитаны тесты проекта).
+POST_CARD_ROWS = False
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': (
@@ -113,3 +197,19 @@ CSRF_FAILURE_VIEW = 'pages.views.csrf_failure'
 LOGIN_URL = '/login/'
 
 LOGIN_REDIRECT_URL = 'blog:index'
+
+# Каталог для отчётов профилирования и снимков статистики.
+PERF_DIR = BASE_DIR / 'perf'
+
+QUERY_STATS_ENABLED = True
+QUERY_STATS_FLUSH_INTERVAL = 60
+
+PROFILER_SAMPLE_INTERVAL = 0.005
+PROFILER_MAX_REPORTS = 50
+
+TEMPLATE_PROFILER_ENABLED = True
+TEMPLATE_REPORTS_MAX = 50
+
+# Учёт памяти заметно замедляет процесс, поэтому включается явно.
+MEMORY_PROFILER_ENABLED = False
+MEMORY_SNAPSHOT_EVERY = 20
@@ -10,6 +10,7 @@ urlpatterns = [
     path('', include('blog.urls', namespace='blog')),
     path('pages/', include('pages.urls', namespace='pages')),
     path('auth/', include('django.contrib.auth.urls')),
+    path('admin/perf/', include('blog.perf.urls', namespace='perf')),
     path('admin/', admin.site.urls),
     path('auth/registration/',
          UserRegistrationView.as_view(),
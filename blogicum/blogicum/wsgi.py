@@ -5,3 +5,11 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'blogicum.settings')
 
 application = get_wsgi_application()
+
+from blog.caching.feeds import feed_indexes  # noqa: E402
+from blog.caching.warming import warm_in_background  # noqa: E402
+from blog.templating import warm_templates  # noqa: E402
+
+warm_templates()
+feed_indexes.warm()
+warm_in_background()
@@ -0,0 +1,57 @@
+// Подгрузка следующих порций ленты или ветки комментариев при прокрутке.
+// Метка `#scroll-more` задаёт адрес порции (`data-next`), контейнер
+// для неё (`data-target`) и ссылки на страницы (`data-pager`), которые
+// остаются для браузеров без JavaScript. Адрес следующей порции
+// берётся из заголовка Link ответа.
+(function () {
+  const more = document.getElementById('scroll-more');
+  if (!more || !('IntersectionObserver' in window)) {
+    return;
+  }
+  const list = document.getElementById(more.dataset.target);
+  const pager = document.getElementById(more.dataset.pager);
+  let loading = false;
+
+  function nextUrl(response) {
+    const match = (response.headers.get('Link') || '').match(
+      /<([^>]+)>;\s*rel="next"/
+    );
+    return match ? match[1] : '';
+  }
+
+  const observer = new IntersectionObserver(async (entries) => {
+    if (loading || !entries.some((entry) => entry.isIntersecting)) {
+      return;
+    }
+    loading = true;
+    try {
+      const response = await fetch(more.dataset.next, {
+        credentials: 'same-origin',
+      });
+      if (!response.ok) {
+        throw new Error(response.statusText);
+      }
+      list.insertAdjacentHTML('beforeend', await response.text());
+      more.dataset.next = nextUrl(response);
+      observer.unobserve(more);
+      if (more.dataset.next) {
+        // Новое наблюдение сработает сразу, если метка всё ещё видна.
+        observer.observe(more);
+      } else {
+        more.remove();
+      }
+    } catch (error) {
+      observer.disconnect();
+      if (pager) {
+        pager.hidden = false;
+      }
+    } finally {
+      loading = false;
+    }
+  });
+
+  if (pager) {
+    pager.hidden = true;
+  }
+  observer.observe(more);
+})();
@@ -41,6 +41,72 @@ def enable_debug_false():
         yield
 
 
+@pytest.fixture(scope='session', autouse=True)
+def isolated_caches(tmp_path_factory):
+    """
+    Кеши на файлах (`MmapCache`) в тестах живут во временном каталоге:
+    очистка между тестами не должна трогать кеш в BASE_DIR/cache.
+    """
+    from django.conf import settings
+
+    directory = tmp_path_factory.mktemp('cache')
+    caches_setting = {}
+    for alias, config in settings.CACHES.items():
+        config = dict(config)
+        if config['BACKEND'].endswith('MmapCache'):
+            config['LOCATION'] = directory / Path(config['LOCATION']).name
+        caches_setting[alias] = config
+    with override_settings(CACHES=caches_setting):
+        yield
+
+
+@pytest.fixture(autouse=True)
+def clear_caches():
+    """Кеши живут в процессе дольше тестовой БД: очищаем их между тестами."""
+    from django.core.cache import caches
+
+    from blog.caching.feeds import feed_indexes
+    from blog.caching.objects import clear_local
+    for cache in caches.all():
+        cache.clear()
+    clear_local()
+    feed_indexes.clear()
+    yield
+
+
+# Модули, которые сравнивают дату публикации с текущим временем.
+CLOCK_MODULES = (
+    'blog.utils', 'blog.stats', 'blog.signals', 'blog.scheduling',
+    'blog.caching.feeds',
+)
+
+
+class Clock:
+    def __init__(self, current):
+        self.current = current
+
+    def __call__(self):
+        return self.current
+
+    def advance(self, **kwargs):
+        from datetime import timedelta
+        self.current += timedelta(**kwargs)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """
+    Часы видимости и отложенных публикаций: тест переводит их вперёд
+    через `clock.advance(seconds=...)` вместо ожидания.
+    """
+    from django.utils import timezone
+
+    clock = Clock(timezone.now())
+    for module in CLOCK_MODULES:
+        monkeypatch.setattr(f'{module}.now', clock)
+    return clock
+
+
 class SafeImportFromContextManager:
     def __init__(
             self,
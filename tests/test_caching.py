@@ -0,0 +1,685 @@
+import pytest
+from django.core.management import call_command
+
+
+@pytest.mark.django_db(transaction=True)
+def test_post_card_fragment_invalidated_on_save(
+        client, post_with_published_location
+):
+    post = post_with_published_location
+    old_title = post.title
+    assert old_title in client.get('/').content.decode('utf-8')
+    post.title = 'Новый заголовок для проверки кеша'
+    post.save()
+    content = client.get('/').content.decode('utf-8')
+    assert post.title in content, (
+        'Убедитесь, что после сохранения поста его карточка в кеше '
+        'фрагментов обновляется.'
+    )
+    post.category.title = 'Переименованная категория'
+    post.category.save()
+    assert post.category.title in client.get('/').content.decode('utf-8')
+
+
+@pytest.mark.django_db(transaction=True)
+def test_post_cards_served_from_fragment_cache(
+        client, post_with_published_location
+):
+    def rendered_templates(response):
+        return {template.name for template in response.templates}
+
+    assert 'includes/post_card.html' in rendered_templates(client.get('/'))
+    assert 'includes/post_card.html' not in rendered_templates(
+        client.get('/')
+    ), 'Убедитесь, что повторно карточки постов берутся из кеша фрагментов.'
+
+
+@pytest.mark.django_db(transaction=True)
+def test_comment_thread_keeps_user_controls_outside_cache(
+        comment_to_a_post, client, mixer
+):
+    from django.test import Client
+    post = comment_to_a_post.post
+    url = f'/posts/{post.id}/'
+    edit_url = f'/posts/{post.id}/edit_comment/{comment_to_a_post.id}/'
+    author_client = Client()
+    author_client.force_login(comment_to_a_post.author)
+    assert edit_url in author_client.get(url).content.decode('utf-8')
+    other_client = Client()
+    other_client.force_login(mixer.blend('auth.User'))
+    assert edit_url not in other_client.get(url).content.decode('utf-8'), (
+        'Убедитесь, что кнопки управления комментарием не попадают '
+        'в кешированный фрагмент ветки комментариев.'
+    )
+    comment_to_a_post.text = 'Изменённый текст комментария'
+    comment_to_a_post.save()
+    assert comment_to_a_post.text in other_client.get(url).content.decode(
+        'utf-8'
+    )
+
+
+@pytest.mark.django_db(transaction=True)
+def test_anonymous_page_cache_hit_and_purge(
+        client, user_client, post_with_published_location
+):
+    post = post_with_published_location
+    assert client.get('/')['X-Page-Cache'] == 'MISS'
+    assert client.get('/')['X-Page-Cache'] == 'HIT', (
+        'Убедитесь, что повторный запрос анонима к ленте отдаётся из кеша.'
+    )
+    assert 'X-Page-Cache' not in user_client.get('/'), (
+        'Убедитесь, что без PAGE_CACHE_AUTHENTICATED авторизованные '
+        'пользователи не получают страницы из кеша.'
+    )
+    post.title = 'Заголовок после сброса кеша страницы'
+    post.save()
+    response = client.get('/')
+    assert response['X-Page-Cache'] == 'MISS'
+    assert post.title in response.content.decode('utf-8')
+
+    detail_url = f'/posts/{post.id}/'
+    client.get(detail_url)
+    assert client.get(detail_url)['X-Page-Cache'] == 'HIT'
+    post.author.username = 'renamed_author'
+    post.author.save()
+    response = client.get(detail_url)
+    assert 'renamed_author' in response.content.decode('utf-8')
+
+
+@pytest.mark.django_db
+def test_page_cache_counters_kept_in_process(client, settings):
+    from django.core.cache import caches
+
+    from blog.caching import pages
+
+    pages.metrics()
+    cache = caches[settings.PAGE_CACHE_ALIAS]
+    cache.delete_many([pages.HITS_KEY, pages.MISSES_KEY])
+    settings.PAGE_METRICS_FLUSH_INTERVAL = 60
+    client.get('/')
+    client.get('/')
+    assert cache.get(pages.HITS_KEY) is None, (
+        'Убедитесь, что счётчики попаданий не пишутся в общий кеш '
+        'на каждом запросе.'
+    )
+    metrics = pages.metrics()
+    assert (metrics['hits'], metrics['misses']) == (1, 1)
+    assert cache.get(pages.HITS_KEY) == 1
+
+
+@pytest.mark.django_db(transaction=True)
+def test_page_cache_purged_when_scheduled_post_is_published(
+        client, mixer, user, published_category, clock
+):
+    from datetime import timedelta
+    post = mixer.blend(
+        'blog.Post', author=user, category=published_category,
+        is_published=True, location=None,
+        pub_date=clock() + timedelta(hours=1),
+    )
+    assert post.title not in client.get('/').content.decode('utf-8')
+    assert client.get('/')['X-Page-Cache'] == 'HIT'
+    clock.advance(hours=1, seconds=1)
+    assert post.title in client.get('/').content.decode('utf-8'), (
+        'Убедитесь, что кеш ленты сбрасывается, когда наступает дата '
+        'отложенной публикации.'
+    )
+
+
+@pytest.mark.django_db(transaction=True)
+def test_feeds_rebuilt_when_scheduling_checkpoint_is_lost(
+        client, mixer, user, published_category, clock, settings
+):
+    from datetime import timedelta
+
+    from django.core.cache import caches
+
+    post = mixer.blend(
+        'blog.Post', author=user, category=published_category,
+        is_published=True, location=None,
+        pub_date=clock() + timedelta(hours=1),
+    )
+    assert post.title not in client.get('/').content.decode('utf-8')
+    caches[settings.SCHEDULING_CACHE_ALIAS].clear()
+    clock.advance(hours=1, seconds=1)
+    assert post.title in client.get('/').content.decode('utf-8'), (
+        'Убедитесь, что при потере отметки проверки отложенных публикаций '
+        'ленты перестраиваются.'
+    )
+
+
+@pytest.mark.django_db(transaction=True)
+def test_shared_page_with_personal_holes(
+        settings, client, user_client, another_user_client, comment_to_a_post
+):
+    settings.PAGE_CACHE_AUTHENTICATED = True
+    post = comment_to_a_post.post
+    url = f'/posts/{post.id}/'
+    author_client = user_client
+    if post.author != comment_to_a_post.author:
+        from django.test import Client
+        author_client = Client()
+        author_client.force_login(post.author)
+    edit_post_url = f'/posts/{post.id}/edit/'
+
+    first = author_client.get(url)
+    assert first['X-Page-Cache'] == 'MISS'
+    assert edit_post_url in first.content.decode('utf-8')
+    assert post.author.username in first.content.decode('utf-8')
+
+    other = another_user_client.get(url)
+    other_content = other.content.decode('utf-8')
+    assert other['X-Page-Cache'] == 'HIT', (
+        'Убедитесь, что авторизованные пользователи получают общую '
+        'страницу из кеша.'
+    )
+    assert edit_post_url not in other_content, (
+        'Убедитесь, что персональные ссылки автора не попадают в общий кеш.'
+    )
+    assert 'csrfmiddlewaretoken' in other_content
+    assert '<!--hole:' not in other_content
+    assert other.cookies.get('csrftoken'), (
+        'Убедитесь, что для формы комментария выставляется CSRF-cookie.'
+    )
+    anonymous_content = client.get(url).content.decode('utf-8')
+    assert 'csrfmiddlewaretoken' not in anonymous_content
+
+
+@pytest.mark.django_db(transaction=True)
+def test_hidden_post_not_shared_from_cache(
+        settings, user_client, another_user_client, mixer, user
+):
+    settings.PAGE_CACHE_AUTHENTICATED = True
+    post = mixer.blend('blog.Post', author=user, is_published=False)
+    url = f'/posts/{post.id}/'
+    assert user_client.get(url).status_code == 200
+    assert another_user_client.get(url).status_code == 404
+
+
+@pytest.mark.django_db(transaction=True)
+def test_conditional_get_returns_not_modified(
+        client, comment_to_a_post
+):
+    post = comment_to_a_post.post
+    etags = {}
+    for url in ('/', f'/posts/{post.id}/'):
+        response = client.get(url)
+        etag = etags[url] = response['ETag']
+        # По дате изменения удаление не отличить от отсутствия правок.
+        assert not response.has_header('Last-Modified')
+        assert client.get(
+            url, HTTP_IF_NONE_MATCH=etag
+        ).status_code == 304, (
+            'Убедитесь, что при совпадении ETag страница отвечает 304.'
+        )
+    comment_to_a_post.text = 'Правка меняет валидатор страницы поста'
+    comment_to_a_post.save()
+    assert client.get(
+        f'/posts/{post.id}/', HTTP_IF_NONE_MATCH=etag
+    ).status_code == 200, (
+        'Убедитесь, что правка комментария меняет ETag страницы поста.'
+    )
+    assert client.get(
+        '/', HTTP_IF_NONE_MATCH=etags['/']
+    ).status_code == 200, (
+        'Убедитесь, что правка комментария меняет ETag главной: '
+        'карточки выводят последние комментарии.'
+    )
+    etag = client.get('/')['ETag']
+    post.delete()
+    assert client.get('/', HTTP_IF_NONE_MATCH=etag).status_code == 200, (
+        'Убедитесь, что удаление поста меняет ETag ленты.'
+    )
+
+
+@pytest.mark.django_db(transaction=True)
+def test_validators_do_not_query_database(
+        client, post_with_published_location, django_assert_num_queries
+):
+    from blog.conditional import feed_validator, post_validator
+    post = post_with_published_location
+    client.get('/')
+    with django_assert_num_queries(0):
+        feed_validator('index')
+        post_validator(post.id)
+
+
+@pytest.mark.django_db(transaction=True)
+def test_proxy_cache_headers(client, post_with_published_location):
+    post = post_with_published_location
+    about = client.get('/pages/about/')
+    assert 's-maxage=86400' in about['Cache-Control'], (
+        'Убедитесь, что статические страницы кешируются прокси надолго.'
+    )
+    index = client.get('/')
+    assert 'stale-while-revalidate' in index['Cache-Control']
+    keys = index['Surrogate-Key'].split()
+    assert f'post-{post.id}' in keys, (
+        'Убедитесь, что лента помечается ключами постов на странице.'
+    )
+    assert f'category-{post.category.slug}' in keys
+    assert f'user-{post.author_id}' in keys
+    assert client.get('/')['Surrogate-Key'].split() == keys, (
+        'Убедитесь, что ответ из кеша страниц сохраняет суррогатные ключи.'
+    )
+
+
+@pytest.mark.django_db(transaction=True)
+def test_purge_dispatched_to_proxy(settings, post_with_published_location):
+    import threading
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    from blog.caching.proxy import dispatcher
+
+    purged = []
+
+    class StandInProxy(BaseHTTPRequestHandler):
+        def do_PURGE(self):
+            purged.append(set(self.headers['Surrogate-Key'].split()))
+            self.send_response(200)
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StandInProxy)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    settings.PROXY_PURGE_URL = f'http://127.0.0.1:{server.server_port}/'
+    try:
+        post = post_with_published_location
+        post.title = 'Изменённый заголовок'
+        post.save()
+        dispatcher.flush()
+    finally:
+        server.shutdown()
+        server.server_close()
+    keys = set().union(*purged)
+    assert {f'post-{post.id}', 'index'} <= keys, (
+        'Убедитесь, что при изменении поста прокси получает запрос очистки '
+        'с его суррогатными ключами.'
+    )
+
+
+@pytest.mark.django_db(transaction=True)
+def test_cold_page_waits_for_process_rendering_it(
+        client, post_with_published_location
+):
+    import threading
+
+    from blog.caching import pages, stampede
+
+    cache = pages._cache()
+    response = client.get('/')
+    key = pages.page_key(response.wsgi_request)
+    entry = cache.get(key)
+    cache.delete(key)
+    assert stampede.acquire(cache, key)
+    timer = threading.Timer(0.2, cache.set, (key, entry))
+    timer.start()
+    try:
+        response = client.get('/')
+    finally:
+        timer.join()
+        stampede.release(cache, key)
+    assert response['X-Page-Cache'] == 'HIT', (
+        'Убедитесь, что страницу, которой ещё нет в кеше, но которую уже '
+        'собирает другой процесс, остальные процессы ждут, а не собирают '
+        'сами.'
+    )
+    assert post_with_published_location.title in response.content.decode(
+        'utf-8'
+    )
+
+
+@pytest.mark.django_db(transaction=True)
+def test_page_too_large_for_slot_is_not_waited_for(
+        client, monkeypatch, tmp_path, post_with_published_location
+):
+    import threading
+    import time
+
+    from blog.caching import pages, stampede
+    from blog.caching.mmap_backend import MmapCache
+    from blog.constants import STAMPEDE_WAIT
+
+    cache = MmapCache(tmp_path / 'pages.mmap', {
+        'OPTIONS': {'SLOTS': 8, 'SLOT_SIZE': 512, 'PROBE': 8},
+    })
+    monkeypatch.setattr(pages, '_cache', lambda: cache)
+    response = client.get('/')
+    assert 'X-Page-Cache' not in response, (
+        'Убедитесь, что страница, не поместившаяся в кеш, не отмечается '
+        'как сохранённая.'
+    )
+    key = pages.page_key(response.wsgi_request)
+    assert cache.get(key) is None
+    assert stampede.acquire(cache, key)
+    timer = threading.Timer(0.2, stampede.release, (cache, key))
+    timer.start()
+    started = time.monotonic()
+    try:
+        response = client.get('/')
+    finally:
+        timer.join()
+    assert response.status_code == 200
+    assert time.monotonic() - started < STAMPEDE_WAIT, (
+        'Убедитесь, что процессы не ждут страницу, которую освободивший '
+        'пересчёт процесс не сохранил.'
+    )
+
+
+@pytest.mark.django_db(transaction=True)
+def test_stale_page_served_during_refresh_and_on_locked_database(
+        client, monkeypatch, post_with_published_location
+):
+    from django.db import OperationalError
+
+    from blog import views
+    from blog.caching import pages, stampede
+
+    cache = pages._cache()
+    post = post_with_published_location
+    old_title = post.title
+    response = client.get('/')
+    key = pages.page_key(response.wsgi_request)
+    post.title = 'Заголовок, который пересчитывает другой процесс'
+    post.save()
+    assert stampede.acquire(cache, key)
+    response = client.get('/')
+    assert response['X-Page-Cache'] == 'STALE', (
+        'Убедитесь, что пока страницу пересчитывает другой процесс, '
+        'отдаётся прежняя версия.'
+    )
+    assert old_title in response.content.decode('utf-8')
+    stampede.release(cache, key)
+
+    def locked(feed):
+        raise OperationalError('database is locked')
+
+    monkeypatch.setattr(views, 'feed_posts', locked)
+    response = client.get('/')
+    assert response.status_code == 200
+    assert response['X-Page-Cache'] == 'STALE', (
+        'Убедитесь, что при блокировке базы отдаётся прежняя версия страницы.'
+    )
+    monkeypatch.undo()
+    assert post.title in client.get('/').content.decode('utf-8')
+
+
+@pytest.mark.django_db(transaction=True)
+def test_object_cache_lookups_skip_database(
+        django_assert_num_queries, published_category, settings
+):
+    from django.core.cache import caches
+    from django.core.cache.backends.locmem import LocMemCache
+
+    from blog.caching.objects import categories_by_slug, clear_local
+
+    for alias in (settings.OBJECT_CACHE_ALIAS, settings.FRAGMENT_CACHE_ALIAS):
+        assert not isinstance(caches[alias], LocMemCache), (
+            'Убедитесь, что второй уровень кеша объектов и кеш фрагментов '
+            'общие для процессов, а не в памяти одного процесса.'
+        )
+
+    slug = published_category.slug
+    categories_by_slug.get(slug)
+    with django_assert_num_queries(0):
+        category = categories_by_slug.get(slug)
+    assert category == published_category
+    clear_local()
+    with django_assert_num_queries(0):
+        categories_by_slug.get(slug)
+    published_category.title = 'Категория после изменения'
+    published_category.save()
+    assert categories_by_slug.get(slug).title == published_category.title, (
+        'Убедитесь, что изменение категории сбрасывает её запись в кеше '
+        'объектов во всех процессах.'
+    )
+
+
+@pytest.mark.django_db(transaction=True)
+def test_warm_cache_command(client, post_with_published_location):
+    from blog.caching.warming import (
+        CacheWarmer, hot_urls, process_local_aliases
+    )
+
+    post = post_with_published_location
+    assert process_local_aliases() == [], (
+        'Убедитесь, что кеши страниц, фрагментов и объектов общие для '
+        'воркеров: иначе команда warm_cache их не прогреет.'
+    )
+    urls = hot_urls(pages=1)
+    assert '/' in urls
+    assert f'/category/{post.category.slug}/' in urls
+    assert f'/profile/{post.author.username}/' in urls
+    call_command('warm_cache', workers=2)
+    assert client.get('/')['X-Page-Cache'] == 'HIT', (
+        'Убедитесь, что после прогрева лента отдаётся из кеша страниц.'
+    )
+    from django.core.cache import caches
+    for cache in caches.all():
+        cache.clear()
+    results = CacheWarmer(workers=1, query_budget=1).warm(urls)
+    assert any(result['status'] is None for result in results), (
+        'Убедитесь, что после исчерпания бюджета запросов к базе '
+        'прогрев останавливается.'
+    )
+
+
+def _store_in_child(cache):
+    cache.set('from_child', {'content': b'page'})
+
+
+def test_mmap_cache_shared_between_processes(tmp_path):
+    import multiprocessing
+
+    from blog.caching.mmap_backend import MmapCache
+
+    cache = MmapCache(tmp_path / 'cache.mmap', {
+        'OPTIONS': {'SLOTS': 4, 'SLOT_SIZE': 1024, 'PROBE': 4},
+    })
+    cache.set('before_fork', 1)
+    child = multiprocessing.get_context('fork').Process(
+        target=_store_in_child, args=(cache,)
+    )
+    child.start()
+    child.join()
+    assert cache.get('from_child') == {'content': b'page'}, (
+        'Убедитесь, что значение, записанное другим процессом, видно '
+        'через общий файл.'
+    )
+    assert cache.add('lock', 1) and not cache.add('lock', 2)
+    assert cache.incr('before_fork') == 2
+    cache.set('big', b'x' * 2048)
+    assert cache.get('big') is None
+    cache.set('fourth', 4)
+    for key in ('from_child', 'lock', 'fourth'):
+        assert cache.get(key) is not None
+    cache.set('fifth', 5)
+    assert cache.get('fifth') == 5
+    assert cache.get('before_fork') is None, (
+        'Убедитесь, что при нехватке слотов вытесняется давно не читанное.'
+    )
+    assert cache.get('from_child') is not None
+    cache.delete('fifth')
+    assert not cache.has_key('fifth')
+
+
+@pytest.mark.django_db(transaction=True)
+def test_feed_index_maintained_incrementally(
+        mixer, user, published_category, published_location
+):
+    from blog.caching.feeds import feed_indexes, feed_posts
+    from blog.caching.versions import bump
+
+    def ids(feed):
+        return list(feed_indexes.get(feed).ids)
+
+    posts = mixer.cycle(3).blend(
+        'blog.Post', author=user, category=published_category,
+        location=published_location, is_published=True,
+    )
+    newest_first = [
+        post.id for post in sorted(
+            posts, key=lambda post: post.pub_date, reverse=True
+        )
+    ]
+    assert ids('index') == newest_first
+    index = feed_indexes.get('index')
+    hidden = posts[0]
+    hidden.is_published = False
+    hidden.save()
+    assert feed_indexes.get('index') is index, (
+        'Убедитесь, что изменение поста применяется к индексу ленты на '
+        'месте, без перестройки.'
+    )
+    assert hidden.id not in ids('index')
+    assert hidden.id in ids(f'user:{user.id}')
+    posts[1].delete()
+    assert posts[1].id not in ids(f'category:{published_category.id}')
+    bump('feed', 'index')
+    assert feed_indexes.get('index') is not index, (
+        'Убедитесь, что индекс перестраивается, если версию ленты '
+        'увеличили без записи в журнал изменений.'
+    )
+    assert ids('index') == [posts[2].id]
+    assert [post.id for post in feed_posts('index')[0:10]] == [posts[2].id]
+
+
+@pytest.mark.django_db(transaction=True)
+def test_feed_index_changes_reach_other_processes_on_commit(
+        mixer, user, published_category, published_location
+):
+    from django.db import connection, transaction
+    from django.test.utils import CaptureQueriesContext
+
+    from blog.caching.feeds import FeedIndexes, feed_indexes
+
+    posts = mixer.cycle(2).blend(
+        'blog.Post', author=user, category=published_category,
+        location=published_location, is_published=True,
+    )
+    other = FeedIndexes()
+    index = other.get('index')
+    feed_indexes.get('index')
+    with transaction.atomic():
+        posts[0].is_published = False
+        posts[0].save()
+        assert posts[0].id not in feed_indexes.get('index').ids, (
+            'Убедитесь, что транзакция видит свои изменения ленты.'
+        )
+        assert posts[0].id in other.get('index').ids, (
+            'Убедитесь, что другие процессы не видят изменения ленты '
+            'до фиксации транзакции.'
+        )
+    with CaptureQueriesContext(connection) as queries:
+        assert other.get('index') is index
+    assert posts[0].id not in index.ids, (
+        'Убедитесь, что после фиксации другие процессы применяют '
+        'изменение ленты из журнала.'
+    )
+    assert len(queries) == 0, (
+        'Убедитесь, что индекс другого процесса не перестраивается.'
+    )
+    deleted_id = posts[1].id
+    with pytest.raises(RuntimeError), transaction.atomic():
+        posts[1].delete()
+        assert deleted_id not in feed_indexes.get('index').ids
+        raise RuntimeError
+    assert deleted_id in feed_indexes.get('index').ids, (
+        'Убедитесь, что изменения откаченной транзакции не остаются '
+        'в индексе ленты.'
+    )
+    assert deleted_id in other.get('index').ids
+
+
+@pytest.mark.django_db(transaction=True)
+def test_feed_cards_use_stored_excerpt(
+        client, mixer, user, published_category
+):
+    from django.apps import apps
+    from django.db import connection
+    from django.db.migrations.executor import MigrationExecutor
+    from django.test.utils import CaptureQueriesContext
+
+    from blog.models import Post
+
+    post = mixer.blend(
+        'blog.Post', author=user, category=published_category,
+        is_published=True, location=None,
+        text='раз два три четыре пять шесть семь восемь девять десять '
+             'одиннадцать двенадцать',
+    )
+    assert post.excerpt.endswith('десять …')
+    with CaptureQueriesContext(connection) as queries:
+        content = client.get('/').content.decode('utf-8')
+    assert post.excerpt in content
+    assert any('"blog_post"."excerpt"' in query['sql'] for query in queries)
+    assert not any(
+        '"blog_post"."text"' in query['sql'] for query in queries
+    ), 'Убедитесь, что ленты не загружают полный текст постов.'
+
+    Post.objects.filter(pk=post.pk).update(excerpt='')
+    call_command('backfill_excerpts')
+    post.refresh_from_db()
+    assert post.excerpt.endswith('десять …'), (
+        'Убедитесь, что команда backfill_excerpts заполняет пустые анонсы.'
+    )
+
+    Post.objects.filter(pk=post.pk).update(excerpt='')
+    executor = MigrationExecutor(connection)
+    migration = executor.loader.get_migration('blog', '0010_backfill_excerpts')
+    with connection.schema_editor() as schema_editor:
+        migration.operations[0].code(apps, schema_editor)
+    post.refresh_from_db()
+    assert post.excerpt.endswith('десять …'), (
+        'Убедитесь, что миграция заполняет анонсы существующих постов.'
+    )
+
+    Post.objects.filter(pk=post.pk).update(text='новый текст', excerpt='')
+    call_command('backfill_excerpts')
+    assert 'новый текст' in client.get('/').content.decode('utf-8'), (
+        'Убедитесь, что команда backfill_excerpts сбрасывает кеш '
+        'обновлённых карточек.'
+    )
+
+
+@pytest.mark.django_db(transaction=True)
+def test_post_rows_render_like_models(
+        client, settings, post_with_published_location, comment_to_a_post
+):
+    from django.core.cache import caches
+
+    from blog.rows import PostRow
+
+    def render_index():
+        for cache in caches.all():
+            cache.clear()
+        response = client.get('/')
+        return response, response.content.decode('utf-8')
+
+    _, with_models = render_index()
+    settings.POST_CARD_ROWS = True
+    response, with_rows = render_index()
+    assert isinstance(response.context['page_obj'][0], PostRow)
+    assert with_rows == with_models, (
+        'Убедитесь, что карточки из строк PostRow совпадают с карточками '
+        'из экземпляров моделей.'
+    )
+    call_command('bench_rows', repeat=1)
+
+
+@pytest.mark.django_db(transaction=True)
+def test_versions_bumped_again_after_commit(published_category):
+    from django.db import transaction
+
+    from blog.caching.versions import get_versions
+    pair = ('category', published_category.id)
+    start = get_versions([pair])[pair]
+    with transaction.atomic():
+        published_category.save()
+        assert get_versions([pair])[pair] == start + 1
+    assert get_versions([pair])[pair] == start + 2, (
+        'Убедитесь, что версия меняется ещё раз после фиксации транзакции: '
+        'закешированное до неё по прежним строкам не должно читаться.'
+    )
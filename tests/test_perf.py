@@ -0,0 +1,579 @@
+import tracemalloc
+
+import pytest
+from django.core.management import call_command
+
+from blog.perf.querystats import QueryStats, fingerprint, query_stats
+
+
+def test_query_fingerprint_normalizes_literals():
+    assert fingerprint(
+        "SELECT * FROM blog_post WHERE id IN (%s, %s, %s) LIMIT 10"
+    ) == fingerprint(
+        "SELECT *  FROM blog_post WHERE id IN (%s) LIMIT 20"
+    ), (
+        "Убедитесь, что запросы одной формы дают одинаковый отпечаток."
+    )
+    assert fingerprint("WHERE slug = 'a'") == "WHERE slug = ?"
+
+
+def test_query_stats_is_bounded():
+    stats = QueryStats(max_size=10, flush_interval=float('inf'))
+    for number in range(50):
+        stats.record(f'SELECT {number} FROM t_{number}', 0.001)
+    assert len(stats.snapshot()) <= 10
+
+
+@pytest.mark.django_db(transaction=True)
+def test_query_stats_collected_for_requests(client, settings, tmp_path):
+    settings.PERF_DIR = tmp_path
+    query_stats.reset()
+    client.get('/')
+    query_stats.flush()
+    entries = query_stats.snapshot()
+    assert entries, 'Убедитесь, что запросы страницы попадают в статистику.'
+    assert any('blog:index' in entry['views'] for entry in entries)
+    call_command('querystats', top=3)
+
+
+def test_querystats_share_of_all_queries(settings, tmp_path):
+    from io import StringIO
+
+    settings.PERF_DIR = tmp_path
+    stats = QueryStats(flush_interval=float('inf'))
+    stats.record('SELECT 1 FROM slow', 0.3)
+    stats.record('SELECT 1 FROM fast', 0.1)
+    stats.flush()
+    out = StringIO()
+    call_command('querystats', top=1, stdout=out)
+    assert '75.0%' in out.getvalue(), (
+        'Убедитесь, что доля запроса считается от времени всех '
+        'запросов, а не только выведенных.'
+    )
+
+
+@pytest.mark.django_db(transaction=True)
+def test_staff_profiler_report(mixer, client, settings, tmp_path):
+    settings.PERF_DIR = tmp_path
+    staff = mixer.blend('auth.User', is_staff=True)
+    client.force_login(staff)
+    response = client.get('/?__profile=1')
+    report_id = response.get('X-Profile-Report')
+    assert report_id, (
+        'Убедитесь, что запрос сотрудника с `?__profile=1` профилируется.'
+    )
+    assert (tmp_path / 'profiles' / f'{report_id}.pstats').exists()
+    assert (tmp_path / 'profiles' / f'{report_id}.folded').exists()
+    listing = client.get('/admin/perf/profiles/')
+    assert report_id in listing.content.decode('utf-8')
+    download = client.get(f'/admin/perf/profiles/{report_id}.pstats')
+    assert download.status_code == 200
+
+
+@pytest.mark.django_db(transaction=True)
+def test_profiler_ignored_for_regular_users(user_client):
+    response = user_client.get('/?__profile=1')
+    assert 'X-Profile-Report' not in response
+
+
+@pytest.mark.django_db(transaction=True)
+def test_template_render_report(
+        mixer, client, settings, tmp_path, post_with_published_location
+):
+    settings.PERF_DIR = tmp_path
+    staff = mixer.blend('auth.User', is_staff=True)
+    client.force_login(staff)
+    response = client.get('/?__templates=1')
+    report_id = response.get('X-Template-Report')
+    assert report_id, (
+        'Убедитесь, что для `?__templates=1` сохраняется отчёт о рендеринге.'
+    )
+    from blog.perf.templates import load_report
+    report = load_report(report_id)
+    template_names = {row['name'] for row in report['templates']}
+    node_names = {row['name'] for row in report['nodes']}
+    assert 'includes/post_card.html' in template_names
+    assert {'include', 'url', 'filter:date'} <= node_names
+    detail = client.get(f'/admin/perf/templates/{report_id}/')
+    assert detail.status_code == 200
+    from django.template.base import Node, Template
+    assert not getattr(Node.render_annotated, 'profiled', False), (
+        'Убедитесь, что после отчёта замеры снимаются с движка шаблонов.'
+    )
+    assert not getattr(Template._render, 'profiled', False)
+
+
+@pytest.mark.django_db(transaction=True)
+def test_memory_profiler_middleware(settings, tmp_path, monkeypatch):
+    from django.test import Client
+    from blog.perf.memory import memory_stats
+    settings.PERF_DIR = tmp_path
+    settings.MEMORY_PROFILER_ENABLED = True
+    monkeypatch.setattr(memory_stats, 'snapshot_every', 1)
+    memory_stats.reset()
+    try:
+        Client().get('/')
+    finally:
+        tracemalloc.stop()
+    memory_stats.flush()
+    views = {entry['view']: entry for entry in memory_stats.snapshot()['views']}
+    assert 'blog:index' in views, (
+        'Убедитесь, что при включённом MEMORY_PROFILER_ENABLED '
+        'память запросов учитывается по имени view.'
+    )
+    assert views['blog:index']['peak_max'] > 0
+    assert views['blog:index']['sampled'] == 1
+    call_command('memstats')
+
+
+def test_post_cards_tag_matches_include_loop():
+    from django.template import engines
+    from blog.management.commands.bench_templates import (
+        INCLUDE_LOOP, POST_CARDS_TAG
+    )
+    from blog.perf.bench import build_posts
+    engine = engines['django']
+    posts = build_posts(3, text_length=200)
+
+    def squash(html):
+        return ''.join(html.split())
+
+    assert squash(
+        engine.from_string(POST_CARDS_TAG).render({'page_obj': posts})
+    ) == squash(
+        engine.from_string(INCLUDE_LOOP).render({'page_obj': posts})
+    ), (
+        'Убедитесь, что тег `post_cards` выводит то же, что и `include` '
+        'карточки поста в цикле.'
+    )
+
+
+@pytest.mark.django_db(transaction=True)
+def test_prepared_queries_match_orm(
+        post_with_published_location, comment_to_a_post
+):
+    from blog.prepared import (
+        comment_thread, post_by_id, post_card_rows, post_cards
+    )
+    post = post_with_published_location
+    shapes = (
+        (post_cards, {'ids': [post.id, post.id + 1000]}),
+        (post_card_rows, {'ids': [post.id]}),
+        (post_by_id, {'id': post.id}),
+        (comment_thread, {'post_id': post.id}),
+    )
+    for query, params in shapes:
+        expected = list(query.build(**params))
+        assert query(**params) == expected, (
+            'Убедитесь, что подготовленный запрос возвращает то же, '
+            'что и исходный QuerySet.'
+        )
+    card = post_cards(ids=[post.id])[0]
+    assert card.comment_count == 1
+    assert card.author.username == post.author.username
+    compiled = post_cards.compiled({'ids': [post.id]})
+    post_cards(ids=[post.id + 1])
+    assert post_cards.compiled({'ids': [post.id + 1]}) is compiled, (
+        'Убедитесь, что SQL подготовленного запроса компилируется '
+        'один раз для каждой формы параметров.'
+    )
+    assert post_cards(ids=[]) == []
+    call_command('bench_queries', repeat=1)
+
+
+# Запросы маршрутов записи: сессия и пользователь, затем сам объект
+# ровно один раз, справочники формы и изменение.
+WRITE_ROUTES = (
+    ('get', 'posts/create/', 4),
+    ('post', 'posts/create/', 5),
+    ('get', 'posts/{post}/edit/', 5),
+    # Пост снимается с публикации: пересчёт счётчиков категории и автора.
+    ('post', 'posts/{post}/edit/', 8),
+    ('get', 'posts/{post}/delete/', 3),
+    # Пост, его комментарии для каскада, транзакция, два удаления
+    # и пересчёт счётчиков.
+    ('post', 'posts/{post}/delete/', 9),
+    ('post', 'posts/{post}/comment/', 4),
+    ('get', 'posts/{post}/edit_comment/{comment}/', 3),
+    ('post', 'posts/{post}/edit_comment/{comment}/', 4),
+    ('get', 'posts/{post}/delete_comment/{comment}/', 3),
+    ('post', 'posts/{post}/delete_comment/{comment}/', 5),
+)
+
+
+@pytest.mark.parametrize('method, url, queries', WRITE_ROUTES)
+@pytest.mark.django_db(transaction=True)
+def test_write_routes_fetch_each_row_once(
+        method, url, queries, mixer, user, user_client,
+        post_with_published_location, django_assert_num_queries
+):
+    post = post_with_published_location
+    comment = mixer.blend('blog.Comment', post=post, author=user)
+    data = {
+        'title': 'Заголовок', 'text': 'Текст',
+        'pub_date': '2020-01-01 10:00', 'category': post.category_id,
+    }
+    # Первый запрос после очистки кешей ищет ближайшую отложенную публикацию.
+    user_client.get('/')
+    with django_assert_num_queries(queries):
+        response = getattr(user_client, method)(
+            '/' + url.format(post=post.id, comment=comment.id), data
+        )
+    assert response.status_code in (200, 302)
+
+
+@pytest.mark.django_db(transaction=True)
+def test_post_detail_queries_do_not_grow_with_comments(
+        client, user, mixer, post_with_published_location,
+        django_assert_num_queries
+):
+    from blog.constants import COMMENTS_PAGE_SIZE
+    post = post_with_published_location
+    url = f'/posts/{post.id}/'
+    client.get('/')
+    # Пост со связями одним запросом, счётчик ветки и первая страница
+    # комментариев; валидатор строится из версий без запросов.
+    for count in (3, COMMENTS_PAGE_SIZE * 2 + 10):
+        comments = mixer.cycle(count).blend(
+            'blog.Comment', post=post, author=user
+        )
+        with django_assert_num_queries(3):
+            content = client.get(url).content.decode('utf-8')
+    total = len(comments) + 3
+    assert f'Комментариев: {total}' in content
+    assert content.count('name="comment_') == COMMENTS_PAGE_SIZE, (
+        'Убедитесь, что на странице поста выводится только первая '
+        'страница комментариев.'
+    )
+    last_page = client.get(f'{url}?comments_page=3').content.decode('utf-8')
+    assert last_page.count('name="comment_') == total - 2 * COMMENTS_PAGE_SIZE
+    newest = client.get(f'{url}?comments=new').content.decode('utf-8')
+    assert newest.index(f'name="comment_{comments[-1].id}"') < newest.index(
+        f'name="comment_{comments[-2].id}"'
+    ), 'Убедитесь, что комментарии можно вывести от новых к старым.'
+
+
+@pytest.mark.django_db(transaction=True)
+def test_comment_batches_follow_cursor(
+        client, user, mixer, post_with_published_location,
+        django_assert_num_queries
+):
+    import html
+    import re
+
+    from blog.constants import COMMENTS_PAGE_SIZE
+    post = post_with_published_location
+    comments = mixer.cycle(COMMENTS_PAGE_SIZE * 2 + 10).blend(
+        'blog.Comment', post=post, author=user
+    )
+    content = client.get(f'/posts/{post.id}/').content.decode('utf-8')
+    next_url = html.unescape(
+        re.search(r'data-next="([^"]+)"', content)[1]
+    )
+    seen = [int(id_) for id_ in re.findall(r'name="comment_(\d+)"', content)]
+    while next_url:
+        # Пост и страница ветки от курсора — сколько бы ни было до неё.
+        with django_assert_num_queries(2):
+            response = client.get(next_url)
+        seen += [
+            int(id_) for id_ in re.findall(
+                r'name="comment_(\d+)"', response.content.decode('utf-8')
+            )
+        ]
+        link = re.match(r'<([^>]+)>; rel="next"', response.get('Link', ''))
+        next_url = link and link[1]
+    assert seen == [comment.id for comment in comments], (
+        'Убедитесь, что страницы ветки по курсору выводят все комментарии '
+        'по порядку без повторов.'
+    )
+    data = client.get(
+        f'/posts/{post.id}/comments/?comments=new&format=json'
+    ).json()
+    assert [item['id'] for item in data['comments'][:2]] == [
+        comments[-1].id, comments[-2].id
+    ]
+    assert data['next'] and 'comments=new' in data['next']
+    assert client.get(
+        f'/posts/{post.id}/comments/?after=oops'
+    ).status_code == 400
+
+
+@pytest.mark.parametrize('cursor', (
+    'oops', '99999999999999999999_1', '-99999999999999999999_1',
+    '0_99999999999999999999', '0_0',
+))
+@pytest.mark.django_db(transaction=True)
+def test_out_of_range_cursor_is_bad_request(
+        client, cursor, post_with_published_location
+):
+    post = post_with_published_location
+    for url in (
+        f'/posts/{post.id}/comments/', '/feed/',
+        f'/category/{post.category.slug}/feed/',
+        f'/profile/{post.author.username}/feed/',
+    ):
+        assert client.get(url, {'after': cursor}).status_code == 400, (
+            f'Убедитесь, что неверный курсор `{cursor}` для `{url}` '
+            'даёт ответ 400.'
+        )
+
+
+@pytest.mark.django_db(transaction=True)
+def test_feed_cards_follow_cursor(
+        client, mixer, post_with_published_location,
+        django_assert_num_queries
+):
+    import html
+    import re
+
+    from blog.caching.feeds import feed_indexes
+    from blog.constants import LATEST_POSTS_COUNT
+    post = post_with_published_location
+    mixer.cycle(LATEST_POSTS_COUNT * 2 + 5).blend(
+        'blog.Post', author=post.author, category=post.category,
+        location=post.location, is_published=True,
+        pub_date=post.pub_date,
+    )
+    content = client.get('/').content.decode('utf-8')
+    assert '<header' not in client.get('/feed/').content.decode('utf-8'), (
+        'Убедитесь, что порция ленты содержит только карточки.'
+    )
+
+    def post_ids(text):
+        return [int(id_) for id_ in re.findall(r'href="/posts/(\d+)/"', text)]
+
+    seen = post_ids(content)
+    next_url = html.unescape(re.search(r'data-next="([^"]+)"', content)[1])
+    while next_url:
+        # Посты порции и последние комментарии к ним: позиция курсора
+        # ищется в индексе ленты.
+        with django_assert_num_queries(2):
+            response = client.get(next_url)
+        seen += post_ids(response.content.decode('utf-8'))
+        link = re.match(r'<([^>]+)>; rel="next"', response.get('Link', ''))
+        next_url = link and link[1]
+    expected = feed_indexes.get('index').ids.tolist()
+    assert list(dict.fromkeys(seen)) == expected, (
+        'Убедитесь, что порции ленты по курсору выводят все посты '
+        'по порядку без повторов.'
+    )
+    data = client.get('/feed/?format=json').json()
+    assert data['cursor'] and data['next'].endswith(data['cursor'])
+    assert client.get(
+        f'/category/{post.category.slug}/feed/'
+    ).status_code == 200
+    assert client.get(
+        f'/profile/{post.author.username}/feed/'
+    ).status_code == 200
+
+
+@pytest.mark.django_db(transaction=True)
+def test_streamed_pages_match_rendered(
+        user_client, settings, post_with_published_location
+):
+    import re
+
+    post = post_with_published_location
+    urls = (
+        '/', f'/category/{post.category.slug}/',
+        f'/profile/{post.author.username}/', f'/posts/{post.id}/',
+    )
+
+    def without_tokens(text):
+        # CSRF-токен маскируется заново при каждом рендеринге.
+        return re.sub(r'value="\w{64}"', '', text)
+
+    for url in urls:
+        settings.STREAMING_PAGES = False
+        rendered = user_client.get(url).content.decode('utf-8')
+        settings.STREAMING_PAGES = True
+        response = user_client.get(url)
+        assert response.streaming, (
+            f'Убедитесь, что страница `{url}` отдаётся потоком при '
+            'STREAMING_PAGES.'
+        )
+        chunks = [chunk.decode('utf-8') for chunk in response]
+        assert len(chunks) >= 3 and chunks[0].rstrip().endswith('</head>')
+        assert without_tokens(''.join(chunks)) == without_tokens(rendered), (
+            f'Убедитесь, что потоковая страница `{url}` совпадает '
+            'с обычной.'
+        )
+    settings.STREAMING_PAGES = True
+    assert user_client.get('/profile/unknown/').status_code == 404
+    response = user_client.get('/')
+    assert response.streaming and response.has_header('ETag'), (
+        'Убедитесь, что потоковый ответ получает ETag.'
+    )
+    assert user_client.get(
+        '/', HTTP_IF_NONE_MATCH=response['ETag']
+    ).status_code == 304, (
+        'Убедитесь, что условный запрос к потоковой странице получает 304.'
+    )
+
+
+@pytest.mark.django_db(transaction=True)
+def test_index_cards_show_latest_comments_in_one_query(
+        client, mixer, post_with_published_location
+):
+    from datetime import timedelta
+
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    from blog.constants import LATEST_POSTS_COUNT
+    post = post_with_published_location
+    posts = [post] + mixer.cycle(LATEST_POSTS_COUNT - 1).blend(
+        'blog.Post', author=post.author, category=post.category,
+        location=post.location, is_published=True,
+        pub_date=post.pub_date,
+    )
+    for shift in range(3):
+        for blended in posts:
+            mixer.blend(
+                'blog.Comment', post=blended, author=post.author,
+                text=f'Комментарий {blended.id}-{shift}',
+                pub_date=post.pub_date + timedelta(minutes=shift),
+            )
+    with CaptureQueriesContext(connection) as queries:
+        content = client.get('/').content.decode('utf-8')
+    windowed = [
+        query for query in queries.captured_queries
+        if 'ROW_NUMBER' in query['sql']
+    ]
+    assert len(windowed) == 1, (
+        'Убедитесь, что последние комментарии всех карточек страницы '
+        'выбираются одним запросом.'
+    )
+    for blended in posts:
+        assert f'Комментарий {blended.id}-0' not in content
+        assert f'Комментарий {blended.id}-1' in content
+        assert f'Комментарий {blended.id}-2' in content, (
+            'Убедитесь, что под карточкой на главной выводятся два '
+            'последних комментария.'
+        )
+    category_page = client.get(f'/category/{post.category.slug}/')
+    assert f'Комментарий {post.id}-2' not in category_page.content.decode(
+        'utf-8'
+    ), 'Последние комментарии выводятся только на главной.'
+
+
+@pytest.mark.django_db(transaction=True)
+def test_index_cards_follow_commenter_username(
+        client, mixer, post_with_published_location
+):
+    post = post_with_published_location
+    commenter = mixer.blend('auth.User', username='OldCommenterName')
+    mixer.blend(
+        'blog.Comment', post=post, author=commenter, text='Комментарий',
+        pub_date=post.pub_date,
+    )
+    assert 'OldCommenterName' in client.get('/').content.decode('utf-8')
+    commenter.username = 'NewCommenterName'
+    commenter.save()
+    content = client.get('/').content.decode('utf-8')
+    assert 'NewCommenterName' in content and (
+        'OldCommenterName' not in content
+    ), (
+        'Убедитесь, что после смены имени автора комментария карточки '
+        'на главной выводят новое имя.'
+    )
+
+
+@pytest.mark.django_db(transaction=True)
+def test_post_counters_follow_visibility(
+        client, mixer, post_with_published_location,
+        django_assert_num_queries, clock
+):
+    from datetime import timedelta
+
+    from blog.scheduling import check_scheduled_publications
+    post = post_with_published_location
+    category, author = post.category, post.author
+
+    def counts():
+        content = client.get('/categories/').content.decode('utf-8')
+        assert category.title in content
+        profile = client.get(f'/profile/{author.username}/')
+        return content, profile.content.decode('utf-8')
+
+    content, profile = counts()
+    assert 'rounded-pill">1<' in content and 'Публикаций: 1<' in profile
+    mixer.blend(
+        'blog.Post', author=author, category=category,
+        is_published=True, pub_date=clock() - timedelta(days=1),
+    )
+    mixer.blend(
+        'blog.Post', author=author, category=category,
+        is_published=True, pub_date=clock() + timedelta(hours=1),
+    )
+    content, profile = counts()
+    assert 'rounded-pill">2<' in content and 'Публикаций: 2<' in profile, (
+        'Убедитесь, что счётчики постов учитывают только видимые посты.'
+    )
+    post.is_published = False
+    post.save()
+    content, _ = counts()
+    assert 'rounded-pill">1<' in content, (
+        'Убедитесь, что снятие поста с публикации уменьшает счётчик.'
+    )
+    # Дата отложенной публикации наступает.
+    clock.advance(hours=1, seconds=1)
+    check_scheduled_publications()
+    content, profile = counts()
+    assert 'rounded-pill">2<' in content and 'Публикаций: 2<' in profile, (
+        'Убедитесь, что наступление отложенной публикации учитывается '
+        'в счётчиках.'
+    )
+    with django_assert_num_queries(1):
+        client.get('/categories/')
+
+
+@pytest.mark.django_db
+def test_post_counter_rows_created_with_owners(mixer, user):
+    from blog.models import Category, CategoryStats, UserStats
+    from blog.stats import category_post_counts
+
+    category = mixer.blend('blog.Category', is_published=True)
+    assert CategoryStats.objects.filter(pk=category.pk).exists()
+    assert UserStats.objects.filter(pk=user.pk).exists(), (
+        'Убедитесь, что строки счётчиков создаются вместе с категорией '
+        'и пользователем, а не при первом чтении.'
+    )
+    Category.objects.bulk_create([Category(
+        title='Без сигнала', slug='bulk', description='-', is_published=True,
+    )])
+    bulk = Category.objects.get(slug='bulk')
+    mixer.blend('blog.Post', author=user, category=bulk, is_published=True)
+    assert category_post_counts([bulk.pk]) == {bulk.pk: 1}, (
+        'Убедитесь, что недостающая строка счётчика создаётся '
+        'и пересчитывается.'
+    )
+
+
+@pytest.mark.django_db(transaction=True)
+def test_profile_count_follows_category_visibility(
+        client, mixer, user, published_category
+):
+    from datetime import timedelta
+
+    from django.utils.timezone import now
+
+    hidden = mixer.blend('blog.Category', is_published=True)
+    mixer.blend(
+        'blog.Post', author=user, category=hidden, is_published=True,
+        pub_date=now() - timedelta(days=30),
+    )
+    # Пост скрываемой категории не попадает на первую страницу профиля.
+    mixer.cycle(10).blend(
+        'blog.Post', author=user, category=published_category,
+        is_published=True, pub_date=now() - timedelta(days=1),
+    )
+    url = f'/profile/{user.username}/'
+    assert 'Публикаций: 11<' in client.get(url).content.decode('utf-8')
+    assert client.get(url)['X-Page-Cache'] == 'HIT'
+    hidden.is_published = False
+    hidden.save()
+    assert 'Публикаций: 10<' in client.get(url).content.decode('utf-8'), (
+        'Убедитесь, что скрытие категории сбрасывает кеш профилей её '
+        'авторов со счётчиком публикаций.'
+    )